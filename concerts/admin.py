@@ -1,8 +1,10 @@
 from django.contrib import admin
 
-from .models import Conductor, Guest, Venue, Concert
+from library.admin import HistoryAdmin, PersonAdmin
+from .models import Conductor, Guest, Venue, Concert, ConcertHistory
 
-admin.site.register(Conductor)
-admin.site.register(Guest)
+admin.site.register(Conductor, PersonAdmin)
+admin.site.register(Guest, PersonAdmin)
 admin.site.register(Venue)
 admin.site.register(Concert)
+admin.site.register(ConcertHistory, HistoryAdmin)
@@ -0,0 +1,34 @@
+# concerts/exports.py
+# Row generators for the concert history export (see core/exports.py).
+
+from .models import Concert
+
+CONCERT_EXPORT_HEADER = [
+    "id",
+    "name",
+    "date",
+    "time",
+    "venue",
+    "conductors",
+    "guests",
+    "description",
+]
+
+
+def concert_export_rows(chunk_size=2000):
+    """
+    Yield one row per concert, oldest first, reading one iterator() chunk
+    at a time. Credits come from the cached text columns.
+    """
+    concerts = Concert.objects.select_related("venue").order_by("date", "pk")
+    for concert in concerts.iterator(chunk_size=chunk_size):
+        yield [
+            concert.pk,
+            concert.name,
+            concert.date,
+            concert.time,
+            concert.venue.name,
+            concert.conductors_text,
+            concert.guests_text,
+            concert.description,
+        ]
@@ -1,8 +1,13 @@
 # concerts/forms.py
 from django import forms
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
-from .models import Venue, Concert
+from core.cache import bump_generations
+from core.widgets import AutocompleteSelect, AutocompleteSelectMultiple
+from library.models import Piece
+from .models import Venue, Concert, ConcertProgramItem, Guest
 
 
 class VenueForm(forms.ModelForm):
@@ -18,8 +23,9 @@ class ConcertForm(forms.ModelForm):
         widgets = {
             "date": forms.DateInput(attrs={"type": "date"}),
             "time": forms.TimeInput(attrs={"type": "time"}),
-            "conductor": forms.SelectMultiple(),
-            "guests": forms.SelectMultiple(),
+            "venue": AutocompleteSelect("venue_autocomplete"),
+            "conductor": AutocompleteSelectMultiple("conductor_autocomplete"),
+            "guest": AutocompleteSelectMultiple("guest_autocomplete"),
         }
 
     def __init__(self, *args, **kwargs):
@@ -31,3 +37,126 @@ class ConcertForm(forms.ModelForm):
         self.helper.form_action = "submit_survey"
 
         self.helper.add_input(Submit("submit", "Submit"))
+
+
+class PrefetchedModelChoiceField(forms.ModelChoiceField):
+    """
+    A ModelChoiceField that looks its value up in `objects` ({pk: row}),
+    when the formset has set it, instead of running a query per form.
+    """
+
+    objects = None
+
+    def to_python(self, value):
+        if self.objects is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.objects[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages["invalid_choice"], code="invalid_choice"
+            )
+
+
+class ProgramItemForm(forms.Form):
+    piece = PrefetchedModelChoiceField(
+        Piece.objects.all(), widget=AutocompleteSelect("piece_autocomplete")
+    )
+    soloist = PrefetchedModelChoiceField(
+        Guest.objects.all(),
+        required=False,
+        widget=AutocompleteSelect("guest_autocomplete"),
+    )
+
+
+class BaseProgramFormSet(forms.BaseFormSet):
+    """
+    A concert's whole program, one form per item in ORDER order. The
+    pieces and soloists of all the forms are loaded together, so rendering
+    or validating the program takes one query per field, not one per row,
+    and save() writes it back in bulk.
+    """
+
+    shared_fields = {"piece": Piece, "soloist": Guest}
+
+    def __init__(self, data=None, items=(), **kwargs):
+        items = list(items)
+        initial = [
+            {"piece": item.piece_id, "soloist": item.soloist_id, "ORDER": position}
+            for position, item in enumerate(items, 1)
+        ]
+        super().__init__(data, initial=initial, **kwargs)
+        for name, model in self.shared_fields.items():
+            if self.is_bound:
+                pks = {
+                    int(value)
+                    for value in (form[name].data for form in self.forms)
+                    if str(value).isdigit()
+                }
+                objects = model.objects.in_bulk(pks)
+            else:
+                objects = {
+                    getattr(item, f"{name}_id"): getattr(item, name)
+                    for item in items
+                    if getattr(item, f"{name}_id") is not None
+                }
+            for form in self.forms:
+                form.fields[name].objects = objects
+                form.fields[name].widget.known_objects = objects.values()
+
+    def save(self, concert):
+        """
+        Make the forms `concert`'s program. The current items are reused in
+        position order, so the program is written with one bulk UPDATE of
+        the changed items, one bulk INSERT of the added ones and one DELETE
+        of any left over; call it in a transaction (write_atomic()).
+        """
+        existing = list(concert.program.order_by("position"))
+        ordered = self.ordered_forms
+        changed, added = [], []
+        for position, form in enumerate(ordered, 1):
+            piece = form.cleaned_data["piece"]
+            soloist = form.cleaned_data["soloist"]
+            if position > len(existing):
+                added.append(
+                    ConcertProgramItem(
+                        concert=concert,
+                        piece=piece,
+                        soloist=soloist,
+                        position=position,
+                        concert_date=concert.date,
+                    )
+                )
+                continue
+            item = existing[position - 1]
+            if (item.piece_id, item.soloist_id, item.concert_date) != (
+                piece.pk,
+                soloist.pk if soloist else None,
+                concert.date,
+            ):
+                item.piece, item.soloist, item.concert_date = (
+                    piece,
+                    soloist,
+                    concert.date,
+                )
+                changed.append(item)
+        ConcertProgramItem.objects.bulk_update(
+            changed, ["piece", "soloist", "concert_date"]
+        )
+        ConcertProgramItem.objects.bulk_create(added)
+        removed = [item.pk for item in existing[len(ordered) :]]
+        if removed:
+            ConcertProgramItem.objects.filter(pk__in=removed).delete()
+        # For the concert page's ETag (core/views.py).
+        Concert.objects.filter(pk=concert.pk).update(updated_at=timezone.now())
+        # Bulk writes send no signals (core/cache.py).
+        bump_generations(ConcertProgramItem)
+
+
+ProgramFormSet = forms.formset_factory(
+    ProgramItemForm,
+    formset=BaseProgramFormSet,
+    extra=3,
+    can_order=True,
+    can_delete=True,
+)
@@ -0,0 +1,22 @@
+from core.credits import backfill_credit_columns
+from django.core.management.base import BaseCommand
+
+from concerts.models import CONCERT_CREDIT_COLUMNS, Concert
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached conductor/guest text columns of every concert."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Concerts refreshed per query batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        total = backfill_credit_columns(
+            Concert, CONCERT_CREDIT_COLUMNS, batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Refreshed credits on {total} concerts."))
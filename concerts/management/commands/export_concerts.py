@@ -0,0 +1,14 @@
+from core.exports import ExportCommand
+from concerts.exports import CONCERT_EXPORT_HEADER, concert_export_rows
+
+
+class Command(ExportCommand):
+    help = (
+        "Export every concert, with venue, conductors and guests, as CSV or JSON Lines."
+    )
+
+    def get_export_header(self):
+        return CONCERT_EXPORT_HEADER
+
+    def get_export_rows(self, chunk_size):
+        return concert_export_rows(chunk_size=chunk_size)
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0004_remove_conductor_instrument"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="concert",
+            options={"ordering": ["date"]},
+        ),
+        migrations.RenameField(
+            model_name="concert",
+            old_name="guests",
+            new_name="guest",
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0005_alter_concert_options_rename_guests_concert_guest"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="conductor",
+            options={
+                "ordering": ["last_name", "first_name"],
+                "verbose_name": "Conductor",
+                "verbose_name_plural": "Conductors",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="guest",
+            options={
+                "ordering": ["last_name", "first_name"],
+                "verbose_name": "Guest",
+                "verbose_name_plural": "Guests",
+            },
+        ),
+    ]
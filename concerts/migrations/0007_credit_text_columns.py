@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:25
+
+# Existing rows are filled by `manage.py backfill_piece_credits` /
+# `manage.py backfill_concert_credits`.
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0006_person_ordering"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="concert",
+            name="conductors_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="concert",
+            name="guests_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0007_credit_text_columns"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="concert",
+            options={"ordering": ["date", "time"]},
+        ),
+        migrations.AddIndex(
+            model_name="concert",
+            index=models.Index(
+                fields=["date", "time"], name="concerts_co_date_371697_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conductor",
+            index=models.Index(
+                fields=["last_name", "first_name"], name="concerts_conductor_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="guest",
+            index=models.Index(
+                fields=["last_name", "first_name"], name="concerts_guest_name_idx"
+            ),
+        ),
+    ]
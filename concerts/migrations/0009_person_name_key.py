@@ -0,0 +1,63 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:33
+
+import unicodedata
+from itertools import islice
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Copies of library.people as of this migration, which must not change
+# with the app's code.
+NAME_KEY_LENGTH = 200
+
+
+def fold_name(value):
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(char for char in value if not unicodedata.combining(char))
+    value = "".join(char if char.isalnum() else " " for char in value.casefold())
+    return " ".join(value.split())
+
+
+def person_name_key(first_name, last_name):
+    initials = "".join(part[0] for part in fold_name(first_name).split())
+    return f"{fold_name(last_name)}|{initials}"[:NAME_KEY_LENGTH]
+
+
+def fill_name_keys(apps, schema_editor):
+    for model_name in ["Conductor", "Guest"]:
+        model = apps.get_model("concerts", model_name)
+        people = (
+            model.objects.only("first_name", "last_name")
+            .order_by("pk")
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        while batch := list(islice(people, BATCH_SIZE)):
+            for person in batch:
+                person.name_key = person_name_key(person.first_name, person.last_name)
+            model.objects.bulk_update(batch, ["name_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0008_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conductor",
+            name="name_key",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=200
+            ),
+        ),
+        migrations.AddField(
+            model_name="guest",
+            name="name_key",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=200
+            ),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
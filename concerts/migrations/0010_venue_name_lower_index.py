@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0009_person_name_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="venue",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="concerts_venue_lname_idx",
+            ),
+        ),
+    ]
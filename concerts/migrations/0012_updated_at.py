@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0011_concerthistory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="concert",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="conductor",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="guest",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="venue",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("concerts", "0012_updated_at"),
+        ("library", "0017_slowquery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConcertProgramItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveSmallIntegerField()),
+                ("concert_date", models.DateField(editable=False)),
+                (
+                    "concert",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="program",
+                        to="concerts.concert",
+                    ),
+                ),
+                (
+                    "piece",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="performances",
+                        to="library.piece",
+                    ),
+                ),
+                (
+                    "soloist",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="program_items",
+                        to="concerts.guest",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["concert", "position"],
+                "indexes": [
+                    models.Index(
+                        fields=["concert", "position"],
+                        name="concerts_co_concert_055985_idx",
+                    ),
+                    models.Index(
+                        fields=["piece", "concert_date"],
+                        name="concerts_co_piece_i_cff647_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
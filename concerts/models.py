@@ -1,8 +1,10 @@
 # concerts/models.py
 
 from django.db import models
+from django.db.models.functions import Lower
 from django.urls import reverse
-from library.models import PersonBase
+from core.history import HistoryBase, TrackedModel
+from library.models import PersonBase, Piece
 
 
 # Create your models here.
@@ -15,7 +17,7 @@ class Conductor(PersonBase):
     def get_absolute_url(self):
         return reverse("conductor_detail", args=[str(self.id)])
 
-    class Meta:
+    class Meta(PersonBase.Meta):
         verbose_name = "Conductor"
         verbose_name_plural = "Conductors"
 
@@ -27,7 +29,7 @@ class Guest(PersonBase):
     def get_absolute_url(self):
         return reverse("guest_detail", args=[str(self.id)])
 
-    class Meta:
+    class Meta(PersonBase.Meta):
         verbose_name = "Guest"
         verbose_name_plural = "Guests"
 
@@ -42,6 +44,7 @@ class Venue(models.Model):
     phone = models.CharField(max_length=100, blank=True)
     website = models.URLField(blank=True)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -51,6 +54,8 @@ class Venue(models.Model):
 
     class Meta:
         ordering = ["name"]
+        # Prefix matching for autocomplete (core/autocomplete.py).
+        indexes = [models.Index(Lower("name"), name="concerts_venue_lname_idx")]
 
 
 def concert_poster_upload_path(instance, filename):
@@ -58,7 +63,7 @@ def concert_poster_upload_path(instance, filename):
     return f"posters/concert_{instance.id}/{filename}"
 
 
-class Concert(models.Model):
+class Concert(TrackedModel):
     name = models.CharField(max_length=100)
     date = models.DateField()
     time = models.TimeField()
@@ -71,6 +76,11 @@ class Concert(models.Model):
         blank=True,
         null=True,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Cached credits (see core/credits.py), kept in sync by concerts/signals.py
+    conductors_text = models.TextField(blank=True, editable=False)
+    guests_text = models.TextField(blank=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -85,4 +95,76 @@ class Concert(models.Model):
         return "; ".join(str(guest) for guest in self.guest.all())
 
     class Meta:
-        ordering = ["date"]
+        ordering = ["date", "time"]
+        indexes = [
+            models.Index(fields=["date", "time"]),
+        ]
+
+
+# Concert credit text columns and the M2M field each one caches.
+CONCERT_CREDIT_COLUMNS = {
+    "conductors_text": "conductor",
+    "guests_text": "guest",
+}
+
+
+class ConcertProgramItemQuerySet(models.QuerySet):
+    def performances(self, piece):
+        """
+        Every performance of `piece`, latest first: one range of the
+        (piece, concert_date) index, already in order.
+        """
+        return self.filter(piece=piece).order_by("-concert_date", "-pk")
+
+
+class ConcertProgramItem(models.Model):
+    """A piece on a concert's program, in program order."""
+
+    concert = models.ForeignKey(
+        Concert, on_delete=models.CASCADE, related_name="program"
+    )
+    piece = models.ForeignKey(
+        Piece, on_delete=models.CASCADE, related_name="performances"
+    )
+    position = models.PositiveSmallIntegerField()
+    soloist = models.ForeignKey(
+        Guest,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="program_items",
+    )
+    # Copy of concert.date, kept in sync by concerts/signals.py, so a
+    # piece's performances are one index range in date order.
+    concert_date = models.DateField(editable=False)
+
+    objects = ConcertProgramItemQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.position}. {self.piece}"
+
+    def save(self, *args, **kwargs):
+        self.concert_date = self.concert.date
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ["concert", "position"]
+        indexes = [
+            models.Index(fields=["concert", "position"]),
+            models.Index(fields=["piece", "concert_date"]),
+        ]
+
+
+class ConcertHistory(HistoryBase):
+    """One recorded change to a concert (see core/history.py)."""
+
+    concert = models.ForeignKey(
+        Concert,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="history",
+    )
+
+    class Meta(HistoryBase.Meta):
+        verbose_name_plural = "concert history"
+        indexes = [models.Index(fields=["concert", "changed_at"])]
@@ -0,0 +1,126 @@
+# concerts/signals.py
+# Keeps the Concert credit text columns (core/credits.py) and the program
+# items' copy of the concert date in sync with edits, records concert
+# history (core/history.py) and retires cached pages (core/cache.py).
+#
+# As in library/signals.py, the concerts whose credits changed inside a
+# transaction are collected on the connection and refreshed once, at the
+# end of a write_atomic() block or otherwise when the transaction commits.
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import history
+from core.cache import bump_generations, watch_app
+from core.credits import m2m_changed_owner_ids, refresh_credit_columns
+from core.writes import pre_commit
+from .models import (
+    CONCERT_CREDIT_COLUMNS,
+    Concert,
+    ConcertHistory,
+    ConcertProgramItem,
+    Conductor,
+    Guest,
+)
+
+# Credited models mapped to the Concert field that points at them.
+CREDIT_RELATIONS = {
+    Conductor: "conductor",
+    Guest: "guest",
+}
+
+
+def _related_concert_ids(instance):
+    field = CREDIT_RELATIONS[type(instance)]
+    return list(
+        Concert.objects.filter(**{field: instance}).values_list("pk", flat=True)
+    )
+
+
+class _PendingConcerts:
+    """The concerts changed in one transaction, refreshed by flush()."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.concert_ids = set()
+
+    def flush(self):
+        if getattr(self.connection, "_pending_concerts", None) is self:
+            self.connection._pending_concerts = None
+        concert_ids, self.concert_ids = self.concert_ids, set()
+        if concert_ids:
+            refresh_credit_columns(Concert, concert_ids, CONCERT_CREDIT_COLUMNS)
+
+
+def concerts_changed(concert_ids):
+    """Refresh the credit columns of these concerts."""
+    if not concert_ids:
+        return
+    connection = transaction.get_connection()
+    pending = getattr(connection, "_pending_concerts", None)
+    # A rollback discards the on_commit callback, and with it the concerts.
+    if pending is None or not any(
+        func == pending.flush for _, func, _ in connection.run_on_commit
+    ):
+        pending = _PendingConcerts(connection)
+        if connection.in_atomic_block:
+            connection._pending_concerts = pending
+            transaction.on_commit(pending.flush, using=connection.alias)
+    pending.concert_ids.update(concert_ids)
+    if not connection.in_atomic_block:
+        pending.flush()
+
+
+@receiver(pre_commit)
+def flush_pending_concerts(sender, using, **kwargs):
+    # The end of a write_atomic() block: refresh in its transaction.
+    pending = getattr(transaction.get_connection(using), "_pending_concerts", None)
+    if pending is not None:
+        pending.flush()
+
+
+@receiver(m2m_changed, sender=Concert.conductor.through)
+@receiver(m2m_changed, sender=Concert.guest.through)
+def concert_credits_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    concert_ids = m2m_changed_owner_ids(
+        instance, action, reverse, pk_set, _related_concert_ids
+    )
+    if concert_ids is not None:
+        concerts_changed(concert_ids)
+
+
+def credit_renamed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        concerts_changed(_related_concert_ids(instance))
+
+
+def capture_deleted_credit(sender, instance, **kwargs):
+    # The cascade to the through table sends no m2m_changed.
+    instance._credit_concert_ids = _related_concert_ids(instance)
+
+
+def credit_deleted(sender, instance, **kwargs):
+    concerts_changed(getattr(instance, "_credit_concert_ids", []))
+
+
+@receiver(post_save, sender=Concert)
+def concert_date_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    moved = (
+        ConcertProgramItem.objects.filter(concert=instance)
+        .exclude(concert_date=instance.date)
+        .update(concert_date=instance.date)
+    )
+    if moved:
+        bump_generations(ConcertProgramItem)
+
+
+for model in CREDIT_RELATIONS:
+    post_save.connect(credit_renamed, sender=model)
+    pre_delete.connect(capture_deleted_credit, sender=model)
+    post_delete.connect(credit_deleted, sender=model)
+
+history.track(Concert, ConcertHistory)
+watch_app("concerts")
@@ -1,8 +1,26 @@
 # concerts/tests.py
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse, resolve
-from .models import Conductor, Guest, Venue
+import datetime
+
+from core.history import HistoryAction, recording, state_as_of
+from core.testing import (
+    QueryBudgetAssertionsMixin,
+    QueryPlanAssertionsMixin,
+    list_view_queryset,
+)
+from core.writes import write_atomic
+from library.models import Piece
+from .forms import ConcertForm
+from .models import Conductor, Guest, Venue, Concert, ConcertProgramItem
+from .urls import urlpatterns
 from .views import (
+    ConcertListView,
     ConductorListView,
     ConductorDetailView,
     ConductorCreateView,
@@ -423,7 +441,7 @@ class VenueViewsTest(TestCase):
         new_venue = Venue.objects.get(name="Carnegie Hall")
         self.assertEqual(new_venue.city, "New York")
         # Check redirect after create
-        self.assertRedirects(response, reverse("venue_list")
+        self.assertRedirects(response, reverse("venue_list"))
 
     def test_venue_update_view(self):
         """Test that update view returns correct status code and template"""
@@ -473,7 +491,9 @@ class VenueViewsTest(TestCase):
         }
         response = self.client.post(self.create_url, data)
         self.assertEqual(response.status_code, 200)  # Stays on the form page
-        self.assertFormError(response, "form", "name", "This field is required.")
+        self.assertFormError(
+            response.context["form"], "name", "This field is required."
+        )
 
 
 class VenueUrlsTest(TestCase):
@@ -565,3 +585,519 @@ class VenueIntegrationTest(TestCase):
         # Step 5: Check that we can't access the venue anymore
         response = client.get(reverse("venue_detail", args=[venue.id]))
         self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTest(TestCase):
+    """Test case for cursor pagination on the list views"""
+
+    def walk(self, url, context_name, direction="next", cursor=None):
+        """Follow cursors until the end, returning every page's objects"""
+        pages = []
+        while True:
+            params = {"cursor": cursor} if cursor else {}
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append(list(response.context[context_name]))
+            page = response.context["page_obj"]
+            if direction == "next" and page.has_next():
+                cursor = page.next_cursor
+            elif direction == "prev" and page.has_previous():
+                cursor = page.previous_cursor
+            else:
+                return pages
+
+    def test_person_list_walks_every_row_once_in_order(self):
+        """Test paging forward and back over (last_name, first_name, id) with NULLs"""
+        for i in range(45):
+            Conductor.objects.create(
+                last_name=f"Name {i % 7}",
+                first_name=None if i % 3 == 0 else f"First {i % 2}",
+            )
+        url = reverse("conductor_list")
+        pages = self.walk(url, "people")
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        expected = list(
+            Conductor.objects.order_by("last_name", "first_name", "id")
+        )  # SQLite sorts NULL first, like the cursor does
+        self.assertEqual([p for page in pages for p in page], expected)
+
+        # Step back from the last page to the first.
+        response = self.client.get(url)
+        second = self.client.get(
+            url, {"cursor": response.context["page_obj"].next_cursor}
+        )
+        third = self.client.get(url, {"cursor": second.context["page_obj"].next_cursor})
+        back = self.walk(
+            url,
+            "people",
+            direction="prev",
+            cursor=third.context["page_obj"].previous_cursor,
+        )
+        self.assertEqual(back, pages[1::-1])
+
+    def test_concert_list_orders_newest_first(self):
+        """Test that concerts page by (-date, -time, -id) across equal dates"""
+        venue = Venue.objects.create(name="Symphony Hall")
+        start = datetime.date(2024, 1, 1)
+        for i in range(25):
+            Concert.objects.create(
+                name=f"Concert {i}",
+                date=start + datetime.timedelta(days=i // 2),
+                time=datetime.time(19, 30),
+                venue=venue,
+            )
+        pages = self.walk(reverse("concert_list"), "concerts")
+        concerts = [c for page in pages for c in page]
+        self.assertEqual(
+            concerts, list(Concert.objects.order_by("-date", "-time", "-id"))
+        )
+
+    def test_list_runs_no_count_query(self):
+        """Test that the default mode skips COUNT(*)"""
+        Venue.objects.create(name="Symphony Hall")
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("venue_list"))
+        self.assertFalse(any("COUNT(" in q["sql"] for q in context.captured_queries))
+
+    def test_invalid_cursor_is_404(self):
+        """Test that a tampered cursor is rejected"""
+        response = self.client.get(reverse("venue_list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConcertExportTest(TestCase):
+    """Test case for the streaming concert export"""
+
+    def test_concert_export(self):
+        """Test that concerts export with venue and conductors"""
+        venue = Venue.objects.create(name="Symphony Hall")
+        concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=venue,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            concert.conductor.add(
+                Conductor.objects.create(first_name="Leonard", last_name="Bernstein")
+            )
+        response = self.client.get(reverse("concert_export"))
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn("id,name,date,time,venue,conductors", content)
+        self.assertIn(
+            'Spring Concert,2024-05-01,19:30:00,Symphony Hall,"Bernstein, Leonard"',
+            content,
+        )
+        stdout = StringIO()
+        call_command("export_concerts", format="jsonl", stdout=stdout)
+        self.assertIn('"venue": "Symphony Hall"', stdout.getvalue())
+
+
+class ConcertCreditColumnsTest(TestCase):
+    """Test case for the cached conductor and guest text on Concert"""
+
+    def test_columns_follow_links_and_renames(self):
+        """Test that links, renames and the backfill command keep the text current"""
+        concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=Venue.objects.create(name="Symphony Hall"),
+        )
+        conductor = Conductor.objects.create(
+            first_name="Leonard", last_name="Bernstein"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            concert.conductor.add(conductor)
+            concert.guest.add(Guest.objects.create(first_name="Yo-Yo", last_name="Ma"))
+        concert.refresh_from_db()
+        self.assertEqual(concert.conductors_text, "Bernstein, Leonard")
+        self.assertEqual(concert.guests_text, "Ma, Yo-Yo")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            conductor.first_name = "Lenny"
+            conductor.save()
+        concert.refresh_from_db()
+        self.assertEqual(concert.conductors_text, "Bernstein, Lenny")
+
+        Concert.objects.update(guests_text="")
+        call_command("backfill_concert_credits", stdout=StringIO())
+        concert.refresh_from_db()
+        self.assertEqual(concert.guests_text, "Ma, Yo-Yo")
+
+    def test_concert_form_refreshes_once(self):
+        """Test that saving a concert form refreshes its credit columns once"""
+        concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=Venue.objects.create(name="Symphony Hall"),
+        )
+        conductor = Conductor.objects.create(
+            first_name="Leonard", last_name="Bernstein"
+        )
+        guest = Guest.objects.create(first_name="Yo-Yo", last_name="Ma")
+        form = ConcertForm(
+            data={
+                "name": "Spring Concert",
+                "date": "2024-05-01",
+                "time": "19:30",
+                "venue": concert.venue.pk,
+                "conductor": [conductor.pk],
+                "guest": [guest.pk],
+            },
+            instance=concert,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with CaptureQueriesContext(connection) as queries:
+            write_atomic(form.save)
+        updates = [
+            q for q in queries if q["sql"].startswith('UPDATE "concerts_concert" ')
+        ]
+        # the concert's own save, then one credit column update
+        self.assertEqual(len(updates), 2)
+        concert.refresh_from_db()
+        self.assertEqual(concert.conductors_text, "Bernstein, Leonard")
+        self.assertEqual(concert.guests_text, "Ma, Yo-Yo")
+
+
+class ConcertIndexPlanTest(QueryPlanAssertionsMixin, TestCase):
+    """Test case that the concert app's list views page through indexes"""
+
+    def test_person_lists_page_through_the_name_index(self):
+        """Test that conductor and guest lists scan (last_name, first_name)"""
+        for view_class in (ConductorListView, GuestListView):
+            for reverse in (False, True):
+                self.assertUsesIndex(
+                    list_view_queryset(view_class, reverse=reverse)[:21],
+                    view_class.model,
+                    ["last_name", "first_name"],
+                )
+
+    def test_concert_list_pages_through_the_date_index(self):
+        """Test that newest-first concert paging scans (date, time) backwards"""
+        for reverse in (False, True):
+            self.assertUsesIndex(
+                list_view_queryset(ConcertListView, reverse=reverse)[:21],
+                Concert,
+                ["date", "time"],
+            )
+        self.assertUsesIndex(Concert.objects.all(), Concert, ["date", "time"])
+
+
+class ConcertPeopleMergeTest(TestCase):
+    """Test case for merging duplicate conductors"""
+
+    def test_merge_repoints_concerts(self):
+        """Test that concerts credit the kept conductor after a merge"""
+        concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=Venue.objects.create(name="Symphony Hall"),
+        )
+        keeper = Conductor.objects.create(first_name="Leonard", last_name="Bernstein")
+        with self.captureOnCommitCallbacks(execute=True):
+            concert.conductor.add(
+                Conductor.objects.create(first_name="L.", last_name="Bernstein")
+            )
+            call_command(
+                "find_duplicate_people", "conductor", merge=True, stdout=StringIO()
+            )
+        self.assertEqual(list(concert.conductor.all()), [keeper])
+        concert.refresh_from_db()
+        self.assertEqual(concert.conductors_text, "Bernstein, Leonard")
+
+
+class ConcertAutocompleteTest(TestCase):
+    """Test case for the conductor, guest and venue autocomplete"""
+
+    def test_endpoints_and_form(self):
+        """Test that the concert form defers its pickers to the endpoints"""
+        bernstein = Conductor.objects.create(
+            first_name="Leonard", last_name="Bernstein"
+        )
+        Conductor.objects.create(first_name="Marin", last_name="Alsop")
+        venue = Venue.objects.create(name="Symphony Hall")
+        Venue.objects.create(name="Town Hall")
+
+        data = self.client.get(reverse("conductor_autocomplete"), {"q": "bern"}).json()
+        self.assertEqual(
+            data["results"], [{"id": bernstein.pk, "text": "Bernstein, Leonard"}]
+        )
+        data = self.client.get(reverse("venue_autocomplete"), {"q": "SYM"}).json()
+        self.assertEqual([item["id"] for item in data["results"]], [venue.pk])
+
+        concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=venue,
+        )
+        concert.conductor.add(bernstein)
+        response = self.client.get(reverse("concert_update", args=[concert.pk]))
+        self.assertContains(response, "Bernstein, Leonard")
+        self.assertContains(response, "Symphony Hall")
+        self.assertNotContains(response, "Alsop")
+        self.assertNotContains(response, "Town Hall")
+
+
+class ConcertHistoryTest(TestCase):
+    """Tests for the concert change history"""
+
+    def test_changes_and_as_of(self):
+        """Test that concert edits are recorded and can be rolled back in time"""
+        bernstein = Conductor.objects.create(
+            first_name="Leonard", last_name="Bernstein"
+        )
+        concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=Venue.objects.create(name="Symphony Hall"),
+        )
+        created = concert.history.get().changed_at
+        with recording():
+            concert.time = datetime.time(20, 0)
+            concert.save()
+            concert.conductor.add(bernstein)
+        entry = concert.history.latest("pk")
+        self.assertEqual(entry.action, HistoryAction.UPDATE)
+        self.assertEqual(
+            entry.changes,
+            {"time": ["19:30:00", "20:00:00"], "conductor": [[], [bernstein.pk]]},
+        )
+        state = state_as_of(Concert, concert.pk, created)
+        self.assertEqual(state["time"], datetime.time(19, 30))
+        self.assertEqual(state["conductor"], [])
+
+
+class ConcertConditionalGetTest(TestCase):
+    """Tests for conditional GET on concert and person pages"""
+
+    def test_not_modified(self):
+        """Test that venue, concert and conductor pages answer 304"""
+        venue = Venue.objects.create(name="Symphony Hall")
+        concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=venue,
+        )
+        conductor = Conductor.objects.create(first_name="Marin", last_name="Alsop")
+        for url in [
+            reverse("venue_detail", args=[venue.pk]),
+            reverse("concert_detail", args=[concert.pk]),
+            reverse("conductor_detail", args=[conductor.pk]),
+        ]:
+            etag = self.client.get(url)["ETag"]
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+
+
+class ConcertQueryBudgetTest(QueryBudgetAssertionsMixin, TestCase):
+    """Tests for the concerts app's query budgets"""
+
+    def setUp(self):
+        self.venue = Venue.objects.create(name="Symphony Hall")
+        self.conductors = [
+            Conductor.objects.create(first_name=name, last_name="Alsop")
+            for name in ("Marin", "Ann", "Beth")
+        ]
+        self.guests = [
+            Guest.objects.create(first_name=name, last_name="Ma")
+            for name in ("Yo-Yo", "Lin")
+        ]
+        self.concerts = []
+        for day in range(1, 13):
+            concert = Concert.objects.create(
+                name=f"Concert {day}",
+                date=datetime.date(2024, 5, day),
+                time=datetime.time(19, 30),
+                venue=self.venue,
+            )
+            concert.conductor.set(self.conductors)
+            concert.guest.set(self.guests)
+            self.concerts.append(concert)
+
+    def test_concert_urls_within_budget(self):
+        """Test that every concerts URL stays within its query budget"""
+        kwargs = {
+            "conductor": {"pk": self.conductors[0].pk},
+            "guest": {"pk": self.guests[0].pk},
+            "venue": {"pk": self.venue.pk},
+            "concert": {"pk": self.concerts[0].pk},
+        }
+        self.assertQueryBudgets(
+            urlpatterns,
+            {
+                "concert_program": kwargs["concert"],
+                **{
+                    f"{model}_{view}": pk
+                    for model, pk in kwargs.items()
+                    for view in ("detail", "update", "delete")
+                },
+            },
+            {
+                "venue_create": {"name": "Town Hall"},
+                "venue_update": {"name": "Symphony Hall"},
+                "conductor_create": {"first_name": "Leonard", "last_name": "Slatkin"},
+                "conductor_update": {"first_name": "Marin", "last_name": "Alsop"},
+            },
+        )
+
+    def test_concert_detail_reads_people_once(self):
+        """Test that the concert page reads its conductors and guests in one query each"""
+        url = reverse("concert_detail", args=[self.concerts[0].pk])
+        # updated_at for the ETag, the concert and venue, conductors, guests,
+        # the program with its pieces and soloists
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertContains(response, "Conductors:")
+        self.assertContains(response, "Concert Guests")
+
+
+class ConcertProgramTest(QueryPlanAssertionsMixin, TestCase):
+    """Tests for concert programs, the program editor and performance history"""
+
+    def setUp(self):
+        self.venue = Venue.objects.create(name="Symphony Hall")
+        self.concert = Concert.objects.create(
+            name="Spring Concert",
+            date=datetime.date(2024, 5, 1),
+            time=datetime.time(19, 30),
+            venue=self.venue,
+        )
+        self.soloist = Guest.objects.create(first_name="Yo-Yo", last_name="Ma")
+        self.pieces = [
+            Piece.objects.create(title=title)
+            for title in ("Liberty Bell", "Holiday Overture", "Cello Suite", "Finale")
+        ]
+        self.url = reverse("concert_program", args=[self.concert.pk])
+
+    def post(self, rows, initial=0):
+        """POST the editor with rows of (piece, soloist, order, delete)."""
+        data = {"form-TOTAL_FORMS": len(rows), "form-INITIAL_FORMS": initial}
+        for index, (piece, soloist, order, delete) in enumerate(rows):
+            data[f"form-{index}-piece"] = piece.pk if piece else ""
+            data[f"form-{index}-soloist"] = soloist.pk if soloist else ""
+            data[f"form-{index}-ORDER"] = order
+            if delete:
+                data[f"form-{index}-DELETE"] = "on"
+        return self.client.post(self.url, data)
+
+    def program(self):
+        return list(
+            self.concert.program.values_list("position", "piece__title", "soloist")
+        )
+
+    def test_editor_saves_program_in_bulk(self):
+        """Test that a program is saved with bulk INSERTs, UPDATEs and DELETEs"""
+        liberty, overture, suite, finale = self.pieces
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(
+                [(overture, None, 2, False), (liberty, self.soloist, 1, False)]
+                + [(None, None, "", False)]
+            )
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertRedirects(response, self.concert.get_absolute_url())
+        self.assertEqual(
+            self.program(),
+            [(1, "Liberty Bell", self.soloist.pk), (2, "Holiday Overture", None)],
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.post(
+                [
+                    (liberty, self.soloist, 1, True),
+                    (overture, None, 1, False),
+                    (suite, self.soloist, 2, False),
+                    (finale, None, 3, False),
+                ],
+                initial=2,
+            )
+        self.assertEqual(
+            self.program(),
+            [
+                (1, "Holiday Overture", None),
+                (2, "Cello Suite", self.soloist.pk),
+                (3, "Finale", None),
+            ],
+        )
+        writes = [
+            q["sql"].split()[0]
+            for q in queries
+            if "concertprogramitem" in q["sql"] and not q["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(writes, ["UPDATE", "INSERT"])
+
+        self.post([(overture, None, 1, False)], initial=3)
+        self.assertEqual(self.program(), [(1, "Holiday Overture", None)])
+
+    def test_editor_queries_do_not_grow_with_the_program(self):
+        """Test that rendering and validating the program do not query per row"""
+        self.post(
+            [(piece, self.soloist, i, False) for i, piece in enumerate(self.pieces)]
+        )
+        # The concert, then the program with its pieces and soloists
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Cello Suite")
+        self.assertContains(response, "/library/autocomplete/pieces/")
+        with CaptureQueriesContext(connection) as queries:
+            self.post(
+                [
+                    (piece, self.soloist, i, False)
+                    for i, piece in enumerate(self.pieces)
+                ],
+                initial=4,
+            )
+        reads = [q for q in queries if q["sql"].startswith("SELECT")]
+        # The concert, pieces, soloists and current program
+        self.assertEqual(len(reads), 4)
+
+    def test_invalid_piece_rejected(self):
+        """Test that an unknown piece is a form error and saves nothing"""
+        response = self.client.post(
+            self.url,
+            {"form-TOTAL_FORMS": 1, "form-INITIAL_FORMS": 0, "form-0-piece": 9999},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Select a valid choice")
+        self.assertFalse(ConcertProgramItem.objects.exists())
+
+    def test_concert_date_follows_the_concert(self):
+        """Test that moving a concert moves its program items' dates"""
+        self.post([(self.pieces[0], None, 1, False)])
+        self.concert.date = datetime.date(2024, 6, 1)
+        self.concert.save()
+        self.assertEqual(
+            list(self.concert.program.values_list("concert_date", flat=True)),
+            [datetime.date(2024, 6, 1)],
+        )
+
+    def test_performance_history(self):
+        """Test that a piece's performances are one index range, latest first"""
+        piece = self.pieces[0]
+        later = Concert.objects.create(
+            name="Fall Concert",
+            date=datetime.date(2024, 10, 1),
+            time=datetime.time(19, 30),
+            venue=self.venue,
+        )
+        for concert in (self.concert, later):
+            ConcertProgramItem.objects.create(concert=concert, piece=piece, position=1)
+        performances = ConcertProgramItem.objects.performances(piece)
+        self.assertEqual(
+            [item.concert.name for item in performances],
+            ["Fall Concert", "Spring Concert"],
+        )
+        self.assertUsesIndex(
+            performances, ConcertProgramItem, ["piece", "concert_date"]
+        )
+        response = self.client.get(reverse("piece_detail", args=[piece.pk]))
+        self.assertContains(response, "Latest performance Oct. 1, 2024")
+        self.assertContains(response, "Spring Concert")
+        response = self.client.get(self.concert.get_absolute_url())
+        self.assertContains(response, "Liberty Bell")
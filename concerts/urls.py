@@ -17,10 +17,15 @@ from .views import (
     VenueUpdateView,
     VenueDeleteView,
     ConcertListView,
+    ConcertExportView,
     ConcertDetailView,
     ConcertCreateView,
     ConcertUpdateView,
+    ConcertProgramView,
     ConcertDeleteView,
+    ConductorAutocompleteView,
+    GuestAutocompleteView,
+    VenueAutocompleteView,
 )
 
 # Conductor Views
@@ -54,8 +59,26 @@ urlpatterns = [
     path("venues/<int:pk>/delete/", VenueDeleteView.as_view(), name="venue_delete"),
     # Concert views
     path("", ConcertListView.as_view(), name="concert_list"),
+    path("export/", ConcertExportView.as_view(), name="concert_export"),
     path("<int:pk>/", ConcertDetailView.as_view(), name="concert_detail"),
     path("create/", ConcertCreateView.as_view(), name="concert_create"),
     path("<int:pk>/update/", ConcertUpdateView.as_view(), name="concert_update"),
+    path("<int:pk>/program/", ConcertProgramView.as_view(), name="concert_program"),
     path("<int:pk>/delete/", ConcertDeleteView.as_view(), name="concert_delete"),
+    # Autocomplete endpoints
+    path(
+        "autocomplete/conductors/",
+        ConductorAutocompleteView.as_view(),
+        name="conductor_autocomplete",
+    ),
+    path(
+        "autocomplete/guests/",
+        GuestAutocompleteView.as_view(),
+        name="guest_autocomplete",
+    ),
+    path(
+        "autocomplete/venues/",
+        VenueAutocompleteView.as_view(),
+        name="venue_autocomplete",
+    ),
 ]
@@ -2,16 +2,27 @@
 # PersonBase views are in core/views.py
 
 from core.forms import ConductorForm, GuestForm
+from django.db.models import Prefetch
+from django.shortcuts import redirect
 from django.views.generic import (
+    View,
     DetailView,
     ListView,
     DeleteView,
     UpdateView,
     CreateView,
 )
-from .models import Conductor, Guest, Venue, Concert
-from .forms import VenueForm, ConcertForm
+from library.models import Piece
+from .models import Conductor, Guest, Venue, Concert, ConcertProgramItem
+from .forms import VenueForm, ConcertForm, ProgramFormSet
+from .exports import CONCERT_EXPORT_HEADER, concert_export_rows
+from core.autocomplete import NameAutocompleteView, PersonAutocompleteView
+from core.cache import CachedPageMixin
+from core.writes import WriteTransactionMixin, write_atomic
+from core.exports import ExportViewMixin
 from core.views import (
+    ConditionalGetMixin,
+    KeysetPaginationMixin,
     PersonBaseDetailView,
     PersonBaseListView,
     PersonBaseCreateView,
@@ -101,7 +112,7 @@ class GuestDeleteView(PersonBaseDeleteView):
 
 
 # Venue Views
-class VenueDetailView(DetailView):
+class VenueDetailView(ConditionalGetMixin, CachedPageMixin, DetailView):
     model = Venue
     template_name = "venue/venue_detail.html"
 
@@ -111,7 +122,7 @@ class VenueDetailView(DetailView):
         return context
 
 
-class VenueListView(ListView):
+class VenueListView(CachedPageMixin, KeysetPaginationMixin, ListView):
     model = Venue
     template_name = "venue/venue_list.html"
     context_object_name = "venues"
@@ -119,14 +130,14 @@ class VenueListView(ListView):
     ordering = ["name"]
 
 
-class VenueCreateView(CreateView):
+class VenueCreateView(WriteTransactionMixin, CreateView):
     model = Venue
     form_class = VenueForm
     template_name = "venue/venue_form.html"
     success_url = reverse_lazy("venue_list")
 
 
-class VenueUpdateView(UpdateView):
+class VenueUpdateView(WriteTransactionMixin, UpdateView):
     model = Venue
     form_class = VenueForm
     template_name = "venue/venue_form.html"
@@ -135,39 +146,103 @@ class VenueUpdateView(UpdateView):
         return reverse_lazy("venue_detail", kwargs={"pk": self.object.pk})
 
 
-class VenueDeleteView(DeleteView):
+class VenueDeleteView(WriteTransactionMixin, DeleteView):
     model = Venue
     template_name = "venue/venue_confirm_delete.html"
     success_url = reverse_lazy("venue_list")
 
 
-class ConcertListView(ListView):
+class ConcertListView(CachedPageMixin, KeysetPaginationMixin, ListView):
     model = Concert
+    cache_models = [Conductor, Guest, Venue]
     template_name = "concert/concert_list.html"
     context_object_name = "concerts"
     paginate_by = 20
-    ordering = ["-date"]
+    ordering = ["-date", "-time"]
 
 
-class ConcertDetailView(DetailView):
+class ConcertExportView(ExportViewMixin, View):
+    export_filename = "concerts"
+
+    def get_export_header(self):
+        return CONCERT_EXPORT_HEADER
+
+    def get_export_rows(self):
+        return concert_export_rows()
+
+
+class ConcertDetailView(ConditionalGetMixin, CachedPageMixin, DetailView):
     model = Concert
+    cache_models = [Conductor, Guest, Venue, ConcertProgramItem, Piece]
     template_name = "concert/concert_detail.html"
 
-
-class ConcertCreateView(CreateView):
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .select_related("venue")
+            .prefetch_related(
+                "conductor",
+                "guest",
+                Prefetch(
+                    "program",
+                    queryset=ConcertProgramItem.objects.select_related(
+                        "piece", "soloist"
+                    ),
+                ),
+            )
+        )
+
+
+class ConcertCreateView(WriteTransactionMixin, CreateView):
     model = Concert
     form_class = ConcertForm
     template_name = "concert/concert_form.html"
     success_url = reverse_lazy("concert_list")
 
 
-class ConcertUpdateView(UpdateView):
+class ConcertUpdateView(WriteTransactionMixin, UpdateView):
     model = Concert
     form_class = ConcertForm
     template_name = "concert/concert_form.html"
 
 
-class ConcertDeleteView(DeleteView):
+class ConcertProgramView(DetailView):
+    """Edit a concert's whole program on one page (see ProgramFormSet)."""
+
+    model = Concert
+    template_name = "concert/concert_program_form.html"
+
+    def get_context_data(self, **kwargs):
+        if "formset" not in kwargs:
+            kwargs["formset"] = ProgramFormSet(
+                items=self.object.program.select_related("piece", "soloist")
+            )
+        return super().get_context_data(**kwargs)
+
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        formset = ProgramFormSet(request.POST)
+        if not formset.is_valid():
+            return self.render_to_response(self.get_context_data(formset=formset))
+        write_atomic(formset.save, self.object)
+        return redirect(self.object)
+
+
+class ConcertDeleteView(WriteTransactionMixin, DeleteView):
     model = Concert
     template_name = "concert/concert_confirm_delete.html"
     success_url = reverse_lazy("concert_list")
+
+
+# Autocomplete endpoints for the ConcertForm pickers (see core/widgets.py)
+class ConductorAutocompleteView(PersonAutocompleteView):
+    model = Conductor
+
+
+class GuestAutocompleteView(PersonAutocompleteView):
+    model = Guest
+
+
+class VenueAutocompleteView(NameAutocompleteView):
+    model = Venue
@@ -0,0 +1,96 @@
+# core/autocomplete.py
+# JSON autocomplete endpoints for the related-model pickers on the piece
+# and concert forms (see core/widgets.py).
+#
+# Each endpoint answers `?q=<prefix>&page=<n>` with
+# {"results": [{"id": ..., "text": ...}], "more": bool}. The prefix is
+# matched as a range (key >= prefix AND key < next prefix) on an indexed
+# key, which SQLite can answer from the index where LIKE could not.
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import JsonResponse
+from django.views import View
+
+from library.people import fold_name, person_name_key
+
+MAX_PAGE = 50
+
+
+def prefix_q(field, prefix):
+    """Rows whose `field` starts with `prefix`, as an index-friendly range."""
+    if not prefix:
+        return Q()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": upper})
+
+
+def sql_lower(value):
+    # SQLite's lower() only folds ASCII, so leave other letters alone to
+    # compare equal with the indexed LOWER(name).
+    return "".join(char.lower() if char.isascii() else char for char in value)
+
+
+class AutocompleteView(View):
+    """
+    Base autocomplete endpoint. Subclasses set `model` and implement
+    `get_queryset(term)`, returning the matches in index order.
+    """
+
+    model = None
+    paginate_by = 20
+
+    def get_queryset(self, term):
+        raise NotImplementedError("Subclasses must implement get_queryset().")
+
+    def get_label(self, obj):
+        return str(obj)
+
+    def get_page(self):
+        page = self.request.GET.get("page", "")
+        return min(int(page), MAX_PAGE) if page.isdigit() and int(page) else 1
+
+    def get(self, request, *args, **kwargs):
+        term = request.GET.get("q", "").strip()
+        offset = (self.get_page() - 1) * self.paginate_by
+        # One extra row tells us whether there is another page.
+        rows = list(self.get_queryset(term)[offset : offset + self.paginate_by + 1])
+        return JsonResponse(
+            {
+                "results": [
+                    {"id": obj.pk, "text": self.get_label(obj)}
+                    for obj in rows[: self.paginate_by]
+                ],
+                "more": len(rows) > self.paginate_by,
+            }
+        )
+
+
+class PersonAutocompleteView(AutocompleteView):
+    """
+    Matches PersonBase models on their folded name key: "sou" finds every
+    Sousa, and "sousa, j" narrows that to first names starting with J.
+    """
+
+    def get_queryset(self, term):
+        people = self.model.objects.only("first_name", "last_name").order_by(
+            "name_key", "pk"
+        )
+        if "," in term:
+            last, first = term.split(",", 1)
+            key = person_name_key(first, last)
+        else:
+            key = fold_name(term)
+        return people.filter(prefix_q("name_key", key)) if key else people
+
+
+class NameAutocompleteView(AutocompleteView):
+    """Matches models with a `name` on their LOWER(name) expression index."""
+
+    def get_queryset(self, term):
+        rows = (
+            self.model.objects.annotate(name_lower=Lower("name"))
+            .only("name")
+            .order_by("name_lower", "pk")
+        )
+        return rows.filter(prefix_q("name_lower", sql_lower(term)))
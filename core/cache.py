@@ -0,0 +1,209 @@
+# core/cache.py
+# Page cache for the catalog's list and detail views, invalidated by
+# per-model generation counters.
+#
+# Every model has a generation number in the cache. post_save, post_delete
+# and m2m_changed bump it (see watch_app()), and code that writes in bulk
+# without signals calls bump_generations() itself. A cached page's key
+# includes the generation of every model the page shows, so one cache
+# write after an edit retires every page that depends on it: the old keys
+# are never asked for again and simply age out. Works with any cache
+# backend that supports get_many/incr, such as locmem and file-based.
+#
+# Hits and misses are counted for `manage.py page_cache_stats`, but only
+# for one request in PAGE_CACHE_STATS_SAMPLE, weighted to match: an incr
+# on the file-based cache rewrites a file and lists the directory, which
+# costs far more than the cache hit it would be counting.
+
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponse
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+DEFAULT_PAGE_CACHE_STATS_SAMPLE = 100
+
+
+def _generation_key(model):
+    return f"generation:{model._meta.label_lower}"
+
+
+def _stats_key(view_name, outcome):
+    return f"page_cache:{outcome}:{view_name}"
+
+
+def _count_outcome(view_name, outcome):
+    """Count a page cache hit or miss, for a sample of the requests."""
+    sample = getattr(
+        settings, "PAGE_CACHE_STATS_SAMPLE", DEFAULT_PAGE_CACHE_STATS_SAMPLE
+    )
+    if sample and random.randrange(sample) == 0:
+        incr_counter(_stats_key(view_name, outcome), sample)
+
+
+def incr_counter(key, delta=1, initial=None):
+    """
+    Add `delta` to a counter kept in the cache. A missing counter (never
+    set, or evicted) is created as `initial`, which defaults to `delta`.
+    """
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        value = delta if initial is None else initial
+        cache.add(key, value, None)
+        return value
+
+
+def _bump(models):
+    for model in dict.fromkeys(models):
+        # A restarted counter begins at the current time, so it can never
+        # repeat a generation that older cached pages were keyed on.
+        incr_counter(_generation_key(model), initial=time.time_ns())
+
+
+def bump_generations(*models):
+    """
+    Invalidate every cached page showing any of `models`, once the current
+    transaction commits: bumping earlier would let a page rendered from the
+    old rows be cached under the new generation.
+    """
+    transaction.on_commit(lambda: _bump(models))
+
+
+def generations(models):
+    """The current generation of each of `models`, in order."""
+    keys = [_generation_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def watch_app(app_label):
+    """Bump a model's generation whenever a model of `app_label` changes."""
+
+    def bump_saved(sender, **kwargs):
+        if sender._meta.app_label == app_label:
+            bump_generations(sender)
+
+    def bump_m2m(sender, instance, action, model, **kwargs):
+        if sender._meta.app_label == app_label and action.startswith("post_"):
+            bump_generations(type(instance), model, sender)
+
+    uid = f"page_cache_{app_label}"
+    post_save.connect(bump_saved, weak=False, dispatch_uid=uid)
+    post_delete.connect(bump_saved, weak=False, dispatch_uid=uid)
+    m2m_changed.connect(bump_m2m, weak=False, dispatch_uid=uid)
+
+
+class CachedPageMixin:
+    """
+    Serve GET responses from the cache until one of the page's models
+    changes. `cache_models` lists the models the page shows besides the
+    view's own `model`.
+    """
+
+    cache_models = ()
+    cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def get_cache_models(self):
+        return [self.model, *self.cache_models]
+
+    def can_store(self, response):
+        # A page rendered inside a transaction may show rows that are
+        # later rolled back (this is also what keeps tests isolated).
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not connection.in_atomic_block
+        )
+
+    def get_page_cache_key(self):
+        # Read before the page is rendered, so an edit made meanwhile
+        # leaves this render under keys that are already out of date.
+        generation = ".".join(map(str, generations(self.get_cache_models())))
+        # Hashed, like the path, to keep keys short however many models.
+        generation = hashlib.md5(generation.encode()).hexdigest()
+        path = hashlib.md5(self.request.get_full_path().encode()).hexdigest()
+        return f"page:{type(self).__name__}:{path}:{generation}"
+
+    def dispatch(self, request, *args, **kwargs):
+        # A profiled request has to run the view (library/profiling.py).
+        if request.method not in ("GET", "HEAD") or getattr(
+            request, "profiling", False
+        ):
+            return super().dispatch(request, *args, **kwargs)
+        key = self.get_page_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            _count_outcome(type(self).__name__, "hits")
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Cache"] = "HIT"
+            return response
+        _count_outcome(type(self).__name__, "misses")
+        response = super().dispatch(request, *args, **kwargs)
+        if self.can_store(response):
+
+            def store(response):
+                cache.set(
+                    key,
+                    (response.content, response["Content-Type"]),
+                    self.cache_timeout,
+                )
+
+            if hasattr(response, "add_post_render_callback"):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+def cached_views():
+    """Every CachedPageMixin view class, by name."""
+    views = {}
+    pending = [CachedPageMixin]
+    while pending:
+        view = pending.pop()
+        pending.extend(view.__subclasses__())
+        if getattr(view, "model", None) is not None:
+            views[view.__name__] = view
+    return views
+
+
+def page_cache_stats(view_names):
+    """
+    {view name: (hits, misses)} from the counters kept in the cache,
+    estimated from the sampled requests.
+    """
+    keys = [
+        _stats_key(name, outcome)
+        for name in view_names
+        for outcome in ("hits", "misses")
+    ]
+    counts = cache.get_many(keys)
+    return {
+        name: (
+            counts.get(_stats_key(name, "hits"), 0),
+            counts.get(_stats_key(name, "misses"), 0),
+        )
+        for name in view_names
+    }
+
+
+def reset_page_cache_stats(view_names):
+    cache.delete_many(
+        [
+            _stats_key(name, outcome)
+            for name in view_names
+            for outcome in ("hits", "misses")
+        ]
+    )
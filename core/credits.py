@@ -0,0 +1,88 @@
+# core/credits.py
+# Denormalized credit text columns, such as Piece.composers_text and
+# Concert.conductors_text.
+#
+# Each column caches the "; "-joined names of one M2M relation so list
+# pages can show credits without touching the join tables. The apps'
+# signal handlers call refresh_credit_columns(), or save_credit_columns()
+# on rows they already loaded, whenever links change or a credited
+# person/genre is renamed or deleted.
+
+from django.utils import timezone
+
+from core.cache import bump_generations
+
+
+def credit_text(related):
+    return "; ".join(str(obj) for obj in related)
+
+
+def refresh_credit_columns(model, pks, columns, batch_size=1000):
+    """
+    Recompute `columns` ({text column: M2M field name}) for the rows of
+    `model` in `pks`, and touch their updated_at: one query for the rows,
+    one per relation and one UPDATE per batch.
+    """
+    pks = list(dict.fromkeys(pks))
+    for start in range(0, len(pks), batch_size):
+        rows = list(
+            model.objects.filter(pk__in=pks[start : start + batch_size])
+            .only(*columns)
+            .prefetch_related(*columns.values())
+        )
+        save_credit_columns(model, rows, columns)
+
+
+def save_credit_columns(model, rows, columns):
+    """
+    Recompute `columns` on `rows`, whose relations are already prefetched,
+    and save them (with updated_at) in one UPDATE.
+    """
+    now = timezone.now()
+    for row in rows:
+        for column, field in columns.items():
+            setattr(row, column, credit_text(getattr(row, field).all()))
+        # The rows' pages changed too (see ConditionalGetMixin).
+        row.updated_at = now
+    # bulk_update sends no post_save, so this cannot re-trigger itself.
+    model.objects.bulk_update(rows, [*columns, "updated_at"])
+
+
+def backfill_credit_columns(model, columns, batch_size=1000):
+    """Refresh the credit columns of every row in batches; returns the count."""
+    total = 0
+    batch = []
+    for pk in model.objects.order_by("pk").values_list("pk", flat=True).iterator():
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            refresh_credit_columns(model, batch, columns, batch_size)
+            total += len(batch)
+            batch = []
+    refresh_credit_columns(model, batch, columns, batch_size)
+    # bulk_update sends no signals, so retire cached pages by hand.
+    bump_generations(model)
+    return total + len(batch)
+
+
+def m2m_changed_owner_ids(instance, action, reverse, pk_set, owner_ids):
+    """
+    For an m2m_changed signal on an owning model's relation (for example
+    Piece.composer), return the ids of owner rows whose links have just
+    changed, or None while the change is still pending.
+
+    `owner_ids(instance)` lists the owners linked to a reverse-side
+    instance; it is needed because clear() from the reverse side sends no
+    pk_set, so the owners have to be captured before the rows go away.
+    """
+    if not reverse:
+        # piece.composer.add(...) and friends: only this owner changed.
+        if action in ("post_add", "post_remove", "post_clear"):
+            return [instance.pk]
+        return None
+    if action == "pre_clear":
+        instance._credit_owner_ids = owner_ids(instance)
+    elif action == "post_clear":
+        return instance.__dict__.pop("_credit_owner_ids", [])
+    elif action in ("post_add", "post_remove"):
+        return list(pk_set or [])
+    return None
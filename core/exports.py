@@ -0,0 +1,160 @@
+# core/exports.py
+# Shared helpers for streaming CSV / JSON Lines exports.
+#
+# Exports are built from generators of rows, so nothing is held in memory
+# beyond the current queryset chunk. The same row generators feed both the
+# StreamingHttpResponse views and the export management commands.
+
+import csv
+import json
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+class Echo:
+    """A file-like object that hands back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def export_lines(header, rows, export_format):
+    if export_format == "csv":
+        return csv_lines(header, rows)
+    if export_format == "jsonl":
+        return jsonl_lines(header, rows)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+
+def gzip_chunks(lines, chunk_size=64 * 1024):
+    """Compress text lines into gzip bytes on the fly, ~chunk_size at a time."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip container
+    buffer = []
+    buffered = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= chunk_size:
+            compressed = compressor.compress(b"".join(buffer))
+            buffer, buffered = [], 0
+            if compressed:
+                yield compressed
+    yield compressor.compress(b"".join(buffer)) + compressor.flush()
+
+
+def export_response(filename, header, rows, export_format="csv", compress=False):
+    """
+    Stream `rows` as a downloadable file. With `compress`, the body is
+    gzipped as it is produced and the file gets a .gz suffix.
+    """
+    lines = export_lines(header, rows, export_format)
+    filename = f"{filename}.{export_format}"
+    if compress:
+        response = StreamingHttpResponse(
+            gzip_chunks(lines), content_type="application/gzip"
+        )
+        filename += ".gz"
+    else:
+        response = StreamingHttpResponse(
+            lines, content_type=f"{EXPORT_FORMATS[export_format]}; charset=utf-8"
+        )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ExportViewMixin:
+    """
+    Stream an export as `?format=csv|jsonl`, optionally with `?gzip=1`.
+    Subclasses set `export_filename` and implement `get_export_header()`
+    and `get_export_rows()`.
+    """
+
+    export_filename = "export"
+
+    def get_export_header(self):
+        raise NotImplementedError("Subclasses must implement get_export_header().")
+
+    def get_export_rows(self):
+        raise NotImplementedError("Subclasses must implement get_export_rows().")
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            export_format = "csv"
+        return export_response(
+            self.export_filename,
+            self.get_export_header(),
+            self.get_export_rows(),
+            export_format=export_format,
+            compress=request.GET.get("gzip") in ("1", "true"),
+        )
+
+
+class ExportCommand(BaseCommand):
+    """
+    Base for export management commands. Subclasses implement
+    `get_export_header()` and `get_export_rows(chunk_size)`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_FORMATS), default="csv", dest="format"
+        )
+        parser.add_argument(
+            "--output", "-o", help="File to write to (default: standard output)."
+        )
+        parser.add_argument(
+            "--gzip", action="store_true", help="Gzip the output (needs --output)."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched (and prefetched) per database round trip.",
+        )
+
+    def get_export_header(self):
+        raise NotImplementedError("Subclasses must implement get_export_header().")
+
+    def get_export_rows(self, chunk_size):
+        raise NotImplementedError("Subclasses must implement get_export_rows().")
+
+    def handle(self, *args, **options):
+        if options["gzip"] and not options["output"]:
+            raise CommandError("--gzip needs --output.")
+        lines = export_lines(
+            self.get_export_header(),
+            self.get_export_rows(options["chunk_size"]),
+            options["format"],
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+        elif options["gzip"]:
+            with open(options["output"], "wb") as handle:
+                for chunk in gzip_chunks(lines):
+                    handle.write(chunk)
+        else:
+            with open(options["output"], "w", newline="", encoding="utf-8") as handle:
+                handle.writelines(lines)
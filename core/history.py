@@ -0,0 +1,463 @@
+# core/history.py
+# Append-only change history for tracked models (library.PieceHistory,
+# concerts.ConcertHistory).
+#
+# Every save, forward m2m change or delete of a tracked model becomes one
+# history row: the action, the user, the time and a {field: [old, new]}
+# JSON blob of the fields that changed. The "before" values come from the
+# row as it was loaded (TrackedModel.from_db), so a save costs no extra
+# SELECT. Inside a request the rows are buffered by HistoryMiddleware and
+# written with one bulk_create per history table, in the same transaction
+# as the data when the write goes through write_atomic() and otherwise when
+# the response is ready; elsewhere each row is written as it happens, or
+# batched with `with recording(user): ...`. Changes rolled back with their
+# transaction or savepoint are dropped, and nothing is written while an
+# exception propagates.
+#
+# state_as_of() rebuilds a record at a past moment by starting from its
+# current row and undoing, newest first, the changes made since then.
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.utils import timezone
+
+from core.writes import pre_commit, write_atomic
+
+
+class HistoryAction(models.TextChoices):
+    CREATE = "CREATE", "Created"
+    UPDATE = "UPDATE", "Updated"
+    DELETE = "DELETE", "Deleted"
+
+
+class HistoryBase(models.Model):
+    """
+    Abstract history row. Subclasses add a foreign key to the tracked
+    model (DO_NOTHING, without a constraint, so the rows outlive a delete)
+    and an index on (that key, changed_at).
+    """
+
+    action = models.CharField(max_length=6, choices=HistoryAction.choices)
+    changed_at = models.DateTimeField(default=timezone.now)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+    )
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        abstract = True
+        ordering = ["changed_at", "pk"]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.changed_at:%Y-%m-%d %H:%M}"
+
+
+class TrackedModel(models.Model):
+    """
+    Abstract base for tracked models: remembers the values each instance
+    was loaded with, which its next save diffs against.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        refreshed = [
+            field.attname
+            for field in self._meta.concrete_fields
+            if fields is None or field.name in fields or field.attname in fields
+        ]
+        self._loaded_values = {
+            **getattr(self, "_loaded_values", {}),
+            **{
+                name: self.__dict__[name] for name in refreshed if name in self.__dict__
+            },
+        }
+
+
+# Tracked model -> (history model, attname of its key to the tracked model)
+TRACKED = {}
+
+_batch = ContextVar("history_batch", default=None)
+
+
+def tracked_fields(model):
+    """The editable concrete fields of `model` that history records."""
+    return [
+        field
+        for field in model._meta.concrete_fields
+        if field.editable and not field.primary_key
+    ]
+
+
+def _python(field, value):
+    if isinstance(value, FieldFile):
+        return value.name or ""
+    if field.is_relation or value is None:
+        return value
+    return field.to_python(value)
+
+
+def _row_values(instance):
+    return {
+        field.name: _python(field, getattr(instance, field.attname))
+        for field in tracked_fields(type(instance))
+    }
+
+
+def _is_empty(value):
+    return value in (None, "", [])
+
+
+class _Change:
+    """One pending history row."""
+
+    def __init__(self, instance, action, changes):
+        self.model = type(instance)
+        self.pk = instance.pk
+        self.using = instance._state.db or "default"
+        self.action = action
+        self.changes = changes
+        self.changed_at = timezone.now()
+        self.committed = not transaction.get_connection(self.using).in_atomic_block
+        if not self.committed:
+            transaction.on_commit(self.commit, using=self.using)
+
+    def commit(self):
+        self.committed = True
+
+    def is_live(self):
+        """Whether the change is committed or its transaction still open."""
+        if self.committed:
+            return True
+        # Rolling back a transaction or a savepoint discards the on_commit
+        # callbacks registered inside it.
+        connection = transaction.get_connection(self.using)
+        return any(func == self.commit for _, func, _ in connection.run_on_commit)
+
+    def as_row(self, user):
+        history_model, attname = TRACKED[self.model]
+        return history_model(
+            **{attname: self.pk},
+            action=self.action,
+            changed_at=self.changed_at,
+            user=user,
+            changes=self.changes,
+        )
+
+
+class HistoryBatch:
+    """Changes collected during one request (or `recording()` block)."""
+
+    def __init__(self, user=None):
+        self.user = user
+        self.changes = []
+        # The latest change per record, which later m2m changes merge into.
+        self.latest = {}
+
+    def add(self, change):
+        self.changes.append(change)
+        self.latest[change.model, change.pk] = change
+
+    def get_user(self):
+        # request.user is lazy; only resolve it if something changed.
+        if getattr(self.user, "is_authenticated", False):
+            return self.user
+        return None
+
+    def pending(self):
+        """The changes to write: not empty and not rolled back."""
+        return [
+            change
+            for change in self.changes
+            if (change.changes or change.action != HistoryAction.UPDATE)
+            and change.is_live()
+        ]
+
+    def write(self):
+        """
+        Insert the pending rows with one bulk_create per history model and
+        empty the batch; call it in a transaction.
+        """
+        changes = self.pending()
+        self.changes, self.latest = [], {}
+        rows = {}
+        for change in changes:
+            row = change.as_row(self.get_user())
+            rows.setdefault(type(row), []).append(row)
+        for history_model, batch in rows.items():
+            history_model.objects.bulk_create(batch)
+
+    def flush(self):
+        """Write what is left of the batch in a transaction of its own."""
+        if self.pending():
+            write_atomic(self.write)
+        self.changes, self.latest = [], {}
+
+
+@contextmanager
+def recording(user=None):
+    """
+    Buffer the history rows of the enclosed changes and write them once,
+    unless the block raises.
+    """
+    batch = HistoryBatch(user)
+    token = _batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _batch.reset(token)
+    batch.flush()
+
+
+class HistoryMiddleware:
+    """Buffer each request's history rows; write them when it is done."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with recording(getattr(request, "user", None)):
+            return self.get_response(request)
+
+
+def _record(change):
+    batch = _batch.get()
+    if batch is not None:
+        batch.add(change)
+    elif change.changes or change.action != HistoryAction.UPDATE:
+        change.as_row(None).save()
+
+
+def _write_pending(sender, **kwargs):
+    # The end of a write_atomic() block: write the batch in its transaction.
+    batch = _batch.get()
+    if batch is not None:
+        batch.write()
+
+
+def _capture_old_row(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    fields = tracked_fields(sender)
+    if update_fields is not None:
+        fields = [field for field in fields if field.name in update_fields]
+    saved = instance.__dict__.pop("_history_saved", None)
+    if saved is not None and not saved[0].is_live():
+        # The last save was rolled back: diff against the values before it.
+        instance._loaded_values = saved[1]
+    old = dict(getattr(instance, "_loaded_values", {}))
+    # Only deferred fields (or instances not loaded from the database) are
+    # read back.
+    missing = [field.attname for field in fields if field.attname not in old]
+    if missing:
+        row = sender._base_manager.filter(pk=instance.pk).values(*missing).first()
+        if row is None:
+            return
+        old.update(row)
+    instance._history_old = {
+        field.name: _python(field, old[field.attname]) for field in fields
+    }
+
+
+def _record_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = _row_values(instance)
+    loaded = getattr(instance, "_loaded_values", {})
+    instance._loaded_values = {
+        **loaded,
+        **{
+            field.attname: getattr(instance, field.attname)
+            for field in tracked_fields(sender)
+        },
+    }
+    if created:
+        changes = {
+            name: [None, value] for name, value in new.items() if not _is_empty(value)
+        }
+        change = _Change(instance, HistoryAction.CREATE, changes)
+    else:
+        old = instance.__dict__.pop("_history_old", None)
+        if old is None:
+            return
+        changes = {
+            name: [value, new[name]]
+            for name, value in old.items()
+            if value != new[name]
+        }
+        change = _Change(instance, HistoryAction.UPDATE, changes)
+    instance._history_saved = (change, loaded)
+    _record(change)
+
+
+def _m2m_ids(instance, field_name):
+    return sorted(getattr(instance, field_name).values_list("pk", flat=True))
+
+
+def _capture_deleted_row(sender, instance, **kwargs):
+    # The through rows are gone by post_delete, so snapshot everything now.
+    state = _row_values(instance)
+    for field in sender._meta.many_to_many:
+        state[field.name] = _m2m_ids(instance, field.name)
+    instance._history_deleted = state
+
+
+def _record_delete(sender, instance, **kwargs):
+    state = instance.__dict__.pop("_history_deleted", {})
+    changes = {
+        name: [value, None] for name, value in state.items() if not _is_empty(value)
+    }
+    _record(_Change(instance, HistoryAction.DELETE, changes))
+
+
+def _m2m_receiver(field_name):
+    def record_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+        # Only changes made from the tracked side (piece.composer.set(...)).
+        if reverse:
+            return
+        if action in ("pre_add", "pre_remove", "pre_clear"):
+            instance.__dict__.setdefault("_history_m2m", {})[field_name] = _m2m_ids(
+                instance, field_name
+            )
+            return
+        if action not in ("post_add", "post_remove", "post_clear"):
+            return
+        old = instance.__dict__.get("_history_m2m", {}).pop(field_name, [])
+        if action == "post_add":
+            new = sorted({*old, *pk_set})
+        elif action == "post_remove":
+            new = sorted(set(old) - set(pk_set))
+        else:
+            new = []
+        batch = _batch.get()
+        change = batch and batch.latest.get((type(instance), instance.pk))
+        if change is not None and change.action != HistoryAction.DELETE:
+            # Merge into this request's change to the record, keeping the
+            # oldest "before" value.
+            old = change.changes.get(field_name, [old])[0]
+            if old == new:
+                change.changes.pop(field_name, None)
+            else:
+                change.changes[field_name] = [old, new]
+        elif old != new:
+            _record(_Change(instance, HistoryAction.UPDATE, {field_name: [old, new]}))
+
+    return record_m2m
+
+
+def track(model, history_model):
+    """Record the saves, deletes and m2m changes of `model` in `history_model`."""
+    key = next(
+        field
+        for field in history_model._meta.concrete_fields
+        if field.is_relation and field.related_model is model
+    )
+    TRACKED[model] = (history_model, key.attname)
+    uid = f"history_{model._meta.label_lower}"
+    pre_commit.connect(_write_pending, dispatch_uid="history_write_pending")
+    pre_save.connect(_capture_old_row, sender=model, dispatch_uid=uid)
+    post_save.connect(_record_save, sender=model, dispatch_uid=uid)
+    pre_delete.connect(_capture_deleted_row, sender=model, dispatch_uid=uid)
+    post_delete.connect(_record_delete, sender=model, dispatch_uid=uid)
+    for field in model._meta.many_to_many:
+        m2m_changed.connect(
+            _m2m_receiver(field.name),
+            sender=field.remote_field.through,
+            weak=False,
+            dispatch_uid=f"{uid}_{field.name}",
+        )
+
+
+def state_as_of(model, pk, when):
+    """
+    The tracked field values ({name: value}, m2m fields as sorted id lists)
+    of `model` row `pk` as of `when`, or None if it did not exist then.
+
+    Starts from the current row and undoes the history recorded after
+    `when`, newest first, so only recent history is read and records that
+    predate the history table still come out right.
+    """
+    history_model, attname = TRACKED[model]
+    obj = model._base_manager.filter(pk=pk).first()
+    if obj is None:
+        state = None
+    else:
+        state = _row_values(obj)
+        for field in model._meta.many_to_many:
+            state[field.name] = _m2m_ids(obj, field.name)
+    later = (
+        history_model.objects.filter(**{attname: pk, "changed_at__gt": when})
+        .order_by("-changed_at", "-pk")
+        .values_list("action", "changes")
+    )
+    for action, changes in later:
+        if action == HistoryAction.CREATE:
+            state = None
+            continue
+        if state is None:
+            # Undoing a delete starts from the snapshot it recorded.
+            state = {field.name: field.get_default() for field in tracked_fields(model)}
+            state.update({field.name: [] for field in model._meta.many_to_many})
+        for name, (old, new) in changes.items():
+            field = model._meta.get_field(name)
+            state[name] = old if field.many_to_many else _python(field, old)
+    return state
+
+
+def display_values(model, values):
+    """
+    Texts for recorded (field name, value) pairs of `model`: choice labels,
+    and names for related ids, fetched with one in_bulk() per related model.
+    """
+    ids = {}
+    for name, value in values:
+        field = model._meta.get_field(name)
+        if field.is_relation and not _is_empty(value):
+            ids.setdefault(field.related_model, set()).update(
+                value if field.many_to_many else [value]
+            )
+    names = {
+        related: related._base_manager.in_bulk(pks) for related, pks in ids.items()
+    }
+
+    def name_of(field, pk):
+        return str(names[field.related_model].get(pk, f"#{pk}"))
+
+    texts = []
+    for name, value in values:
+        field = model._meta.get_field(name)
+        if _is_empty(value):
+            texts.append("-")
+        elif field.many_to_many:
+            texts.append("; ".join(name_of(field, pk) for pk in value))
+        elif field.is_relation:
+            texts.append(name_of(field, value))
+        elif field.choices:
+            texts.append(str(dict(field.flatchoices).get(value, value)))
+        else:
+            texts.append(str(value))
+    return texts
@@ -0,0 +1,344 @@
+# core/loadtest.py
+# An asyncio HTTP load generator for `manage.py load_test`.
+#
+# Virtual users are coroutines, each with its own keep-alive connection
+# and cookie jar, so hundreds of them fit in one process without threads.
+# Every user logs in through django.contrib.auth's login form, then until
+# the run ends picks a weighted step from its scenario (readers' or
+# writers'), requests it and records the latency. POST steps send the
+# CSRF cookie back as the form token, like a browser submitting a form.
+# The client speaks just enough HTTP/1.1 for a Django server: no TLS, no
+# redirects followed (a 302 after a POST counts as success).
+#
+# A scenario is a JSON file:
+#
+#   {
+#     "users": {"readers": 8, "writers": 2},
+#     "think_time": 0.0,
+#     "readers": [
+#       {"name": "concert_detail", "url": "concert_detail",
+#        "pk": "concerts.Concert", "weight": 5},
+#       {"name": "piece_search", "url": "piece_search",
+#        "params": {"q": ["march", "suite"]}, "weight": 1}
+#     ],
+#     "writers": [
+#       {"name": "genre_create", "url": "genre_create", "method": "POST",
+#        "form": {"name": "Load Test Genre {n}"}, "weight": 1}
+#     ]
+#   }
+#
+# `url` is a URL name, `pk` names the model whose rows fill the URL's pk,
+# list values in `params` and `form` are chosen from at random, and {n}
+# in a form value is replaced by a number unique to the run.
+
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import NoReverseMatch, reverse
+
+# Upper bounds (ms) of the latency histogram buckets; the last is open.
+HISTOGRAM_BOUNDS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+PERCENTILES = [50, 90, 95, 99]
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+class HttpClient:
+    """One virtual user's keep-alive connection and cookies."""
+
+    def __init__(self, base_url, timeout=30.0):
+        parts = urlsplit(base_url)
+        if parts.scheme != "http":
+            raise ValueError("Only http:// servers can be load tested.")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def _read_body(self, headers):
+        if "content-length" in headers:
+            return await self.reader.readexactly(int(headers["content-length"]))
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if not size:
+                    await self.reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+        # No length: the body runs to the end of the connection.
+        body = await self.reader.read()
+        await self.close()
+        return body
+
+    async def request(self, method, path, form=None):
+        """Send one request; returns (status, headers, body)."""
+        body = urlencode(form, doseq=True).encode() if form is not None else b""
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Connection: keep-alive",
+            f"Content-Length: {len(body)}",
+        ]
+        if form is not None:
+            lines.append("Content-Type: application/x-www-form-urlencoded")
+        if self.cookies:
+            cookies = "; ".join(
+                f"{name}={value}" for name, value in self.cookies.items()
+            )
+            lines.append(f"Cookie: {cookies}")
+        message = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+        return await asyncio.wait_for(self._exchange(message), self.timeout)
+
+    async def _exchange(self, message, retry=True):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        try:
+            self.writer.write(message)
+            await self.writer.drain()
+            head = await self.reader.readuntil(b"\r\n\r\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The server closed an idle keep-alive connection; reconnect once.
+            await self.close()
+            if not retry:
+                raise
+            return await self._exchange(message, retry=False)
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        for line in filter(None, header_lines):
+            name, value = line.split(":", 1)
+            name = name.strip().lower()
+            if name == "set-cookie":
+                cookie = SimpleCookie()
+                cookie.load(value.strip())
+                for key, morsel in cookie.items():
+                    self.cookies[key] = morsel.value
+            headers[name] = value.strip()
+        body = await self._read_body(headers)
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, headers, body
+
+    async def login(self, login_path, username, password):
+        await self.request("GET", login_path)
+        status, _, _ = await self.request(
+            "POST",
+            login_path,
+            {
+                "username": username,
+                "password": password,
+                "csrfmiddlewaretoken": self.cookies.get("csrftoken", ""),
+            },
+        )
+        if status != 302 or "sessionid" not in self.cookies:
+            raise RuntimeError(f"Logging in as {username} failed (HTTP {status}).")
+
+
+class Step:
+    """One weighted request of a scenario."""
+
+    def __init__(self, spec, samples):
+        try:
+            self.name = spec.get("name", spec["url"])
+            self.url_name = spec["url"]
+            self.method = spec.get("method", "GET").upper()
+            self.weight = float(spec.get("weight", 1))
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            raise ScenarioError(f"Invalid step {spec!r}: {error}")
+        self.pks = samples.get(spec["pk"], []) if "pk" in spec else None
+        if self.pks == []:
+            raise ScenarioError(f"Step {self.name}: no {spec['pk']} rows to request.")
+        self.params = spec.get("params", {})
+        self.form = spec.get("form")
+        # Fail on unknown URL names before the run, not during it.
+        self.path(random.Random(0))
+
+    @staticmethod
+    def _pick(rng, value):
+        return rng.choice(value) if isinstance(value, list) else value
+
+    def path(self, rng):
+        kwargs = {"pk": rng.choice(self.pks)} if self.pks is not None else {}
+        try:
+            path = reverse(self.url_name, kwargs=kwargs)
+        except NoReverseMatch as error:
+            raise ScenarioError(f"Step {self.name}: {error}")
+        params = {name: self._pick(rng, value) for name, value in self.params.items()}
+        return f"{path}?{urlencode(params)}" if params else path
+
+    def form_data(self, rng, n, csrf_token):
+        data = {
+            name: str(self._pick(rng, value)).replace("{n}", str(n))
+            for name, value in (self.form or {}).items()
+        }
+        data["csrfmiddlewaretoken"] = csrf_token
+        return data
+
+
+class Scenario:
+    def __init__(self, spec, samples):
+        """`samples` maps each model label named by a step's "pk" to row pks."""
+        users = spec.get("users", {})
+        self.users = {role: int(users.get(role, 0)) for role in ("readers", "writers")}
+        self.think_time = float(spec.get("think_time", 0))
+        self.steps = {
+            role: [Step(step, samples) for step in spec.get(role, [])]
+            for role in ("readers", "writers")
+        }
+        for role, count in self.users.items():
+            if count and not self.steps[role]:
+                raise ScenarioError(f"The scenario has {role} but no {role} steps.")
+        if not sum(self.users.values()):
+            raise ScenarioError("The scenario has no users.")
+
+    @staticmethod
+    def models(spec):
+        """The model labels whose pks the scenario's steps need."""
+        return {
+            step["pk"]
+            for role in ("readers", "writers")
+            for step in spec.get(role, [])
+            if isinstance(step, dict) and "pk" in step
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(int)
+
+    def record(self, step, latency, status):
+        self.latencies[step].append(latency)
+        self.statuses[str(status)] += 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors[step] += 1
+
+
+def latency_summary(latencies, errors, seconds):
+    """Throughput, percentiles and histogram of latencies (in ms)."""
+    ordered = sorted(latencies)
+    count = len(ordered)
+    histogram = {f"<={bound}": 0 for bound in HISTOGRAM_BOUNDS}
+    histogram[f">{HISTOGRAM_BOUNDS[-1]}"] = 0
+    for latency in ordered:
+        for bound in HISTOGRAM_BOUNDS:
+            if latency <= bound:
+                histogram[f"<={bound}"] += 1
+                break
+        else:
+            histogram[f">{HISTOGRAM_BOUNDS[-1]}"] += 1
+    summary = {
+        "requests": count,
+        "errors": errors,
+        "rps": round(count / seconds, 2) if seconds else 0,
+        "mean_ms": round(statistics.fmean(ordered), 3) if ordered else 0,
+        "max_ms": round(ordered[-1], 3) if ordered else 0,
+    }
+    for p in PERCENTILES:
+        index = min(count - 1, int(count * p / 100))
+        summary[f"p{p}_ms"] = round(ordered[index], 3) if ordered else 0
+    summary["histogram_ms"] = histogram
+    return summary
+
+
+async def _user(client, steps, rng, deadline, recorder, counter, think):
+    weights = list(itertools.accumulate(step.weight for step in steps))
+    while time.monotonic() < deadline:
+        step = rng.choices(steps, cum_weights=weights)[0]
+        n = next(counter)
+        path = step.path(rng)
+        started = time.perf_counter()
+        try:
+            if step.method == "GET":
+                status, _, _ = await client.request("GET", path)
+            else:
+                if "csrftoken" not in client.cookies:
+                    await client.request("GET", path)
+                form = step.form_data(rng, n, client.cookies.get("csrftoken", ""))
+                status, _, _ = await client.request(step.method, path, form)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+            status = type(error).__name__
+            await client.close()
+        recorder.record(step.name, (time.perf_counter() - started) * 1000, status)
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+
+async def run_load(base_url, scenario, seconds, login=None, seed=0):
+    """
+    Run `scenario` against the server at `base_url` for `seconds`; `login`
+    is (login path, username, password). Returns the results as a dict.
+    """
+    rng = random.Random(seed)
+    counter = itertools.count(1)
+    recorder = Recorder()
+    think = scenario.think_time
+    clients = []
+    users = []
+    for role, count in scenario.users.items():
+        for _ in range(count):
+            client = HttpClient(base_url)
+            clients.append(client)
+            users.append((client, scenario.steps[role], random.Random(rng.random())))
+    try:
+        if login:
+            await asyncio.gather(*(client.login(*login) for client in clients))
+        started = time.monotonic()
+        deadline = started + seconds
+        await asyncio.gather(
+            *(
+                _user(client, steps, user_rng, deadline, recorder, counter, think)
+                for client, steps, user_rng in users
+            )
+        )
+        elapsed = time.monotonic() - started
+    finally:
+        for client in clients:
+            await client.close()
+
+    return {
+        "duration_s": round(elapsed, 3),
+        "users": scenario.users,
+        "statuses": dict(recorder.statuses),
+        "total": latency_summary(
+            [latency for values in recorder.latencies.values() for latency in values],
+            sum(recorder.errors.values()),
+            elapsed,
+        ),
+        "steps": {
+            name: latency_summary(values, recorder.errors[name], elapsed)
+            for name, values in sorted(recorder.latencies.items())
+        },
+    }
+
+
+def load_scenario(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as error:
+        raise ScenarioError(f"Cannot read scenario {path}: {error}")
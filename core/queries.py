@@ -0,0 +1,160 @@
+# core/queries.py
+# Per-request query instrumentation and query budgets.
+#
+# QueryBudgetMiddleware wraps every database connection with an execute
+# wrapper for the length of a request and records how many queries ran,
+# how long they took, and which SQL statements ran more than once: a
+# statement repeated with different parameters (one query per row of a
+# list) is the signature of an N+1 loop. A view that runs more queries
+# than its budget, or spends longer than QUERY_TIME_BUDGET_MS in the
+# database, is logged as a warning with its worst duplicates.
+#
+# Budgets are per URL name and method: QUERY_BUDGETS overrides QUERY_BUDGET
+# for the views named in it, and writes (POST and other unsafe methods),
+# which also validate, save and render or redirect, have their own
+# WRITE_QUERY_BUDGET and WRITE_QUERY_BUDGETS. core.testing's
+# QueryBudgetAssertionsMixin checks the same budgets in the test suite.
+#
+# The recorder also keeps statements slower than SLOW_QUERY_MS, except
+# transaction control and pragmas (which are slow only while they wait for
+# a lock), and hands them to SLOW_QUERY_HANDLER after the response: the
+# dotted path of a function taking ([(alias, sql, params, many, ms)], URL
+# name), library.slowqueries.record_slow_queries in this project.
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_BUDGET = 10
+DEFAULT_WRITE_QUERY_BUDGET = 30
+DEFAULT_QUERY_TIME_BUDGET_MS = 250
+DEFAULT_SLOW_QUERY_MS = 100
+
+# Statements never kept as slow queries.
+_TRANSACTION_CONTROL = re.compile(
+    r"\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|END|PRAGMA)\b", re.IGNORECASE
+)
+
+
+def query_budget(url_name, method="GET"):
+    """The most queries the view named `url_name` may run per `method` request."""
+    if method in ("GET", "HEAD", "OPTIONS"):
+        budgets = getattr(settings, "QUERY_BUDGETS", {})
+        default = getattr(settings, "QUERY_BUDGET", DEFAULT_QUERY_BUDGET)
+    else:
+        budgets = getattr(settings, "WRITE_QUERY_BUDGETS", {})
+        default = getattr(settings, "WRITE_QUERY_BUDGET", DEFAULT_WRITE_QUERY_BUDGET)
+    return budgets.get(url_name, default)
+
+
+def query_time_budget_ms():
+    return getattr(settings, "QUERY_TIME_BUDGET_MS", DEFAULT_QUERY_TIME_BUDGET_MS)
+
+
+def slow_query_ms():
+    """The duration from which a query is logged as slow; None turns it off."""
+    return getattr(settings, "SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS)
+
+
+def slow_query_handler():
+    """The function SLOW_QUERY_HANDLER names, or None."""
+    path = getattr(settings, "SLOW_QUERY_HANDLER", None)
+    return import_string(path) if path else None
+
+
+class QueryRecorder:
+    """
+    An execute wrapper counting and timing queries by SQL statement, and
+    keeping those that take `slow_ms` or longer.
+    """
+
+    def __init__(self, slow_ms=None):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+        self.slow_ms = slow_ms
+        # [(connection alias, sql, params, many, ms)]
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.duration += elapsed
+            self.count += 1
+            # Parameters are not part of the SQL, so the same query for
+            # different rows has the same signature.
+            self.signatures[sql] += 1
+            if (
+                self.slow_ms is not None
+                and elapsed * 1000 >= self.slow_ms
+                and not _TRANSACTION_CONTROL.match(sql)
+            ):
+                alias = context["connection"].alias
+                self.slow.append((alias, sql, params, many, elapsed * 1000))
+
+    def duplicates(self):
+        """[(sql, times)] for statements run more than once, most first."""
+        return [(sql, n) for sql, n in self.signatures.most_common() if n > 1]
+
+    def recording(self):
+        """Context manager recording the queries of every connection."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+class QueryBudgetMiddleware:
+    """
+    Record each request's query count, database time, duplicate and slow
+    queries, and log views that exceed their budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = request.queries = QueryRecorder(slow_query_ms())
+        with recorder.recording():
+            response = self.get_response(request)
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        # Profiled requests skip the caches, store the profile and run
+        # slower under the profiler: they are not representative.
+        if not getattr(request, "profiling", False):
+            self.check_budget(request, url_name, recorder)
+            handler = slow_query_handler()
+            if recorder.slow and handler is not None:
+                handler(recorder.slow, url_name)
+        return response
+
+    def check_budget(self, request, url_name, recorder):
+        budget = query_budget(url_name, request.method)
+        duration_ms = recorder.duration * 1000
+        if recorder.count <= budget and duration_ms <= query_time_budget_ms():
+            return
+        duplicates = "".join(
+            f"\n  {times}x {sql[:200]}" for sql, times in recorder.duplicates()[:5]
+        )
+        logger.warning(
+            "%s %s (%s) ran %d queries in %.1f ms (budget %d queries, %d ms)%s",
+            request.method,
+            request.path,
+            url_name or "-",
+            recorder.count,
+            duration_ms,
+            budget,
+            query_time_budget_ms(),
+            f"; repeated queries:{duplicates}" if duplicates else "",
+        )
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,15 +51,43 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Times the request's phases for the Server-Timing header (core/timing.py).
+    "core.timing.ServerTimingMiddleware",
+    # Counts and times each request's queries; logs views over budget.
+    "core.queries.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Buffers piece/concert history rows and writes them once per request.
+    "core.history.HistoryMiddleware",
+    # Profiles requests with ?profile=1 or X-Profile for staff.
+    "library.profiling.ProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # Marks where the view starts and ends; keep it last.
+    "core.timing.ViewTimingMiddleware",
 ]
 
+# Query budgets (core/queries.py): a request running more queries than
+# its view's budget, or spending longer in the database, is logged.
+# QUERY_BUDGETS maps URL names to budgets overriding QUERY_BUDGET; writes
+# (POST etc.) have their own WRITE_QUERY_BUDGET and WRITE_QUERY_BUDGETS.
+QUERY_BUDGET = 10
+QUERY_TIME_BUDGET_MS = 250
+QUERY_BUDGETS = {}
+WRITE_QUERY_BUDGET = 30
+WRITE_QUERY_BUDGETS = {}
+# Queries taking at least this many ms go to the slow query log
+# (library/slowqueries.py, `manage.py slow_queries`); None turns it off.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_HANDLER = "library.slowqueries.record_slow_queries"
+
+# Who gets the Server-Timing header (core/timing.py): "all", "staff" or
+# None. The per-request timings are also logged at INFO on "core.timing".
+SERVER_TIMING = "all" if DEBUG else "staff"
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -83,14 +112,61 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLite pragmas run on every new connection. WAL lets readers carry on
+# while a librarian's write is in progress (`manage.py
+# benchmark_sqlite_concurrency` measures this), and makes
+# synchronous=NORMAL safe: only checkpoints wait for fsync.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative values are KiB: a 64 MB page cache per connection.
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections open between requests instead of reconnecting
+        # (and re-running the pragmas) every time.
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Seconds to wait for a lock (the busy timeout) before
+            # "database is locked".
+            "timeout": 20,
+            "init_command": ";".join(
+                f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+            ),
+        },
     }
 }
 
 
+# Cache (catalog pages, see core/cache.py). The page cache's generation
+# counters must be shared by every worker process, or an edit in one of
+# them leaves the others serving (and answering 304 for) stale pages, so
+# the default is a file-based cache rather than the per-process locmem.
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": Path(tempfile.gettempdir()) / "music_library_cache",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
+# Count the page cache hits and misses of one request in this many
+# (core/cache.py, `manage.py page_cache_stats`); 0 turns counting off.
+PAGE_CACHE_STATS_SAMPLE = 100
+# Likewise the write lock waits of one write transaction in this many
+# (core/writes.py, `manage.py write_lock_stats`).
+WRITE_LOCK_STATS_SAMPLE = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -147,3 +223,10 @@ LOGOUT_REDIRECT_URL = "home"
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "tailwind"
 CRISPY_TEMPLATE_PACK = "tailwind"
+
+# Email (due/overdue digests from `manage.py check_due_items`). The console
+# backend prints messages; configure SMTP here for real delivery.
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+DEFAULT_FROM_EMAIL = "library@localhost"
+# Staff who receive the nightly due-items summary, as (name, email) pairs.
+MANAGERS = []
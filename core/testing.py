@@ -0,0 +1,107 @@
+# core/testing.py
+# Shared assertions for the apps' test suites.
+
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.queries import query_budget
+
+
+def list_view_queryset(view_class, reverse=False, **params):
+    """
+    The ordered queryset a keyset-paginated list view runs for its first
+    page (the last page when `reverse`), for inspecting its query plan.
+    """
+    view = view_class()
+    view.setup(RequestFactory().get("/", params))
+    ordering = view.get_keyset_ordering()
+    return view.get_queryset().order_by(*view._order_by(ordering, reverse=reverse))
+
+
+class QueryPlanAssertionsMixin:
+    """Assertions on SQLite's EXPLAIN QUERY PLAN output for a queryset."""
+
+    def index_name(self, model, index):
+        """
+        Resolve `index`, either the name of a Meta.indexes entry or a list
+        of fields (matching Meta.indexes or a single db_index=True field).
+        """
+        if isinstance(index, str):
+            return index
+        for meta_index in model._meta.indexes:
+            if list(meta_index.fields) == list(index):
+                return meta_index.name
+        if len(index) == 1 and model._meta.get_field(index[0]).db_index:
+            editor = connection.SchemaEditorClass(connection)
+            column = model._meta.get_field(index[0]).column
+            return editor._create_index_name(model._meta.db_table, [column])
+        self.fail(f"{model.__name__} has no index on {index}")
+
+    def assertUsesIndex(self, queryset, model, index):
+        """Assert the plan reads `model` through `index` (see index_name), unsorted."""
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plan assertions are written for SQLite.")
+        plan = queryset.explain()
+        table = model._meta.db_table
+        index = self.index_name(model, index)
+        self.assertRegex(
+            plan,
+            rf"(SCAN|SEARCH) {table} USING (COVERING )?INDEX {index}\b",
+            msg=f"{table} is not read through {index}:\n{plan}",
+        )
+        self.assertNotIn(
+            "TEMP B-TREE", plan, msg=f"Plan sorts in a temp B-tree:\n{plan}"
+        )
+
+
+class QueryBudgetAssertionsMixin:
+    """Assertions that views stay within their query budgets (core/queries.py)."""
+
+    def assertQueryBudgets(self, urlpatterns, url_kwargs=None, post_data=None):
+        """
+        GET every named URL in `urlpatterns` and fail for any that runs
+        more queries than query_budget() allows. `url_kwargs` maps the
+        names of URLs that take arguments to the kwargs to reverse them
+        with; a URL taking arguments but missing from it fails the test,
+        so new URLs cannot go unchecked. `post_data` maps URL names to
+        form data that is then POSTed to them, against the write budget.
+        """
+        url_kwargs = url_kwargs or {}
+        post_data = post_data or {}
+        for pattern in urlpatterns:
+            name = pattern.name
+            if name is None:
+                continue
+            with self.subTest(url_name=name):
+                kwargs = url_kwargs.get(name, {})
+                missing = set(pattern.pattern.converters) - set(kwargs)
+                if missing:
+                    self.fail(f"No {', '.join(sorted(missing))} given for {name}")
+                self.assertRequestWithinBudget(
+                    name, "GET", reverse(name, kwargs=kwargs)
+                )
+                if name in post_data:
+                    self.assertRequestWithinBudget(
+                        name, "POST", reverse(name, kwargs=kwargs), post_data[name]
+                    )
+
+    def assertRequestWithinBudget(self, name, method, url, data=None):
+        """Assert a GET or POST of `url`, named `name`, is within its budget."""
+        with CaptureQueriesContext(connection) as queries:
+            if method == "POST":
+                response = self.client.post(url, data)
+            else:
+                response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        budget = query_budget(name, method)
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertLessEqual(
+            len(sql),
+            budget,
+            msg=f"{method} {name} ran {len(sql)} queries (budget {budget}):\n"
+            + "\n".join(sql),
+        )
@@ -0,0 +1,173 @@
+# core/timing.py
+# Per-request phase timings, sent as a Server-Timing header and logged.
+#
+# ServerTimingMiddleware (first in MIDDLEWARE) and ViewTimingMiddleware
+# (last) bracket the request: the time outside the inner one is spent in
+# middleware, the time inside it in the view and template rendering,
+# which starts at process_template_response() and ends at the response's
+# post-render callback. The database count and time come from the
+# QueryRecorder of core.queries.QueryBudgetMiddleware.
+#
+# The header shows up in the browser's devtools (Network > Timing). With
+# SERVER_TIMING = "staff" it is only sent to staff users, which is
+# decided without loading the user on every request: whenever a response
+# is produced with the user already loaded (the login view, any page that
+# reads request.user), staff get a signed marker cookie and others lose
+# it. The marker is bound to the session key, so it stops working at
+# logout and cannot be carried to another session. The timings are also
+# logged at INFO on the "core.timing" logger as one JSON object per
+# request.
+#
+# The bookkeeping is a handful of perf_counter() calls and attribute
+# stores; building the header and log line only happens when they are
+# sent, keeping the overhead to a few microseconds per request.
+
+import json
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.utils.functional import empty
+
+logger = logging.getLogger(__name__)
+
+STAFF_COOKIE = "server_timing"
+STAFF_COOKIE_SALT = "core.timing"
+
+
+class RequestTiming:
+    __slots__ = ("start", "app_start", "app_end", "render_start", "render_end")
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.app_start = self.app_end = None
+        self.render_start = self.render_end = None
+
+    def rendered(self, response):
+        self.render_end = perf_counter()
+
+    def phases(self, end):
+        """{phase: ms} for middleware, view and template, plus the total."""
+        total = end - self.start
+        app = template = 0.0
+        if self.app_end is not None:
+            app = self.app_end - self.app_start
+        if self.render_end is not None:
+            template = self.render_end - self.render_start
+        return {
+            "total": total * 1000,
+            "middleware": (total - app) * 1000,
+            "view": (app - template) * 1000,
+            "template": template * 1000,
+        }
+
+
+def _loaded_user(request):
+    """request.user if something has loaded it already, otherwise None."""
+    user = getattr(request, "user", None)
+    if getattr(user, "_wrapped", None) is empty:
+        return None
+    return user
+
+
+class ServerTimingMiddleware:
+    """Time the request and report it (goes first in MIDDLEWARE)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request.server_timing = RequestTiming()
+        response = self.get_response(request)
+        end = perf_counter()
+        mode = getattr(settings, "SERVER_TIMING", "staff")
+        send = mode == "all" or (mode == "staff" and self.staff_marked(request))
+        if send or logger.isEnabledFor(logging.INFO):
+            phases = timing.phases(end)
+            queries = getattr(request, "queries", None)
+            if send:
+                response["Server-Timing"] = self.header(phases, queries)
+            self.log(request, response, phases, queries)
+        if mode == "staff":
+            self.update_staff_cookie(request, response)
+        return response
+
+    def staff_marked(self, request):
+        """Whether the request has a valid marker for its current session."""
+        session = getattr(request, "session", None)
+        if STAFF_COOKIE not in request.COOKIES or session is None:
+            return False
+        value = request.get_signed_cookie(
+            STAFF_COOKIE,
+            default=None,
+            salt=STAFF_COOKIE_SALT,
+            max_age=settings.SESSION_COOKIE_AGE,
+        )
+        if value is None or session.session_key is None:
+            return False
+        return value.rpartition(":")[2] == session.session_key
+
+    def update_staff_cookie(self, request, response):
+        user = _loaded_user(request)
+        if user is None:
+            return
+        marked = STAFF_COOKIE in request.COOKIES
+        if user.is_staff and not self.staff_marked(request):
+            response.set_signed_cookie(
+                STAFF_COOKIE,
+                f"{user.pk}:{request.session.session_key}",
+                salt=STAFF_COOKIE_SALT,
+                max_age=settings.SESSION_COOKIE_AGE,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite="Lax",
+            )
+        elif marked and not user.is_staff:
+            response.delete_cookie(STAFF_COOKIE, samesite="Lax")
+
+    def header(self, phases, queries):
+        metrics = [f"{name};dur={ms:.2f}" for name, ms in phases.items()]
+        if queries is not None:
+            metrics.append(
+                f'db;dur={queries.duration * 1000:.2f};desc="{queries.count} queries"'
+            )
+        return ", ".join(metrics)
+
+    def log(self, request, response, phases, queries):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        match = request.resolver_match
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.url_name if match else None,
+            "status": response.status_code,
+            **{f"{name}_ms": round(ms, 2) for name, ms in phases.items()},
+        }
+        if queries is not None:
+            fields["db_ms"] = round(queries.duration * 1000, 2)
+            fields["db_queries"] = queries.count
+        logger.info(json.dumps(fields), extra={"timing": fields})
+
+
+class ViewTimingMiddleware:
+    """Mark where the view and template rendering start and end (goes last)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = getattr(request, "server_timing", None)
+        if timing is None:
+            return self.get_response(request)
+        timing.app_start = perf_counter()
+        response = self.get_response(request)
+        timing.app_end = perf_counter()
+        return response
+
+    def process_template_response(self, request, response):
+        timing = getattr(request, "server_timing", None)
+        if timing is not None:
+            timing.render_start = perf_counter()
+            response.add_post_render_callback(timing.rendered)
+        return response
@@ -1,6 +1,11 @@
 # core/views.py
 # This file is for shared base class views.
 
+import base64
+import binascii
+import hashlib
+import json
+
 from django.views.generic import (
     ListView,
     DetailView,
@@ -9,9 +14,213 @@ from django.views.generic import (
     DeleteView,
 )
 from django.urls import reverse_lazy
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from core.cache import CachedPageMixin, generations
+from core.writes import WriteTransactionMixin
+
+
+class KeysetPage:
+    """One page of keyset-paginated results, shaped like a Django Page."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor (keyset) pagination for ListViews.
+
+    Instead of OFFSET, each page continues from the sort keys of the last
+    row shown, so deep pages cost the same as the first one and no COUNT(*)
+    is needed. Cursors are opaque tokens built from the ordering keys, which
+    default to the view's `ordering` (or the model's Meta.ordering) with the
+    primary key appended as a tie-breaker. NULLs always sort as the lowest
+    value so nullable keys such as PersonBase.first_name page correctly.
+    """
+
+    keyset_ordering = None
+    cursor_kwarg = "cursor"
+    # Set to False to also show the total number of rows (one extra COUNT).
+    skip_count = True
+
+    def get_keyset_ordering(self):
+        ordering = list(
+            self.keyset_ordering or self.get_ordering() or self.model._meta.ordering
+        )
+        pk_name = self.model._meta.pk.name
+        if not {"pk", pk_name} & {key.lstrip("-") for key in ordering}:
+            # Sort the tie-breaker the same way as the last key, so one
+            # index scan (indexes end with the rowid) serves the whole order.
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append(f"-{pk_name}" if descending else pk_name)
+        return [
+            ("-" if key.startswith("-") else "", self._keyset_field(key.lstrip("-")))
+            for key in ordering
+        ]
+
+    def _keyset_field(self, name):
+        return self.model._meta.pk if name == "pk" else self.model._meta.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        values = [
+            getattr(obj, field.attname) for _, field in self.get_keyset_ordering()
+        ]
+        data = json.dumps([direction, values], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        ordering = self.get_keyset_ordering()
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ("next", "prev") or len(values) != len(ordering):
+                raise ValueError
+            values = [
+                None if value is None else field.to_python(value)
+                for (_, field), value in zip(ordering, values)
+            ]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            raise Http404("Invalid cursor.")
+        return direction, values
+
+    def _order_by(self, ordering, reverse=False):
+        order_by = []
+        for sign, field in ordering:
+            descending = (sign == "-") != reverse
+            if descending:
+                order_by.append(F(field.name).desc(nulls_last=True))
+            else:
+                order_by.append(F(field.name).asc(nulls_first=True))
+        return order_by
+
+    def _after_q(self, ordering, values, reverse=False):
+        """Rows that sort strictly after `values` (before, when reversed)."""
+        after = Q(pk__in=[])
+        equal = Q()
+        for (sign, field), value in zip(ordering, values):
+            descending = (sign == "-") != reverse
+            name = field.name
+            # NULL sorts lowest: nothing is below it, everything else is above.
+            if value is None:
+                beyond = Q(pk__in=[]) if descending else Q(**{f"{name}__isnull": False})
+                same = Q(**{f"{name}__isnull": True})
+            elif descending:
+                beyond = Q(**{f"{name}__lt": value}) | Q(**{f"{name}__isnull": True})
+                same = Q(**{name: value})
+            else:
+                beyond = Q(**{f"{name}__gt": value})
+                same = Q(**{name: value})
+            after |= equal & beyond
+            equal &= same
+        return after
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        direction, values = self.decode_cursor(cursor) if cursor else ("next", None)
+        backwards = direction == "prev"
+
+        rows = queryset.order_by(*self._order_by(ordering, reverse=backwards))
+        if values is not None:
+            rows = rows.filter(self._after_q(ordering, values, reverse=backwards))
+        # One extra row tells us whether there is another page beyond this one.
+        rows = list(rows[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else values is not None
+        page = KeysetPage(
+            rows,
+            next_cursor=(
+                self.encode_cursor(rows[-1], "next") if rows and has_next else None
+            ),
+            previous_cursor=(
+                self.encode_cursor(rows[0], "prev") if rows and has_previous else None
+            ),
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if not self.skip_count:
+            context["total_count"] = self.object_list.count()
+        return context
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET for DetailViews of models with an `updated_at` field.
+
+    The ETag comes from one indexed lookup of the object's updated_at, plus
+    the page cache generations of the models it shows (core/cache.py), which
+    also catch edits to related rows. A matching If-None-Match gets a 304
+    before the object, its relations or the template are touched. There is
+    no Last-Modified: updated_at does not move when a related row is edited,
+    so If-Modified-Since would keep serving stale pages. List it before
+    CachedPageMixin so cached pages carry the ETag too.
+    """
+
+    def get_etag(self):
+        """The page's ETag, or None to skip the conditional check."""
+        updated_at = (
+            self.get_queryset()
+            .filter(pk=self.kwargs.get(self.pk_url_kwarg))
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+        if updated_at is None:
+            return None
+        models = (
+            self.get_cache_models()
+            if hasattr(self, "get_cache_models")
+            else [self.model]
+        )
+        version = f"{updated_at.isoformat()}:{generations(models)}"
+        return quote_etag(hashlib.md5(version.encode()).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or getattr(
+            request, "profiling", False
+        ):
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_etag()
+        if etag is None:
+            return super().dispatch(request, *args, **kwargs)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers.setdefault("ETag", etag)
+        return response
 
 
-class PersonBaseListView(ListView):
+class PersonBaseListView(CachedPageMixin, KeysetPaginationMixin, ListView):
     template_name = "people/person_list.html"  # generic template
     context_object_name = "people"
     paginate_by = 20
@@ -25,7 +234,7 @@ class PersonBaseListView(ListView):
     # Must specify a model in subclasses
 
 
-class PersonBaseDetailView(DetailView):
+class PersonBaseDetailView(ConditionalGetMixin, CachedPageMixin, DetailView):
     template_name = "people/person_detail.html"  # generic template
     context_object_name = "person"
 
@@ -37,7 +246,7 @@ class PersonBaseDetailView(DetailView):
         return context
 
 
-class PersonBaseCreateView(CreateView):
+class PersonBaseCreateView(WriteTransactionMixin, CreateView):
     template_name = "people/person_form.html"  # generic template
     success_url = reverse_lazy("person_list")  # where to go after successful creation
 
@@ -56,7 +265,7 @@ class PersonBaseCreateView(CreateView):
         return self.model._meta.verbose_name
 
 
-class PersonBaseUpdateView(UpdateView):
+class PersonBaseUpdateView(WriteTransactionMixin, UpdateView):
     template_name = "people/person_form.html"  # generic template
     success_url = reverse_lazy("person_list")
 
@@ -75,7 +284,7 @@ class PersonBaseUpdateView(UpdateView):
         return self.model._meta.verbose_name
 
 
-class PersonBaseDeleteView(DeleteView):
+class PersonBaseDeleteView(WriteTransactionMixin, DeleteView):
     template_name = "people/person_confirm_delete.html"  # generic template
     success_url = reverse_lazy("person_list")
 
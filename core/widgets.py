@@ -0,0 +1,116 @@
+# core/widgets.py
+# Lightweight form widgets.
+#
+# A plain Select renders an <option> for every row of the related table;
+# the Autocomplete widgets render only the currently selected options and
+# leave the rest to static/js/autocomplete.js, which queries the JSON
+# endpoints in core/autocomplete.py as you type. NativeDateInput and
+# StaticChoiceSelect keep the remaining fields cheap to render.
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+
+
+class AutocompleteMixin:
+    # Rows the form has already loaded for its value (see the concert
+    # program formset), so rendering the selected options needs no query.
+    known_objects = ()
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.attrs["data-autocomplete-url"] = reverse_lazy(url_name)
+
+    class Media:
+        js = ["js/autocomplete.js"]
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        selected = [str(v) for v in value if v not in ("", None)]
+        options = []
+        if not self.allow_multiple_selected and not self.is_required:
+            options.append(
+                self.create_option(
+                    name,
+                    "",
+                    choices.field.empty_label or "",
+                    not selected,
+                    0,
+                    attrs=attrs,
+                )
+            )
+        if selected:
+            key = choices.field.to_field_name or "pk"
+            known = {
+                str(choices.field.prepare_value(obj)): obj for obj in self.known_objects
+            }
+            if all(value in known for value in selected):
+                objects = [known[value] for value in selected]
+            else:
+                try:
+                    objects = list(choices.queryset.filter(**{f"{key}__in": selected}))
+                except (ValueError, TypeError, ValidationError):
+                    objects = []
+            for obj in objects:
+                options.append(
+                    self.create_option(
+                        name,
+                        choices.field.prepare_value(obj),
+                        choices.field.label_from_instance(obj),
+                        True,
+                        len(options),
+                        attrs=attrs,
+                    )
+                )
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
+
+
+class NativeDateInput(forms.DateInput):
+    """<input type="date">, in place of SelectDateWidget's three <select>s."""
+
+    input_type = "date"
+
+    def __init__(self, attrs=None, format="%Y-%m-%d"):
+        # Browsers only accept ISO dates in the value attribute.
+        super().__init__(attrs, format=format)
+
+
+class StaticChoiceSelect(forms.Select):
+    """
+    A <select> for fixed choices (such as PieceStatus) whose options are
+    built once per name/value/attrs and reused.
+
+    The memo is created with the widget and shared by the copies Django
+    makes of it for every form, so it lives as long as the form class that
+    declares the widget. crispy-tailwind still renders it like any other
+    Select, asking optgroups() for the options.
+    """
+
+    cache_size = 256
+
+    def __init__(self, attrs=None, choices=()):
+        super().__init__(attrs, choices)
+        self._optgroups = {}
+
+    def optgroups(self, name, value, attrs=None):
+        key = (
+            tuple(self.choices),
+            name,
+            tuple(str(v) for v in value),
+            tuple(sorted((attrs or {}).items())),
+        )
+        groups = self._optgroups.get(key)
+        if groups is None:
+            if len(self._optgroups) >= self.cache_size:
+                self._optgroups.clear()
+            groups = super().optgroups(name, value, attrs)
+            self._optgroups[key] = groups
+        return groups
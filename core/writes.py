@@ -0,0 +1,187 @@
+# core/writes.py
+# Write transactions that queue politely for SQLite's single writer lock.
+#
+# A plain atomic() starts a deferred transaction: it reads first and only
+# asks for the write lock at its first INSERT/UPDATE. If another connection
+# committed in between, SQLite cannot upgrade the stale read snapshot and
+# fails at once with "database is locked", whatever the busy timeout.
+# write_atomic() instead opens the transaction with BEGIN IMMEDIATE, which
+# takes the write lock up front. Each attempt waits only ATTEMPT_TIMEOUT in
+# SQLite's busy handler; when the lock is still busy it backs off with
+# jitter and tries again until the connection's timeout (OPTIONS["timeout"])
+# has passed, so concurrent edits queue instead of failing. The time spent
+# waiting for the lock is counted in the cache, for one transaction in
+# WRITE_LOCK_STATS_SAMPLE and only once its lock is released (like the page
+# cache counters, a file-based cache incr is slow); `manage.py
+# write_lock_stats` reports it. The pre_commit signal lets other writes
+# (the change history) join the transaction before it ends.
+
+import logging
+import random
+import time
+from contextlib import ExitStack
+from itertools import count
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, transaction
+from django.dispatch import Signal
+
+from core.cache import incr_counter
+
+logger = logging.getLogger(__name__)
+
+# Each BEGIN IMMEDIATE waits up to ATTEMPT_TIMEOUT seconds in SQLite's busy
+# handler, with a jittered exponential backoff in between attempts, while
+# the connection's timeout has not run out.
+ATTEMPT_TIMEOUT = 0.1
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 1.0
+
+# Sent with `using` when a write_atomic() block's function has returned,
+# inside its transaction.
+pre_commit = Signal()
+
+DEFAULT_WRITE_LOCK_STATS_SAMPLE = 10
+# Waits at least this long are counted as slow.
+SLOW_WAIT_MS = 100
+
+STATS = ["transactions", "retries", "failures", "wait_us", "slow_waits"]
+
+
+def _stats_key(name):
+    return f"write_lock:{name}"
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def backoff(attempt):
+    """Seconds to sleep before retry number `attempt` (from 0)."""
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def lock_timeout(connection):
+    """Seconds the connection waits for a lock (sqlite3's default is 5)."""
+    return connection.settings_dict["OPTIONS"].get("timeout", 5)
+
+
+def _set_busy_timeout(connection, seconds):
+    # Straight on the sqlite3 handle: the pragma only sets the busy
+    # handler's timeout and touches no data.
+    connection.connection.execute(f"PRAGMA busy_timeout = {int(seconds * 1000)}")
+
+
+def _begin_immediate(connection):
+    """Open the outermost atomic block with BEGIN IMMEDIATE and return it."""
+    block = transaction.atomic(using=connection.alias)
+    mode = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        block.__enter__()
+    finally:
+        connection.transaction_mode = mode
+    return block
+
+
+def _record(waited, retries, failed=False):
+    """
+    Count a transaction's lock wait, for a sample of the transactions
+    weighted to match. Failures are rare and always counted.
+    """
+    sample = getattr(
+        settings, "WRITE_LOCK_STATS_SAMPLE", DEFAULT_WRITE_LOCK_STATS_SAMPLE
+    )
+    if failed:
+        weight = 1
+    elif sample and random.randrange(sample) == 0:
+        weight = sample
+    else:
+        return
+    incr_counter(_stats_key("transactions"), weight)
+    if retries:
+        incr_counter(_stats_key("retries"), retries * weight)
+    if failed:
+        incr_counter(_stats_key("failures"))
+    incr_counter(_stats_key("wait_us"), int(waited * 1_000_000) * weight)
+    if waited * 1000 >= SLOW_WAIT_MS:
+        incr_counter(_stats_key("slow_waits"), weight)
+
+
+def write_atomic(func, *args, using=None, **kwargs):
+    """
+    Call func(*args, **kwargs) in a transaction that holds the write lock
+    from its start, retrying the lock with jittered backoff while another
+    connection is writing. Inside an existing transaction (which already
+    has its locks) or on other databases it is a plain atomic().
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            return _call(connection, func, *args, **kwargs)
+    started = time.perf_counter()
+    deadline = started + lock_timeout(connection)
+    connection.ensure_connection()
+    _set_busy_timeout(connection, ATTEMPT_TIMEOUT)
+    try:
+        for attempt in count():
+            try:
+                block = _begin_immediate(connection)
+            except OperationalError as error:
+                remaining = deadline - time.perf_counter()
+                if not is_lock_error(error) or remaining <= 0:
+                    _record(time.perf_counter() - started, attempt, failed=True)
+                    raise
+                delay = min(backoff(attempt), remaining)
+                logger.info("Write lock busy, retrying in %.0f ms", delay * 1000)
+                time.sleep(delay)
+                continue
+            waited = time.perf_counter() - started
+            break
+    finally:
+        _set_busy_timeout(connection, lock_timeout(connection))
+    try:
+        with ExitStack() as stack:
+            stack.push(block)
+            return _call(connection, func, *args, **kwargs)
+    finally:
+        # After the commit or rollback, so not while holding the lock.
+        _record(waited, attempt)
+
+
+def _call(connection, func, *args, **kwargs):
+    result = func(*args, **kwargs)
+    pre_commit.send(sender=write_atomic, using=connection.alias)
+    return result
+
+
+def write_lock_stats():
+    """The write lock counters, with the mean wait per transaction."""
+    stats = {name: 0 for name in STATS}
+    stats.update(
+        {
+            name.split(":", 1)[1]: value
+            for name, value in cache.get_many(
+                [_stats_key(name) for name in STATS]
+            ).items()
+        }
+    )
+    transactions = stats["transactions"]
+    stats["mean_wait_us"] = stats["wait_us"] // transactions if transactions else 0
+    return stats
+
+
+def reset_write_lock_stats():
+    cache.delete_many([_stats_key(name) for name in STATS])
+
+
+class WriteTransactionMixin:
+    """
+    For Create/Update/DeleteViews: run form_valid(), which saves or
+    deletes the object, inside write_atomic().
+    """
+
+    def form_valid(self, form):
+        return write_atomic(super().form_valid, form)
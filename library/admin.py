@@ -1,3 +1,193 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
 
-# Register your models here.
+from .models import Arranger, Composer, PieceHistory, RequestProfile
+from .people import (
+    could_be_same_person,
+    duplicate_groups,
+    merge_people,
+    most_complete_first,
+)
+from .profiling import top_functions
+
+
+class PersonAdmin(admin.ModelAdmin):
+    """Admin for PersonBase models, with duplicate merging."""
+
+    list_display = ["last_name", "first_name", "name_key"]
+    search_fields = ["last_name", "first_name"]
+    actions = ["merge_selected", "select_duplicates"]
+
+    def has_merge_permission(self, request):
+        # Merging changes the keeper and deletes the duplicates. (An action's
+        # permissions=["change", "delete"] would allow either one alone.)
+        return self.has_change_permission(request) and self.has_delete_permission(
+            request
+        )
+
+    @admin.action(
+        description="Merge selected into the most complete name",
+        permissions=["merge"],
+    )
+    def merge_selected(self, request, queryset):
+        """
+        Merge the selection into its most complete name, after a
+        confirmation page (like delete_selected). Only people that
+        duplicate_groups() would group together (the same last name and
+        compatible first names) can be merged.
+        """
+        people = most_complete_first(queryset)
+        if len(people) < 2:
+            self.message_user(
+                request, "Select at least two people to merge.", messages.WARNING
+            )
+            return
+        keeper, *duplicates = people
+        mismatched = [
+            person for person in duplicates if not could_be_same_person(person, people)
+        ]
+        if mismatched:
+            self.message_user(
+                request,
+                f"Not merged: {', '.join(map(str, mismatched))} may not be the "
+                f"same person as {keeper}.",
+                messages.ERROR,
+            )
+            return
+        if request.POST.get("post"):
+            merged = merge_people(keeper, duplicates)
+            self.message_user(request, f"Merged {merged} record(s) into {keeper}.")
+            return
+        request.current_app = self.admin_site.name
+        return TemplateResponse(
+            request,
+            "admin/merge_selected_confirmation.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": f"Merge {self.model._meta.verbose_name_plural}",
+                "opts": self.model._meta,
+                "keeper": keeper,
+                "duplicates": duplicates,
+                "people": people,
+                "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+                "media": self.media,
+            },
+        )
+
+    @admin.action(description="Show likely duplicates")
+    def select_duplicates(self, request, queryset):
+        # Checks the whole table; the selection only triggers the action.
+        groups = list(duplicate_groups(self.model))
+        if not groups:
+            self.message_user(request, "No likely duplicates found.")
+            return
+        for group in groups:
+            self.message_user(
+                request,
+                " / ".join(f"{person} (#{person.pk})" for person in group),
+                messages.WARNING,
+            )
+
+
+class HistoryAdmin(admin.ModelAdmin):
+    """Read-only admin for the append-only history models."""
+
+    list_display = ["changed_at", "action", "user", "changes"]
+    list_filter = ["action"]
+    list_select_related = ["user"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Profiles stored by library/profiling.py: top functions and every query."""
+
+    list_display = [
+        "created_at",
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "user",
+    ]
+    list_filter = ["method", "status_code"]
+    list_select_related = ["user"]
+    search_fields = ["path", "view_name"]
+    fields = [
+        "created_at",
+        "user",
+        "method",
+        "path",
+        "view_name",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "query_ms",
+        "download",
+        "functions",
+        "query_list",
+    ]
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Profile data")
+    def download(self, obj):
+        url = reverse("admin:library_requestprofile_download", args=[obj.pk])
+        return format_html('<a href="{}">profile-{}.prof</a>', url, obj.pk)
+
+    @admin.display(description="Top functions by cumulative time")
+    def functions(self, obj):
+        return format_html("<pre>{}</pre>", top_functions(bytes(obj.stats)))
+
+    @admin.display(description="Queries (ms, origin, SQL)")
+    def query_list(self, obj):
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>",
+            ((query["ms"], query["origin"], query["sql"]) for query in obj.queries),
+        )
+        return format_html("<table>{}</table>", rows)
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="library_requestprofile_download",
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(
+            bytes(profile.stats), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = f'attachment; filename="profile-{pk}.prof"'
+        return response
+
+
+admin.site.register(Composer, PersonAdmin)
+admin.site.register(Arranger, PersonAdmin)
+admin.site.register(PieceHistory, HistoryAdmin)
+admin.site.register(RequestProfile, RequestProfileAdmin)
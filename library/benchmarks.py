@@ -0,0 +1,125 @@
+# library/benchmarks.py
+# Timings of the catalog's main list, detail and search pages, used by
+# `manage.py run_benchmarks` against a database filled by
+# `manage.py seed_benchmark_data`.
+#
+# A view benchmark calls the view's get() directly, skipping dispatch(),
+# so neither the page cache nor conditional GET can answer for it, and
+# renders the response: the timing covers the view's querysets and any
+# lazy queries its template makes. The other benchmarks time a queryset
+# or search on its own. Results are plain dicts, written out as JSON so
+# runs from different commits can be compared.
+
+import statistics
+import time
+
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from concerts.models import Concert
+from concerts.views import ConcertDetailView, ConcertListView
+from . import search
+from .facets import PieceFacets
+from .models import Piece, PieceStatus
+from .views import (
+    ComposerDetailView,
+    ComposerListView,
+    PieceDetailView,
+    PieceListView,
+    PieceSearchView,
+)
+
+SEARCH_TERM = "overture"
+
+
+def render_view(view_class, params=None, **kwargs):
+    request = RequestFactory().get("/", params or {})
+    view = view_class()
+    view.setup(request, **kwargs)
+    response = view.get(request, **kwargs)
+    if hasattr(response, "render"):
+        response.render()
+    return response
+
+
+def _middle(queryset):
+    """The row halfway through `queryset` in pk order, so runs pick the same one."""
+    queryset = queryset.order_by("pk")
+    return queryset[queryset.count() // 2]
+
+
+def benchmarks():
+    """{name: callable} for every benchmark, with sample rows picked."""
+    piece = _middle(Piece.objects.filter(composer__isnull=False).distinct())
+    composer = piece.composer.first()
+    concert = _middle(Concert.objects.all())
+    genre = piece.genre.first()
+    filtered = {"status": PieceStatus.OWNED, "genre": genre.pk if genre else ""}
+    return {
+        "piece_list": lambda: render_view(PieceListView),
+        "piece_list_filtered": lambda: render_view(PieceListView, filtered),
+        "piece_detail": lambda: render_view(PieceDetailView, pk=piece.pk),
+        "piece_search": lambda: render_view(PieceSearchView, {"q": SEARCH_TERM}),
+        "piece_facet_counts": lambda: PieceFacets(
+            RequestFactory().get("/", filtered).GET
+        ).counts(),
+        "search_index": lambda: search.search(SEARCH_TERM),
+        "composer_list": lambda: render_view(ComposerListView),
+        "composer_detail": lambda: render_view(ComposerDetailView, pk=composer.pk),
+        "concert_list": lambda: render_view(ConcertListView),
+        "concert_detail": lambda: render_view(ConcertDetailView, pk=concert.pk),
+    }
+
+
+def run_benchmark(func, iterations):
+    """Time `func`: one counted warm-up run, then `iterations` timed ones."""
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "queries": len(queries),
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def run_benchmarks(iterations=20, names=None):
+    """{name: result} for the benchmarks in `names` (default: all)."""
+    cases = benchmarks()
+    unknown = set(names or []) - set(cases)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    return {
+        name: run_benchmark(func, iterations)
+        for name, func in cases.items()
+        if not names or name in names
+    }
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    [(name, baseline median, median, change)] for benchmarks in both runs,
+    where change is "slower"/"faster" if the median moved by more than
+    `threshold` (a fraction) and "" otherwise.
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_ms"], result["median_ms"]
+        ratio = after / before - 1 if before else 0
+        change = ""
+        if ratio > threshold:
+            change = "slower"
+        elif ratio < -threshold:
+            change = "faster"
+        rows.append((name, before, after, change))
+    return rows
@@ -0,0 +1,74 @@
+# library/exports.py
+# Row generators for the piece catalog export (see core/exports.py).
+
+from .models import Piece
+
+PIECE_EXPORT_HEADER = [
+    "id",
+    "title",
+    "composers",
+    "arrangers",
+    "genres",
+    "publisher",
+    "difficulty",
+    "status",
+    "location_drawer",
+    "location_number",
+    "rental_organization",
+    "rental_start_date",
+    "rental_end_date",
+    "rental_cost",
+    "loaning_organization",
+    "loaning_start_date",
+    "loaning_end_date",
+    "borrowing_organization",
+    "borrowing_start_date",
+    "borrowing_end_date",
+    "copyright_date",
+    "purchase_date",
+    "notes",
+]
+
+
+def _name(obj):
+    return obj.name if obj else ""
+
+
+def piece_export_rows(chunk_size=2000):
+    """
+    Yield one row per piece. The queryset is read with iterator() and
+    credits come from the cached text columns, so memory stays flat and
+    each chunk is a single query.
+    """
+    pieces = Piece.objects.select_related(
+        "publisher",
+        "rental_organization",
+        "loaning_organization",
+        "borrowing_organization",
+    ).order_by("pk")
+    for piece in pieces.iterator(chunk_size=chunk_size):
+        yield [
+            piece.pk,
+            piece.title,
+            piece.composers_text,
+            piece.arrangers_text,
+            piece.genres_text,
+            _name(piece.publisher),
+            piece.difficulty,
+            piece.status,
+            piece.location_drawer,
+            piece.location_number,
+            _name(piece.rental_organization),
+            piece.rental_start_date,
+            piece.rental_end_date,
+            piece.rental_cost,
+            _name(piece.loaning_organization),
+            piece.loaning_start_date,
+            piece.loaning_end_date,
+            _name(piece.borrowing_organization),
+            piece.borrowing_start_date,
+            piece.borrowing_end_date,
+            piece.copyright_date,
+            piece.purchase_date,
+            piece.notes,
+        ]
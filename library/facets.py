@@ -0,0 +1,186 @@
+# library/facets.py
+# Faceted filtering for the piece catalog.
+#
+# Each facet filters the catalog and reports a live count per option. The
+# counts for one facet honour the filters selected on every *other* facet,
+# so picking "March" still shows how many pieces each other genre has.
+# Every facet is counted with a single GROUP BY query.
+
+from urllib.parse import urlencode
+
+from django.db.models import Case, CharField, Count, Q, Value, When
+
+from .models import Piece, PieceDifficulty, PieceStatus
+
+# (key, label, first birth year, last birth year); None leaves a side open.
+COMPOSER_ERAS = [
+    ("baroque", "Baroque (born before 1700)", None, 1699),
+    ("classical", "Classical (born 1700-1769)", 1700, 1769),
+    ("romantic", "Romantic (born 1770-1859)", 1770, 1859),
+    ("modern", "Modern (born 1860-1929)", 1860, 1929),
+    ("contemporary", "Contemporary (born 1930 or later)", 1930, None),
+]
+
+# Facet names (also the query-string keys) and their headings, in display order.
+FACETS = [
+    ("status", "Status"),
+    ("difficulty", "Difficulty"),
+    ("genre", "Genre"),
+    ("publisher", "Publisher"),
+    ("era", "Composer Era"),
+]
+
+GenreLink = Piece.genre.through
+ComposerLink = Piece.composer.through
+
+
+def _birth_year_q(first, last, prefix=""):
+    q = Q()
+    if first is not None:
+        q &= Q(**{f"{prefix}birth_year__gte": first})
+    if last is not None:
+        q &= Q(**{f"{prefix}birth_year__lte": last})
+    return q
+
+
+def _era_annotation(prefix):
+    return Case(
+        *[
+            When(_birth_year_q(first, last, prefix), then=Value(key))
+            for key, _, first, last in COMPOSER_ERAS
+        ],
+        default=Value(""),
+        output_field=CharField(),
+    )
+
+
+class PieceFacets:
+    """Selected facet values parsed from a request's query string."""
+
+    def __init__(self, params):
+        self.selected = {}
+        for facet, _ in FACETS:
+            values = [value for value in params.getlist(facet) if value]
+            if facet in ("genre", "publisher"):
+                values = [int(value) for value in values if value.isdigit()]
+            if facet == "era":
+                eras = {key for key, *_ in COMPOSER_ERAS}
+                values = [value for value in values if value in eras]
+            if values:
+                self.selected[facet] = values
+
+    def _filter_q(self, facet, values):
+        if facet in ("status", "difficulty"):
+            return Q(**{f"{facet}__in": values})
+        if facet == "publisher":
+            return Q(publisher_id__in=values)
+        if facet == "genre":
+            # A subquery on the through table avoids duplicate rows from a join.
+            return Q(
+                pk__in=GenreLink.objects.filter(genre_id__in=values).values("piece_id")
+            )
+        if facet == "era":
+            eras = Q()
+            for key, _, first, last in COMPOSER_ERAS:
+                if key in values:
+                    eras |= _birth_year_q(first, last, "composer__")
+            return Q(pk__in=ComposerLink.objects.filter(eras).values("piece_id"))
+        raise ValueError(f"Unknown facet: {facet}")
+
+    def filter(self, queryset, exclude=None):
+        """Apply every selected facet, except `exclude`, to `queryset`."""
+        for facet, values in self.selected.items():
+            if facet != exclude:
+                queryset = queryset.filter(self._filter_q(facet, values))
+        return queryset
+
+    def querystring(self, facet, value):
+        """The query string that toggles `value` on `facet` (and resets paging)."""
+        pairs = [
+            (name, str(selected))
+            for name, values in self.selected.items()
+            for selected in values
+        ]
+        pair = (facet, str(value))
+        if pair in pairs:
+            pairs.remove(pair)
+        else:
+            pairs.append(pair)
+        return urlencode(pairs)
+
+    def _options(self, facet, rows, labels=None):
+        """Build option dicts from (value, label, count) rows."""
+        selected = self.selected.get(facet, [])
+        counts = {value: (label, count) for value, label, count in rows}
+        if labels is None:
+            labels = [(value, label) for value, (label, _) in counts.items()]
+        options = []
+        for value, label in labels:
+            count = counts.get(value, (label, 0))[1]
+            if count or value in selected:
+                options.append(
+                    {
+                        "value": value,
+                        "label": label,
+                        "count": count,
+                        "selected": value in selected,
+                        "querystring": self.querystring(facet, value),
+                    }
+                )
+        return options
+
+    def counts(self):
+        """
+        Return the facets in display order, each as {"name", "title",
+        "options"}, with a live count for every option. Runs exactly one
+        aggregate query per facet.
+        """
+
+        def base(facet):
+            return self.filter(Piece.objects.all(), exclude=facet).order_by()
+
+        facets = {}
+        for facet, choices in (
+            ("status", PieceStatus),
+            ("difficulty", PieceDifficulty),
+        ):
+            rows = base(facet).values_list(facet).annotate(count=Count("pk"))
+            facets[facet] = self._options(
+                facet,
+                [(value, "", count) for value, count in rows],
+                labels=[(value, label) for value, label in choices.choices if value],
+            )
+
+        rows = (
+            base("publisher")
+            .filter(publisher__isnull=False)
+            .values_list("publisher_id", "publisher__name")
+            .annotate(count=Count("pk"))
+            .order_by("publisher__name")
+        )
+        facets["publisher"] = self._options("publisher", rows)
+
+        rows = (
+            GenreLink.objects.filter(piece_id__in=base("genre").values("pk"))
+            .values_list("genre_id", "genre__name")
+            .annotate(count=Count("piece_id"))
+            .order_by("genre__name")
+        )
+        facets["genre"] = self._options("genre", rows)
+
+        rows = (
+            ComposerLink.objects.filter(piece_id__in=base("era").values("pk"))
+            .annotate(era=_era_annotation("composer__"))
+            .values_list("era")
+            .annotate(count=Count("piece_id", distinct=True))
+            .order_by()
+        )
+        facets["era"] = self._options(
+            "era",
+            [(era, "", count) for era, count in rows],
+            labels=[(key, label) for key, label, *_ in COMPOSER_ERAS],
+        )
+        return [
+            {"name": name, "title": title, "options": facets[name]}
+            for name, title in FACETS
+        ]
@@ -3,6 +3,12 @@
 from django import forms
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
+from core.widgets import (
+    AutocompleteSelect,
+    AutocompleteSelectMultiple,
+    NativeDateInput,
+    StaticChoiceSelect,
+)
 from .models import Genre, Piece
 
 
@@ -17,21 +23,29 @@ class PieceForm(forms.ModelForm):
         model = Piece
         fields = "__all__"
         widgets = {
-            "composer": forms.SelectMultiple(),
-            "arranger": forms.SelectMultiple(),
-            "genre": forms.SelectMultiple(),
-            "difficulty": forms.Select(),
-            "status": forms.Select(),
-            "purchase_date": forms.SelectDateWidget(),
-            "rental_organization": forms.Select(),
-            "rental_start_date": forms.SelectDateWidget(),
-            "rental_end_date": forms.SelectDateWidget(),
-            "borrowing_organization": forms.Select(),
-            "borrowing_start_date": forms.SelectDateWidget(),
-            "borrowing_end_date": forms.SelectDateWidget(),
-            "loaning_organization": forms.Select(),
-            "loaning_start_date": forms.SelectDateWidget(),
-            "loaning_end_date": forms.SelectDateWidget(),
+            "composer": AutocompleteSelectMultiple("composer_autocomplete"),
+            "arranger": AutocompleteSelectMultiple("arranger_autocomplete"),
+            "genre": AutocompleteSelectMultiple("genre_autocomplete"),
+            "publisher": AutocompleteSelect("publisher_autocomplete"),
+            "difficulty": StaticChoiceSelect(),
+            "status": StaticChoiceSelect(),
+            "purchase_date": NativeDateInput(),
+            "rental_organization": AutocompleteSelect(
+                "rental_organization_autocomplete"
+            ),
+            "rental_start_date": NativeDateInput(),
+            "rental_end_date": NativeDateInput(),
+            "borrowing_organization": AutocompleteSelect(
+                "borrowing_organization_autocomplete"
+            ),
+            "borrowing_start_date": NativeDateInput(),
+            "borrowing_end_date": NativeDateInput(),
+            "loaning_organization": AutocompleteSelect(
+                "loaning_organization_autocomplete"
+            ),
+            "loaning_start_date": NativeDateInput(),
+            "loaning_end_date": NativeDateInput(),
+            "copyright_date": NativeDateInput(),
         }
 
     def __init__(self, *args, **kwargs):
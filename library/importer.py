@@ -0,0 +1,271 @@
+# library/importer.py
+# Bulk CSV import of pieces, used by `manage.py import_pieces`.
+#
+# Rows are streamed from the file and inserted in batches: pieces with one
+# bulk_create, then every composer/arranger/genre link with one bulk_create
+# per through table, each batch in its own transaction. Related rows are
+# resolved by name through an in-memory cache that is loaded once up front,
+# so a row costs no lookups of its own. Names first seen in a batch are
+# only queued while its rows are validated, and the ones used by rows that
+# pass are created with one bulk_create per model when the batch is
+# written, so rejected rows leave no related rows behind.
+
+import csv
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from core.cache import bump_generations
+from core.credits import refresh_credit_columns
+from . import search
+from .people import person_name_key
+from .models import (
+    PIECE_CREDIT_COLUMNS,
+    Arranger,
+    BorrowingOrganization,
+    Composer,
+    Genre,
+    LoaningOrganization,
+    Piece,
+    PieceDifficulty,
+    PieceStatus,
+    Publisher,
+    RentalOrganization,
+)
+
+# Columns holding several names separated by MULTI_VALUE_SEPARATOR.
+M2M_COLUMNS = {"composer": Composer, "arranger": Arranger, "genre": Genre}
+FK_COLUMNS = {
+    "publisher": Publisher,
+    "rental_organization": RentalOrganization,
+    "loaning_organization": LoaningOrganization,
+    "borrowing_organization": BorrowingOrganization,
+}
+TEXT_COLUMNS = ["title", "location_drawer", "location_number", "notes"]
+# Date and decimal columns, where an empty cell means NULL.
+NULLABLE_COLUMNS = [
+    "rental_start_date",
+    "rental_end_date",
+    "rental_cost",
+    "loaning_start_date",
+    "loaning_end_date",
+    "borrowing_start_date",
+    "borrowing_end_date",
+    "copyright_date",
+    "purchase_date",
+]
+MULTI_VALUE_SEPARATOR = ";"
+
+
+def normalize_name(name):
+    return " ".join(name.split()).casefold()
+
+
+def split_person_name(name):
+    """'Sousa, John Philip' or 'John Philip Sousa' -> (first, last)."""
+    name = " ".join(name.split())
+    if "," in name:
+        last, first = (part.strip() for part in name.split(",", 1))
+    elif " " in name:
+        first, last = name.rsplit(" ", 1)
+    else:
+        first, last = "", name
+    return first or None, last
+
+
+def _choice(choices, value):
+    """Accept either the stored value or the label of a TextChoices member."""
+    value = value.strip()
+    for member in choices:
+        if value.casefold() in (member.value.casefold(), member.label.casefold()):
+            return member.value
+    return value  # left for full_clean() to reject
+
+
+class NameCache:
+    """Name -> id lookups for one related model, creating missing rows."""
+
+    def __init__(self, model):
+        self.model = model
+        self.is_person = hasattr(model, "last_name")
+        self.ids = {}
+        if self.is_person:
+            for pk, first, last in model.objects.values_list(
+                "pk", "first_name", "last_name"
+            ):
+                self.ids.setdefault(self._key(first, last), pk)
+        else:
+            for pk, name in model.objects.values_list("pk", "name"):
+                self.ids.setdefault(normalize_name(name), pk)
+        # Key -> unsaved instance of a new name, until create_new().
+        self.new = {}
+        self.created = 0
+
+    def _key(self, first, last):
+        return normalize_name(f"{last}, {first or ''}")
+
+    def get(self, name):
+        """
+        (key, instance) for a name: an id-only instance for a known name,
+        otherwise the unsaved one queued for it (or a new one, for add()).
+        """
+        if self.is_person:
+            first, last = split_person_name(name)
+            key = self._key(first, last)
+        else:
+            key = normalize_name(name)
+        if key in self.ids:
+            return key, self.model(pk=self.ids[key])
+        if key in self.new:
+            return key, self.new[key]
+        if self.is_person:
+            # bulk_create() skips save(), which normally sets the key.
+            instance = self.model(
+                first_name=first, last_name=last, name_key=person_name_key(first, last)
+            )
+        else:
+            instance = self.model(name=" ".join(name.split()))
+            if hasattr(self.model, "contact_name"):
+                instance.contact_name = ""
+        return key, instance
+
+    def add(self, key, instance):
+        """Queue a new name, used by a valid row, for create_new()."""
+        if key not in self.ids:
+            self.new.setdefault(key, instance)
+
+    def create_new(self):
+        """Insert the queued names with one bulk_create."""
+        if not self.new:
+            return
+        self.model.objects.bulk_create(self.new.values())
+        for key, instance in self.new.items():
+            self.ids[key] = instance.pk
+        self.created += len(self.new)
+        self.new = {}
+        bump_generations(self.model)
+
+
+class PieceImporter:
+    """
+    Import pieces from CSV rows (dicts keyed by Piece field name).
+
+    Rows that fail field validation or Piece.clean() are collected in
+    `rejected` as (line number, message dict) and skipped; the rest of
+    their batch is still imported.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.caches = {
+            column: NameCache(model)
+            for column, model in {**M2M_COLUMNS, **FK_COLUMNS}.items()
+        }
+        self.imported = 0
+        self.rejected = []
+
+    def _names(self, value):
+        return [
+            name.strip()
+            for name in (value or "").split(MULTI_VALUE_SEPARATOR)
+            if name.strip()
+        ]
+
+    def build(self, row):
+        """Return (unsaved piece, {m2m column: [keys]}, search text) for a row."""
+        piece = Piece(
+            status=_choice(PieceStatus, row.get("status") or ""),
+            difficulty=_choice(PieceDifficulty, row.get("difficulty") or ""),
+            **{column: (row.get(column) or "").strip() for column in TEXT_COLUMNS},
+            **{
+                column: (row.get(column) or "").strip() or None
+                for column in NULLABLE_COLUMNS
+            },
+        )
+        names = []
+        for column in FK_COLUMNS:
+            name = (row.get(column) or "").strip()
+            if name:
+                # An id-only (or, for a new name, unsaved) instance satisfies
+                # clean() without a query.
+                key, instance = self.caches[column].get(name)
+                setattr(piece, column, instance)
+                names.append((column, key, instance))
+        links = {column: [] for column in M2M_COLUMNS}
+        for column in M2M_COLUMNS:
+            for name in self._names(row.get(column)):
+                key, instance = self.caches[column].get(name)
+                links[column].append(key)
+                names.append((column, key, instance))
+        piece.full_clean(
+            exclude=list(FK_COLUMNS), validate_unique=False, validate_constraints=False
+        )
+        for column, key, instance in names:
+            self.caches[column].add(key, instance)
+        # bulk_create does not call save(), which normally sets this.
+        piece.set_location_sort_key()
+        # The names as written are good enough for the (case-folding) index.
+        text = [
+            "; ".join(self._names(row.get(column)))
+            for column in ("composer", "arranger", "genre")
+        ]
+        text.append((row.get("publisher") or "").strip())
+        return piece, links, text
+
+    def flush(self, batch):
+        if not batch:
+            return
+        for name_cache in self.caches.values():
+            name_cache.create_new()
+        pieces = [piece for piece, _, _ in batch]
+        Piece.objects.bulk_create(pieces, batch_size=self.batch_size)
+        for column in M2M_COLUMNS:
+            through = getattr(Piece, column).through
+            target = f"{M2M_COLUMNS[column]._meta.model_name}_id"
+            ids = self.caches[column].ids
+            through.objects.bulk_create(
+                [
+                    through(piece_id=piece.pk, **{target: ids[key]})
+                    for piece, links, _ in batch
+                    for key in dict.fromkeys(links[column])
+                ],
+                batch_size=self.batch_size,
+            )
+        # bulk_create skips the signals that normally maintain the credit
+        # columns and the search index.
+        refresh_credit_columns(
+            Piece, [piece.pk for piece in pieces], PIECE_CREDIT_COLUMNS
+        )
+        search.add_documents(
+            [(piece.pk, piece.title, piece.notes, *text) for piece, _, text in batch]
+        )
+        # ...and the page cache's generation counters.
+        bump_generations(Piece)
+        self.imported += len(pieces)
+
+    def run(self, rows, progress=None):
+        """Import an iterable of row dicts; returns the elapsed seconds."""
+        started = time.perf_counter()
+        # Line 1 is the header row.
+        rows = enumerate(rows, start=2)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                batch = []
+                for line_number, row in chunk:
+                    try:
+                        batch.append(self.build(row))
+                    except ValidationError as error:
+                        self.rejected.append((line_number, error.message_dict))
+                self.flush(batch)
+            if progress:
+                progress(self.imported, time.perf_counter() - started)
+        return time.perf_counter() - started
+
+    def run_file(self, path, encoding="utf-8-sig", progress=None):
+        with open(path, newline="", encoding=encoding) as handle:
+            return self.run(csv.DictReader(handle), progress=progress)
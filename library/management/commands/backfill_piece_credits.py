@@ -0,0 +1,22 @@
+from core.credits import backfill_credit_columns
+from django.core.management.base import BaseCommand
+
+from library.models import PIECE_CREDIT_COLUMNS, Piece
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached composer/arranger/genre text columns of every piece."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Pieces refreshed per query batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        total = backfill_credit_columns(
+            Piece, PIECE_CREDIT_COLUMNS, batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Refreshed credits on {total} pieces."))
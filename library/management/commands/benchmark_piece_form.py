@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django import forms
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+
+from library.forms import PieceForm
+from library.models import Piece
+from library.views import PieceCreateView, PieceUpdateView
+
+DATE_FIELDS = [
+    "purchase_date",
+    "rental_start_date",
+    "rental_end_date",
+    "loaning_start_date",
+    "loaning_end_date",
+    "borrowing_start_date",
+    "borrowing_end_date",
+]
+
+
+class LegacyPieceForm(PieceForm):
+    """PieceForm as it rendered before native date inputs and cached selects."""
+
+    class Meta(PieceForm.Meta):
+        widgets = {
+            **PieceForm.Meta.widgets,
+            **{field: forms.SelectDateWidget() for field in DATE_FIELDS},
+            "copyright_date": forms.DateInput(),
+            "difficulty": forms.Select(),
+            "status": forms.Select(),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering PieceCreateView and PieceUpdateView with the legacy "
+        "widgets (SelectDateWidget, plain Select) and with the current "
+        "PieceForm, and report the median render time and HTML size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=50,
+            help="Renders per view and form (default: 50).",
+        )
+
+    def measure(self, view, iterations, **kwargs):
+        factory = RequestFactory()
+        timings = []
+        for _ in range(iterations + 1):
+            started = time.perf_counter()
+            response = view(factory.get("/"), **kwargs)
+            response.render()
+            timings.append(time.perf_counter() - started)
+        # The first render warms template and widget caches.
+        return statistics.median(timings[1:]) * 1000, len(response.content)
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        self.stdout.write(f"{'view':<18}{'form':<10}{'ms/render':>12}{'bytes':>10}")
+        with transaction.atomic():
+            # A throwaway piece to edit, rolled back at the end.
+            piece = Piece.objects.create(title="Benchmark Piece")
+            for view_name, view_class, kwargs in [
+                ("PieceCreateView", PieceCreateView, {}),
+                ("PieceUpdateView", PieceUpdateView, {"pk": piece.pk}),
+            ]:
+                for label, form_class in [
+                    ("before", LegacyPieceForm),
+                    ("after", PieceForm),
+                ]:
+                    view = view_class.as_view(form_class=form_class)
+                    elapsed, size = self.measure(view, options["iterations"], **kwargs)
+                    self.stdout.write(
+                        f"{view_name:<18}{label:<10}{elapsed:>12.2f}{size:>10}"
+                    )
+            transaction.set_rollback(True)
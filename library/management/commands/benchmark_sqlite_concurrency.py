@@ -0,0 +1,149 @@
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# SQLite's own defaults, as Django used them before SQLITE_PRAGMAS.
+DEFAULT_PROFILE = {
+    "init_command": "PRAGMA journal_mode=DELETE;PRAGMA synchronous=FULL",
+    "timeout": 5,
+}
+
+
+def connect(path, profile):
+    conn = sqlite3.connect(
+        path, timeout=profile["timeout"], isolation_level=None, check_same_thread=False
+    )
+    for statement in profile["init_command"].split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    return conn
+
+
+def cell(column, value):
+    return f"{value:>10.2f}" if column.endswith("ms") else f"{value:>10.0f}"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a writer and several readers against a scratch SQLite file, once "
+        "with SQLite's defaults (rollback journal) and once with the "
+        "configured profile (DATABASES OPTIONS), and report read latency "
+        "and lock errors: with WAL, readers should not wait for the writer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seconds", type=float, default=3.0, help="Run time per profile."
+        )
+        parser.add_argument(
+            "--readers", type=int, default=4, help="Concurrent reader threads."
+        )
+        parser.add_argument(
+            "--rows", type=int, default=20000, help="Rows in the scratch table."
+        )
+
+    def run_profile(self, path, profile, seconds, readers, rows):
+        setup = connect(path, profile)
+        setup.execute("DROP TABLE IF EXISTS bench")
+        setup.execute(
+            "CREATE TABLE bench (id INTEGER PRIMARY KEY, title TEXT, value INTEGER)"
+        )
+        setup.executemany(
+            "INSERT INTO bench (title, value) VALUES (?, 0)",
+            ((f"Piece {i:06d} " + "x" * 80,) for i in range(rows)),
+        )
+        setup.close()
+
+        stop = threading.Event()
+        latencies = [[] for _ in range(readers)]
+        errors = {"read": 0, "write": 0}
+        writes = [0]
+
+        def write():
+            conn = connect(path, profile)
+            start = 0
+            while not stop.is_set():
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute(
+                        "UPDATE bench SET value = value + 1 WHERE id BETWEEN ? AND ?",
+                        (start, start + 500),
+                    )
+                    conn.execute("COMMIT")
+                    writes[0] += 1
+                except sqlite3.OperationalError:
+                    errors["write"] += 1
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                start = (start + 500) % rows
+            conn.close()
+
+        def read(timings):
+            conn = connect(path, profile)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    conn.execute(
+                        "SELECT count(*), sum(value) FROM bench WHERE id % 7 = 0"
+                    ).fetchone()
+                except sqlite3.OperationalError:
+                    errors["read"] += 1
+                    continue
+                timings.append(time.perf_counter() - started)
+            conn.close()
+
+        threads = [threading.Thread(target=write)] + [
+            threading.Thread(target=read, args=(timings,)) for timings in latencies
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        reads = [latency * 1000 for timings in latencies for latency in timings]
+        return {
+            "reads/s": len(reads) / seconds,
+            "writes/s": writes[0] / seconds,
+            "p50 ms": statistics.median(reads) if reads else 0,
+            "p99 ms": percentile(reads, 0.99),
+            "max ms": max(reads, default=0),
+            "errors": errors["read"] + errors["write"],
+        }
+
+    def handle(self, *args, **options):
+        if options["readers"] < 1 or options["rows"] < 1:
+            raise CommandError("--readers and --rows must be at least 1.")
+        configured = settings.DATABASES["default"].get("OPTIONS", {})
+        profiles = {
+            "default": DEFAULT_PROFILE,
+            "configured": {
+                "init_command": configured.get("init_command", ""),
+                "timeout": configured.get("timeout", 5),
+            },
+        }
+        columns = ["reads/s", "writes/s", "p50 ms", "p99 ms", "max ms", "errors"]
+        self.stdout.write(f"{'profile':<12}" + "".join(f"{c:>10}" for c in columns))
+        for name, profile in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                result = self.run_profile(
+                    str(Path(directory) / "bench.sqlite3"),
+                    profile,
+                    options["seconds"],
+                    options["readers"],
+                    options["rows"],
+                )
+            self.stdout.write(
+                f"{name:<12}" + "".join(cell(c, result[c]) for c in columns)
+            )
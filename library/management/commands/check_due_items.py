@@ -0,0 +1,63 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from library.due import DEFAULT_DAYS_AHEAD, digest_messages, due_items, send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Report rented, loaned and borrowed pieces that are overdue or due "
+        "soon, and email a digest to each organization's contact (and to "
+        "settings.MANAGERS). Meant to run nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=DEFAULT_DAYS_AHEAD,
+            help="Also report pieces due within this many days "
+            f"(default: {DEFAULT_DAYS_AHEAD}).",
+        )
+        parser.add_argument(
+            "--date",
+            help="Check as of this date (YYYY-MM-DD) instead of today.",
+        )
+        parser.add_argument(
+            "--no-email",
+            action="store_true",
+            help="Only print the report; send no digests.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days cannot be negative.")
+        today = timezone.localdate()
+        if options["date"]:
+            try:
+                today = datetime.date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError(f"Invalid --date: {options['date']}")
+
+        started = time.perf_counter()
+        categories = due_items(today=today, days_ahead=options["days"])
+        for category in categories:
+            self.stdout.write(
+                f"{category.title}: {len(category)} due, "
+                f"{category.overdue_count} overdue"
+            )
+            if options["verbosity"] > 1:
+                for group in category.groups:
+                    name = group.organization or "No organization"
+                    self.stdout.write(f"  {name}: {len(group)}")
+
+        sent = 0
+        if not options["no_email"]:
+            sent = send_digests(digest_messages(categories, today=today))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Sent {sent} digest(s) in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,15 @@
+from core.exports import ExportCommand
+from library.exports import PIECE_EXPORT_HEADER, piece_export_rows
+
+
+class Command(ExportCommand):
+    help = (
+        "Export every piece, with its credits, status and location, "
+        "as CSV or JSON Lines."
+    )
+
+    def get_export_header(self):
+        return PIECE_EXPORT_HEADER
+
+    def get_export_rows(self, chunk_size):
+        return piece_export_rows(chunk_size=chunk_size)
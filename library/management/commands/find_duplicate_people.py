@@ -0,0 +1,62 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from library.models import PersonBase
+from library.people import duplicate_groups, merge_people
+
+
+def person_models():
+    """Composer, Arranger, Conductor and Guest, keyed by model name."""
+    return {
+        model._meta.model_name: model
+        for model in apps.get_models()
+        if issubclass(model, PersonBase)
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "List likely duplicate composers, arrangers, conductors and guests "
+        "(same folded last name, compatible first names or initials), and "
+        "optionally merge each group into its most complete name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help=f"Person models to check: {', '.join(sorted(person_models()))} "
+            "(default: all).",
+        )
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Merge every group into its first (most complete) name.",
+        )
+
+    def handle(self, *args, **options):
+        models = person_models()
+        unknown = set(options["models"]) - set(models)
+        if unknown:
+            raise CommandError(f"Unknown person model(s): {', '.join(sorted(unknown))}")
+        started = time.perf_counter()
+        groups_found = merged = 0
+        for name in options["models"] or sorted(models):
+            model = models[name]
+            # Collected first so merges do not write under an open cursor.
+            for group in list(duplicate_groups(model)):
+                groups_found += 1
+                keeper, *duplicates = group
+                self.stdout.write(
+                    f"{model._meta.verbose_name} {keeper.pk} {keeper}: "
+                    + "; ".join(f"{person.pk} {person}" for person in duplicates)
+                )
+                if options["merge"]:
+                    merged += merge_people(keeper, duplicates)
+        elapsed = time.perf_counter() - started
+        summary = f"Found {groups_found} duplicate group(s) in {elapsed:.2f}s"
+        if options["merge"]:
+            summary += f"; merged {merged} record(s)"
+        self.stdout.write(self.style.SUCCESS(summary + "."))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library.importer import M2M_COLUMNS, MULTI_VALUE_SEPARATOR, PieceImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Import pieces from a CSV file. Columns are named after Piece fields; "
+        f"{', '.join(M2M_COLUMNS)} may hold several names separated by "
+        f"'{MULTI_VALUE_SEPARATOR}'. Unknown composers, arrangers, genres, "
+        "publishers and organizations are created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with a header row.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Pieces inserted per batch and transaction (default: 1000).",
+        )
+        parser.add_argument(
+            "--encoding",
+            default="utf-8-sig",
+            help="File encoding (default: utf-8-sig).",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        importer = PieceImporter(batch_size=options["batch_size"])
+
+        def progress(imported, elapsed):
+            if options["verbosity"] > 1:
+                self.stdout.write(
+                    f"  {imported} pieces ({imported / elapsed:.0f} rows/s)"
+                )
+
+        try:
+            elapsed = importer.run_file(
+                options["path"], encoding=options["encoding"], progress=progress
+            )
+        except OSError as error:
+            raise CommandError(f"Could not read {options['path']}: {error}")
+
+        for line_number, errors in importer.rejected:
+            message = "; ".join(
+                f"{field}: {' '.join(messages)}" for field, messages in errors.items()
+            )
+            self.stderr.write(f"Line {line_number} rejected: {message}")
+
+        rate = importer.imported / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {importer.imported} pieces in {elapsed:.2f}s "
+                f"({rate:.0f} rows/s); rejected {len(importer.rejected)}."
+            )
+        )
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from core.loadtest import Scenario, ScenarioError, load_scenario, run_load
+from library.management.commands.run_benchmarks import git_commit
+
+DEFAULT_SCENARIO = settings.BASE_DIR / "core" / "scenarios" / "catalog.json"
+# Row pks sampled per model for steps that request a detail page.
+SAMPLE_SIZE = 1000
+# The user the command logs in as by default on the runserver it starts;
+# its password is reset to a new random one on every run.
+DEFAULT_USERNAME = "loadtest"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the site over HTTP: concurrent readers and writers log in "
+        "and replay a weighted scenario (default: core/scenarios/catalog.json) "
+        "against --url, or against a runserver started for the run. Reports "
+        "throughput and latency percentiles and histograms, optionally as "
+        "JSON to compare with an earlier run. Writers create rows, so point "
+        "it at a server on a scratch database (see seed_benchmark_data); "
+        "without --url it refuses to run writers unless given "
+        "--allow-writes. runserver runs "
+        "with the project's DEBUG setting; for production-like numbers start "
+        "the server yourself and pass --url, with the --username and "
+        "--password of a user on that server. Detail page steps request pks "
+        "sampled from the database in settings, so with --url they need "
+        "--shared-database: a server on another database would answer 404s."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", default=str(DEFAULT_SCENARIO))
+        parser.add_argument(
+            "--seconds", type=float, default=30.0, help="Run time (default: 30)."
+        )
+        parser.add_argument(
+            "--url", help="Base URL of a running server, e.g. http://127.0.0.1:8000."
+        )
+        parser.add_argument(
+            "--shared-database",
+            action="store_true",
+            help="The server at --url uses the database in settings, so detail "
+            "page steps can sample its pks here.",
+        )
+        parser.add_argument("--readers", type=int, help="Override the reader count.")
+        parser.add_argument("--writers", type=int, help="Override the writer count.")
+        parser.add_argument(
+            "--allow-writes",
+            action="store_true",
+            help="Run writers against the started runserver, which uses the "
+            "database in settings.",
+        )
+        parser.add_argument(
+            "--username",
+            default=DEFAULT_USERNAME,
+            help=f"User to log in as (default: {DEFAULT_USERNAME}; without "
+            "--url it is created if missing and given a new password each run).",
+        )
+        parser.add_argument(
+            "--password", help="Password of --username (required with --url)."
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+        parser.add_argument(
+            "--output", metavar="FILE", help="Write the results to FILE as JSON."
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="FILE",
+            help="Compare throughput and latency with the results in FILE.",
+        )
+
+    def samples(self, labels, seed):
+        rng = random.Random(seed)
+        samples = {}
+        for label in sorted(labels):
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as error:
+                raise CommandError(f"Unknown model in scenario: {error}")
+            pks = list(model.objects.order_by("pk").values_list("pk", flat=True))
+            samples[label] = rng.sample(pks, min(len(pks), SAMPLE_SIZE))
+        return samples
+
+    def credentials(self, username, password, url):
+        """
+        The (login URL, username, password) the users log in with. Only the
+        runserver started for the run (no `url`) shares this database, so
+        only then can the default user be provisioned here.
+        """
+        if url is not None:
+            if password is None:
+                raise CommandError(
+                    f"Give the --password of {username} on the server at --url."
+                )
+            return reverse("login"), username, password
+        User = get_user_model()
+        user = User.objects.filter(username=username).first()
+        if password is None:
+            if username != DEFAULT_USERNAME:
+                raise CommandError(f"Give the --password of {username}.")
+            password = secrets.token_urlsafe(16)
+            if user is None:
+                User.objects.create_user(username=username, password=password)
+            else:
+                user.set_password(password)
+                user.save(update_fields=["password"])
+        elif user is None:
+            raise CommandError(f"No user {username}.")
+        self.stdout.write(f"Logging in as {username}.")
+        return reverse("login"), username, password
+
+    def handle(self, *args, **options):
+        try:
+            spec = load_scenario(options["scenario"])
+            for role in ("readers", "writers"):
+                if options[role] is not None:
+                    spec.setdefault("users", {})[role] = options[role]
+            labels = Scenario.models(spec)
+            if labels and options["url"] and not options["shared_database"]:
+                models = ", ".join(sorted(labels))
+                raise CommandError(
+                    f"The scenario requests detail pages of {models}, "
+                    "whose pks are sampled from the database in settings. Pass "
+                    "--shared-database if the server at --url uses it too."
+                )
+            scenario = Scenario(spec, self.samples(labels, options["seed"]))
+        except ScenarioError as error:
+            raise CommandError(error)
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read {options['compare']}: {error}")
+        url = options["url"]
+        if url is None and scenario.users["writers"] and not options["allow_writes"]:
+            raise CommandError(
+                "Writers would add rows to the database in settings. Pass --url "
+                "of a server on a scratch database, --writers 0, or "
+                "--allow-writes."
+            )
+        login = self.credentials(options["username"], options["password"], url)
+
+        server = None
+        if url is None:
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    str(settings.BASE_DIR / "manage.py"),
+                    "runserver",
+                    "--noreload",
+                    f"127.0.0.1:{port}",
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            if not wait_for_port(port, timeout=30):
+                server.terminate()
+                raise CommandError("The server did not start.")
+            url = f"http://127.0.0.1:{port}"
+        self.stdout.write(
+            f"Running {scenario.users['readers']} readers and "
+            f"{scenario.users['writers']} writers against {url} "
+            f"for {options['seconds']:g}s..."
+        )
+        try:
+            results = asyncio.run(
+                run_load(url, scenario, options["seconds"], login, options["seed"])
+            )
+        except (OSError, RuntimeError, ValueError) as error:
+            raise CommandError(f"Load test failed: {error}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        self.report(results)
+        if baseline is not None:
+            self.compare(results, baseline)
+        if options["output"]:
+            results = {
+                "commit": git_commit(),
+                "created": timezone.now().isoformat(),
+                "url": url,
+                "scenario": options["scenario"],
+                **results,
+            }
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+
+    columns = ["requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'step':<20}" + "".join(f"{column:>10}" for column in self.columns)
+        )
+        rows = [*results["steps"].items(), ("total", results["total"])]
+        for name, summary in rows:
+            self.stdout.write(
+                f"{name:<20}"
+                + "".join(f"{summary[column]:>10}" for column in self.columns)
+            )
+
+    def compare(self, results, baseline):
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'step (before -> after)':<24}"
+            + "".join(f"{column:^24}" for column in ("rps", "p95_ms", "p99_ms"))
+        )
+        before_steps = {**baseline.get("steps", {}), "total": baseline.get("total")}
+        after_steps = {**results["steps"], "total": results["total"]}
+        for name, after in after_steps.items():
+            before = before_steps.get(name)
+            if not before:
+                continue
+            self.stdout.write(
+                f"{name:<24}"
+                + "".join(
+                    f"{before[column]:>10} -> {after[column]:<10}"
+                    for column in ("rps", "p95_ms", "p99_ms")
+                )
+            )
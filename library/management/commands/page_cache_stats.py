@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from core.cache import cached_views, page_cache_stats, reset_page_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Report page cache hits, misses and hit rate for each cached view, "
+        "estimated from one request in PAGE_CACHE_STATS_SAMPLE. The counters "
+        "live in the cache, so they cover every worker process sharing it "
+        "(the default file-based cache); with the per-process locmem backend "
+        "they only cover one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Zero the counters after reporting them.",
+        )
+
+    def handle(self, *args, **options):
+        # Importing the URLconf imports every view module.
+        get_resolver().url_patterns
+        names = sorted(cached_views())
+        stats = page_cache_stats(names)
+        total_hits = total_misses = 0
+        self.stdout.write(f"{'view':<24}{'hits':>10}{'misses':>10}{'hit rate':>10}")
+        for name in names:
+            hits, misses = stats[name]
+            total_hits += hits
+            total_misses += misses
+            self.stdout.write(
+                f"{name:<24}{hits:>10}{misses:>10}{hit_rate(hits, misses):>10}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'total':<24}{total_hits:>10}{total_misses:>10}"
+                f"{hit_rate(total_hits, total_misses):>10}"
+            )
+        )
+        if options["reset"]:
+            reset_page_cache_stats(names)
+
+
+def hit_rate(hits, misses):
+    requests = hits + misses
+    return f"{hits / requests:.1%}" if requests else "-"
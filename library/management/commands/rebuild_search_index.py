@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index over every piece in the library."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Number of pieces loaded and inserted per batch (default: 2000).",
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search requires the SQLite backend.")
+        started = time.perf_counter()
+        total = search.rebuild_index(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {total} pieces in {elapsed:.2f}s.")
+        )
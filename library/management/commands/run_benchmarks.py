@@ -0,0 +1,116 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from concerts.models import Concert
+from library.benchmarks import compare, run_benchmarks
+from library.models import Composer, Piece
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main list, detail and search pages against the current "
+        "database (fill it with seed_benchmark_data first), optionally write "
+        "the results as JSON and compare them with an earlier run's file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Timed runs per benchmark (default: 20).",
+        )
+        parser.add_argument(
+            "--only",
+            action="append",
+            metavar="NAME",
+            help="Run only this benchmark (repeatable).",
+        )
+        parser.add_argument(
+            "--output", metavar="FILE", help="Write the results to FILE as JSON."
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="FILE",
+            help="Compare medians with the results in FILE.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="Percent change in a median reported as slower/faster (default: 10).",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        if not Piece.objects.exists() or not Concert.objects.exists():
+            raise CommandError("No catalog to benchmark; run seed_benchmark_data.")
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(f"Cannot read {options['compare']}: {error}")
+        try:
+            results = run_benchmarks(options["iterations"], options["only"])
+        except ValueError as error:
+            raise CommandError(error)
+
+        columns = ["queries", "min_ms", "median_ms", "p95_ms", "max_ms"]
+        self.stdout.write(f"{'benchmark':<22}" + "".join(f"{c:>11}" for c in columns))
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22}" + "".join(f"{result[c]:>11}" for c in columns)
+            )
+
+        if baseline is not None:
+            self.stdout.write("")
+            self.stdout.write(f"{'benchmark':<22}{'before':>11}{'after':>11}")
+            for name, before, after, change in compare(
+                results, baseline, options["threshold"] / 100
+            ):
+                line = f"{name:<22}{before:>11}{after:>11}  {change}"
+                if change == "slower":
+                    line = self.style.WARNING(line)
+                self.stdout.write(line)
+
+        if options["output"]:
+            report = {
+                "commit": git_commit(),
+                "created": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "rows": {
+                    "pieces": Piece.objects.count(),
+                    "composers": Composer.objects.count(),
+                    "concerts": Concert.objects.count(),
+                },
+                "iterations": options["iterations"],
+                "results": results,
+            }
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
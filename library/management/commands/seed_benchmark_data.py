@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from concerts.models import Concert
+from library.models import Composer, Piece
+from library.seeding import MAX_PEOPLE, BenchmarkSeeder
+
+# Option name, default, help.
+COUNTS = [
+    ("pieces", 10000, "Pieces to create."),
+    ("concerts", 500, "Concerts to create."),
+    ("composers", 2000, "Composers to create."),
+    ("arrangers", 500, "Arrangers to create."),
+    ("conductors", 50, "Conductors to create."),
+    ("guests", 300, "Guest artists to create."),
+    ("venues", 40, "Venues to create."),
+    ("organizations", 20, "Rental, loaning and borrowing organizations (each)."),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with a synthetic catalog of realistic size "
+        "for benchmarks (see run_benchmarks). The same --seed and counts "
+        "always produce the same rows."
+    )
+
+    def add_arguments(self, parser):
+        for name, default, help_text in COUNTS:
+            parser.add_argument(
+                f"--{name}",
+                type=int,
+                default=default,
+                help=f"{help_text} (default: {default})",
+            )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed (default: 0)."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows inserted per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        counts = {name: options[name] for name, _, _ in COUNTS}
+        if min(counts.values()) < 0:
+            raise CommandError("Counts cannot be negative.")
+        for name in ("composers", "conductors", "venues", "organizations"):
+            if counts[name] < 1:
+                raise CommandError(f"--{name} must be at least 1.")
+        for name in ("composers", "arrangers", "conductors", "guests"):
+            if counts[name] > MAX_PEOPLE:
+                raise CommandError(f"--{name} can be at most {MAX_PEOPLE}.")
+        if (
+            Piece.objects.exists()
+            or Concert.objects.exists()
+            or Composer.objects.exists()
+        ):
+            # Row ids, and so the data, only repeat from an empty catalog.
+            raise CommandError(
+                "The database already has a catalog; seed an empty database."
+            )
+        started = time.perf_counter()
+        seeder = BenchmarkSeeder(options["seed"], options["batch_size"])
+        created = seeder.run(counts)
+        elapsed = time.perf_counter() - started
+        for kind, total in created.items():
+            self.stdout.write(f"{total:>10} {kind}")
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {elapsed:.1f}s."))
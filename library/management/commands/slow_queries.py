@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+
+from library.models import SlowQuery
+from library.slowqueries import full_scans, median_ms
+
+SORTS = {
+    "total": lambda query: query.total_ms,
+    "count": lambda query: query.count,
+    "p50": median_ms,
+    "max": lambda query: query.max_ms,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the slow query log (see library/slowqueries.py): queries that "
+        "took at least SLOW_QUERY_MS, grouped by normalized SQL, with their "
+        "count, median and longest time, the views that ran them and the "
+        "tables their query plan scans in full."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sort",
+            choices=sorted(SORTS),
+            default="total",
+            help="Order by total, count, median (p50) or longest (max) time "
+            "(default: total).",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20, help="Queries to show (default: 20)."
+        )
+        parser.add_argument(
+            "--plans", action="store_true", help="Show each query's plan."
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Empty the log after reporting it.",
+        )
+
+    def handle(self, *args, **options):
+        queries = sorted(
+            SlowQuery.objects.all(), key=SORTS[options["sort"]], reverse=True
+        )[: options["limit"]]
+        if not queries:
+            self.stdout.write("No slow queries logged.")
+        for query in queries:
+            views = ", ".join(
+                f"{view} ({count})"
+                for view, count in sorted(
+                    query.views.items(), key=lambda item: item[1], reverse=True
+                )
+            )
+            self.stdout.write(
+                f"{query.fingerprint[:12]}  count {query.count}  "
+                f"p50 {median_ms(query):.1f} ms  max {query.max_ms:.1f} ms  "
+                f"total {query.total_ms:.1f} ms"
+            )
+            self.stdout.write(f"  views: {views}")
+            scans = full_scans(query.plan)
+            if scans:
+                self.stdout.write(
+                    self.style.WARNING(f"  full scan: {', '.join(scans)}")
+                )
+            self.stdout.write(f"  {query.sql[:300]}")
+            if options["plans"]:
+                for line in query.plan.splitlines() or ["(no plan)"]:
+                    self.stdout.write(f"    {line}")
+            self.stdout.write("")
+        if options["reset"]:
+            SlowQuery.objects.all().delete()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.writes import SLOW_WAIT_MS, reset_write_lock_stats, write_lock_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how long write transactions waited for SQLite's write lock "
+        "(see core/writes.py): transactions, retries, failures, total and "
+        "mean wait, and waits of SLOW_WAIT_MS or more. Like page_cache_stats, "
+        "the counters live in the cache and, apart from failures, are "
+        "estimated from one transaction in WRITE_LOCK_STATS_SAMPLE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Zero the counters after reporting them.",
+        )
+
+    def handle(self, *args, **options):
+        stats = write_lock_stats()
+        self.stdout.write(f"Write transactions: {stats['transactions']}")
+        self.stdout.write(f"Lock retries:       {stats['retries']}")
+        self.stdout.write(f"Lock failures:      {stats['failures']}")
+        self.stdout.write(f"Total lock wait:    {stats['wait_us'] / 1000:.1f} ms")
+        self.stdout.write(f"Mean lock wait:     {stats['mean_wait_us'] / 1000:.2f} ms")
+        self.stdout.write(f"Waits >= {SLOW_WAIT_MS} ms:    {stats['slow_waits']}")
+        if options["reset"]:
+            reset_write_lock_stats()
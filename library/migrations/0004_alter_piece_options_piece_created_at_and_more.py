@@ -0,0 +1,79 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0003_remove_arranger_instrument_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="piece",
+            options={"ordering": ["title"]},
+        ),
+        migrations.AddField(
+            model_name="piece",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="piece",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name="piece",
+            name="arranger",
+            field=models.ManyToManyField(blank=True, to="library.arranger"),
+        ),
+        migrations.AlterField(
+            model_name="piece",
+            name="composer",
+            field=models.ManyToManyField(blank=True, to="library.composer"),
+        ),
+        migrations.AlterField(
+            model_name="piece",
+            name="difficulty",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "---------"),
+                    ("EASY", "Easy"),
+                    ("MOD_EASY", "Moderately Easy"),
+                    ("MODERATE", "Moderate"),
+                    ("MOD_DIFFICULT", "Moderately Difficult"),
+                    ("DIFFICULT", "Difficult"),
+                ],
+                default="",
+                max_length=16,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="piece",
+            name="status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "---------"),
+                    ("OWNED", "Owned"),
+                    ("RENTED", "Rented"),
+                    ("ON_LOAN", "On Loan"),
+                    ("BORROWED", "Borrowed"),
+                    ("ARCHIVED", "Archived"),
+                ],
+                default="",
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(fields=["title"], name="library_pie_title_41b758_idx"),
+        ),
+    ]
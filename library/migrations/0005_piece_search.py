@@ -0,0 +1,32 @@
+# Full-text search index for pieces (see library/search.py).
+# Run `manage.py rebuild_search_index` after migrating an existing database.
+
+from django.db import migrations
+
+CREATE_SEARCH_TABLE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS library_piece_search USING fts5("
+    "title, notes, composers, arrangers, genres, publisher, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+
+def create_search_table(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends simply have no search index.
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(CREATE_SEARCH_TABLE_SQL)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS library_piece_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0004_alter_piece_options_piece_created_at_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
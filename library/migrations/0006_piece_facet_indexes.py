@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0005_piece_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["status", "difficulty"], name="library_pie_status_539fa2_idx"
+            ),
+        ),
+        # The auto-created through tables only index (piece_id, genre_id) and
+        # genre_id on its own; facet filters and counts go genre -> piece.
+        migrations.RunSQL(
+            "CREATE INDEX library_piece_genre_genre_piece_idx "
+            "ON library_piece_genre (genre_id, piece_id)",
+            "DROP INDEX library_piece_genre_genre_piece_idx",
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX library_piece_composer_composer_piece_idx "
+            "ON library_piece_composer (composer_id, piece_id)",
+            "DROP INDEX library_piece_composer_composer_piece_idx",
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0006_piece_facet_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="arranger",
+            options={
+                "ordering": ["last_name", "first_name"],
+                "verbose_name": "Arranger",
+                "verbose_name_plural": "Arrangers",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="composer",
+            options={
+                "ordering": ["last_name", "first_name"],
+                "verbose_name": "Composer",
+                "verbose_name_plural": "Composers",
+            },
+        ),
+    ]
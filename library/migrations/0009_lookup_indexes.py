@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0008_credit_text_columns"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="arranger",
+            index=models.Index(
+                fields=["last_name", "first_name"], name="library_arranger_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="composer",
+            index=models.Index(
+                fields=["last_name", "first_name"], name="library_composer_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["location_drawer", "location_number"],
+                name="library_pie_locatio_eb69dd_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["rental_end_date"], name="library_pie_rental__1b2d29_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["loaning_end_date"], name="library_pie_loaning_5d5c91_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["borrowing_end_date"], name="library_pie_borrowi_5b52cf_idx"
+            ),
+        ),
+    ]
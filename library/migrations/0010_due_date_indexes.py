@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0009_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="piece",
+            name="library_pie_rental__1b2d29_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="piece",
+            name="library_pie_loaning_5d5c91_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="piece",
+            name="library_pie_borrowi_5b52cf_idx",
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["status", "rental_end_date"],
+                name="library_pie_status_17a0be_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["status", "loaning_end_date"],
+                name="library_pie_status_4838bb_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["status", "borrowing_end_date"],
+                name="library_pie_status_70a1a5_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:31
+
+import re
+from itertools import islice
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Copies of library.shelves as of this migration, which must not change
+# with the app's code.
+DIGITS = re.compile(r"\d+")
+NUMBER_WIDTH = 10
+SEPARATOR = "\x1f"
+SORT_KEY_LENGTH = 255
+
+
+def normalize_location(value):
+    return " ".join((value or "").split())
+
+
+def natural_sort_key(value):
+    return DIGITS.sub(
+        lambda match: match.group().zfill(NUMBER_WIDTH),
+        normalize_location(value).casefold(),
+    )
+
+
+def location_sort_key(drawer, number):
+    key = f"{natural_sort_key(drawer)}{SEPARATOR}{natural_sort_key(number)}"
+    return key[:SORT_KEY_LENGTH]
+
+
+def fill_location_sort_keys(apps, schema_editor):
+    Piece = apps.get_model("library", "Piece")
+    pieces = (
+        Piece.objects.only("location_drawer", "location_number")
+        .order_by("pk")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    while batch := list(islice(pieces, BATCH_SIZE)):
+        for piece in batch:
+            piece.location_drawer = normalize_location(piece.location_drawer)
+            piece.location_number = normalize_location(piece.location_number)
+            piece.location_sort_key = location_sort_key(
+                piece.location_drawer, piece.location_number
+            )
+        Piece.objects.bulk_update(
+            batch, ["location_drawer", "location_number", "location_sort_key"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0010_due_date_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="piece",
+            name="library_pie_locatio_eb69dd_idx",
+        ),
+        migrations.AddField(
+            model_name="piece",
+            name="location_sort_key",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_location_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="piece",
+            index=models.Index(
+                fields=["location_drawer", "location_sort_key"],
+                name="library_pie_locatio_0fd87d_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0012_person_name_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowingorganization",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="library_borrowingorg_lname_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="genre",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="library_genre_lname_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="loaningorganization",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="library_loaningorgan_lname_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="publisher",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="library_publisher_lname_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rentalorganization",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="library_rentalorgani_lname_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_model(name, target):
+    """State for a declared through model matching Django's auto-created table."""
+    return migrations.CreateModel(
+        name=f"Piece{name.capitalize()}",
+        fields=[
+            (
+                "id",
+                models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name="ID",
+                ),
+            ),
+            (
+                "piece",
+                models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name="+",
+                    to="library.piece",
+                ),
+            ),
+            (
+                name,
+                models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name="+",
+                    to=target,
+                ),
+            ),
+        ],
+        options={
+            "db_table": f"library_piece_{name}",
+            "unique_together": {("piece", name)},
+        },
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Declare the composer and genre link tables as models, so that the
+    composer/genre-first indexes that 0006 created with raw SQL are part of
+    the model state. The tables themselves are unchanged.
+    """
+
+    dependencies = [
+        ("library", "0017_slowquery"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                link_model("composer", "library.composer"),
+                migrations.AlterField(
+                    model_name="piece",
+                    name="composer",
+                    field=models.ManyToManyField(
+                        blank=True,
+                        through="library.PieceComposer",
+                        to="library.composer",
+                    ),
+                ),
+                link_model("genre", "library.genre"),
+                migrations.AlterField(
+                    model_name="piece",
+                    name="genre",
+                    field=models.ManyToManyField(
+                        blank=True, through="library.PieceGenre", to="library.genre"
+                    ),
+                ),
+            ],
+        ),
+        # Replace the raw indexes with the declared ones (same columns).
+        migrations.RunSQL(
+            "DROP INDEX library_piece_composer_composer_piece_idx",
+            "CREATE INDEX library_piece_composer_composer_piece_idx "
+            "ON library_piece_composer (composer_id, piece_id)",
+        ),
+        migrations.AddIndex(
+            model_name="piececomposer",
+            index=models.Index(
+                fields=["composer", "piece"], name="library_pie_compose_743c06_idx"
+            ),
+        ),
+        migrations.RunSQL(
+            "DROP INDEX library_piece_genre_genre_piece_idx",
+            "CREATE INDEX library_piece_genre_genre_piece_idx "
+            "ON library_piece_genre (genre_id, piece_id)",
+        ),
+        migrations.AddIndex(
+            model_name="piecegenre",
+            index=models.Index(
+                fields=["genre", "piece"], name="library_pie_genre_i_4f662d_idx"
+            ),
+        ),
+    ]
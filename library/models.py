@@ -1,13 +1,25 @@
 # library/models.py
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Lower
 from django.urls import reverse
 
+from core.history import HistoryBase, TrackedModel
+
+from .people import person_name_key
+from .shelves import location_sort_key, normalize_location
+
 
 # Create your models here.
 class PersonBase(models.Model):
     first_name = models.CharField(max_length=100, blank=True, null=True)
     last_name = models.CharField(max_length=100)
+    # "<last name>|<initials>", folded for duplicate matching (library/people.py)
+    name_key = models.CharField(
+        max_length=200, blank=True, editable=False, db_index=True
+    )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.last_name}, {self.first_name}"
@@ -21,8 +33,25 @@ class PersonBase(models.Model):
     def get_absolute_url(self):
         raise NotImplementedError("Subclasses must implement get_absolute_url().")
 
+    def save(self, *args, **kwargs):
+        self.name_key = person_name_key(self.first_name, self.last_name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"first_name", "last_name"} & set(
+            update_fields
+        ):
+            kwargs["update_fields"] = {*update_fields, "name_key"}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["last_name", "first_name"]
+        # Serves the default ordering (and keyset paging, since SQLite
+        # appends the rowid to every index).
+        indexes = [
+            models.Index(
+                fields=["last_name", "first_name"],
+                name="%(app_label)s_%(class)s_name_idx",
+            ),
+        ]
         abstract = True
 
 
@@ -32,7 +61,7 @@ class Composer(PersonBase):
     def get_absolute_url(self):
         return reverse("composer_detail", args=[str(self.id)])
 
-    class Meta:
+    class Meta(PersonBase.Meta):
         verbose_name = "Composer"
         verbose_name_plural = "Composers"
 
@@ -43,13 +72,14 @@ class Arranger(PersonBase):
     def get_absolute_url(self):
         return reverse("arranger_detail", args=[str(self.id)])
 
-    class Meta:
+    class Meta(PersonBase.Meta):
         verbose_name = "Arranger"
         verbose_name_plural = "Arrangers"
 
 
 class Genre(models.Model):
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -61,11 +91,14 @@ class Genre(models.Model):
         verbose_name = "Genre"
         verbose_name_plural = "Genres"
         ordering = ["name"]
+        # Prefix matching for autocomplete (core/autocomplete.py).
+        indexes = [models.Index(Lower("name"), name="library_genre_lname_idx")]
 
 
 class Publisher(models.Model):
     name = models.CharField(max_length=100)
     website = models.URLField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -76,6 +109,7 @@ class Publisher(models.Model):
     class Meta:
         verbose_name_plural = "publishers"
         ordering = ["name"]
+        indexes = [models.Index(Lower("name"), name="library_publisher_lname_idx")]
 
 
 class Organization(models.Model):
@@ -84,6 +118,7 @@ class Organization(models.Model):
     contact_email = models.EmailField(blank=True)
     contact_phone = models.CharField(max_length=100, blank=True)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -93,6 +128,9 @@ class Organization(models.Model):
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(Lower("name"), name="%(app_label)s_%(class).12s_lname_idx")
+        ]
         abstract = True
 
 
@@ -135,12 +173,40 @@ class PieceDifficulty(models.TextChoices):
     DIFFICULT = "DIFFICULT", "Difficult"
 
 
-class Piece(models.Model):
+class PieceQuerySet(models.QuerySet):
+    def for_catalog(self):
+        """
+        Slim queryset for catalog listings: one query no matter how many
+        pieces are on the page. Credits come from the cached text columns.
+        """
+        return self.select_related(
+            "publisher",
+            "rental_organization",
+            "loaning_organization",
+            "borrowing_organization",
+        ).only(
+            "title",
+            "composers_text",
+            "arrangers_text",
+            "genres_text",
+            "difficulty",
+            "status",
+            "location_drawer",
+            "location_number",
+            "location_sort_key",
+            "publisher__name",
+            "rental_organization__name",
+            "loaning_organization__name",
+            "borrowing_organization__name",
+        )
+
+
+class Piece(TrackedModel):
     # Basic information
     title = models.CharField(max_length=200)
-    composer = models.ManyToManyField(Composer, blank=True)
+    composer = models.ManyToManyField(Composer, blank=True, through="PieceComposer")
     arranger = models.ManyToManyField(Arranger, blank=True)
-    genre = models.ManyToManyField(Genre, blank=True)
+    genre = models.ManyToManyField(Genre, blank=True, through="PieceGenre")
     publisher = models.ForeignKey(
         Publisher, on_delete=models.SET_NULL, blank=True, null=True
     )
@@ -157,6 +223,8 @@ class Piece(models.Model):
     )
     location_drawer = models.CharField(max_length=100, blank=True)
     location_number = models.CharField(max_length=100, blank=True)
+    # Natural shelf order of the location (see library/shelves.py), set on save
+    location_sort_key = models.CharField(max_length=255, blank=True, editable=False)
 
     # Rental info
     rental_organization = models.ForeignKey(
@@ -189,6 +257,13 @@ class Piece(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Cached credits (see core/credits.py), kept in sync by library/signals.py
+    composers_text = models.TextField(blank=True, editable=False)
+    arrangers_text = models.TextField(blank=True, editable=False)
+    genres_text = models.TextField(blank=True, editable=False)
+
+    objects = PieceQuerySet.as_manager()
+
     def get_composers_display(self):
         return "; ".join(str(composer) for composer in self.composer.all())
 
@@ -204,6 +279,22 @@ class Piece(models.Model):
     def get_absolute_url(self):
         return reverse("piece_detail", args=[str(self.id)])
 
+    def set_location_sort_key(self):
+        self.location_drawer = normalize_location(self.location_drawer)
+        self.location_number = normalize_location(self.location_number)
+        self.location_sort_key = location_sort_key(
+            self.location_drawer, self.location_number
+        )
+
+    def save(self, *args, **kwargs):
+        self.set_location_sort_key()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"location_drawer", "location_number"} & set(
+            update_fields
+        ):
+            kwargs["update_fields"] = {*update_fields, "location_sort_key"}
+        super().save(*args, **kwargs)
+
     def clean(self):
         errors = {}
 
@@ -227,4 +318,125 @@ class Piece(models.Model):
         ordering = ["title"]
         indexes = [
             models.Index(fields=["title"]),
+            # Also serves lookups on status alone (the leading column).
+            models.Index(fields=["status", "difficulty"]),
+            # Drawer counts and shelf order within a drawer.
+            models.Index(fields=["location_drawer", "location_sort_key"]),
+            # Due-date lookups (status = X AND end date <= D, in date order)
+            # for rentals, loans and borrowed pieces; see library/due.py.
+            models.Index(fields=["status", "rental_end_date"]),
+            models.Index(fields=["status", "loaning_end_date"]),
+            models.Index(fields=["status", "borrowing_end_date"]),
         ]
+
+
+class PieceLink(models.Model):
+    """
+    Abstract link table for a Piece M2M field, laid out like the one Django
+    would create, declared so the table can carry extra indexes. Subclasses
+    add the foreign key to the linked model.
+    """
+
+    piece = models.ForeignKey(Piece, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        abstract = True
+
+
+class PieceComposer(PieceLink):
+    composer = models.ForeignKey(Composer, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        db_table = "library_piece_composer"
+        unique_together = [("piece", "composer")]
+        # Facet filters and counts (library/facets.py) go composer -> piece.
+        indexes = [models.Index(fields=["composer", "piece"])]
+
+
+class PieceGenre(PieceLink):
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        db_table = "library_piece_genre"
+        unique_together = [("piece", "genre")]
+        # Facet filters and counts (library/facets.py) go genre -> piece.
+        indexes = [models.Index(fields=["genre", "piece"])]
+
+
+# Piece credit text columns and the M2M field each one caches.
+PIECE_CREDIT_COLUMNS = {
+    "composers_text": "composer",
+    "arrangers_text": "arranger",
+    "genres_text": "genre",
+}
+
+
+class PieceHistory(HistoryBase):
+    """One recorded change to a piece (see core/history.py)."""
+
+    piece = models.ForeignKey(
+        Piece,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="history",
+    )
+
+    class Meta(HistoryBase.Meta):
+        verbose_name_plural = "piece history"
+        indexes = [models.Index(fields=["piece", "changed_at"])]
+
+
+class RequestProfile(models.Model):
+    """A request profiled on demand by a staff user (library/profiling.py)."""
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_ms = models.FloatField()
+    # [{"sql": ..., "ms": ..., "origin": "file.py:34 in f (template.html:12)"}]
+    queries = models.JSONField(default=list)
+    # The marshalled pstats data, as Stats.dump_stats() writes it.
+    stats = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.method} {self.path}"
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class SlowQuery(models.Model):
+    """A statement that ran slower than SLOW_QUERY_MS (library/slowqueries.py)."""
+
+    # Digest of the normalized SQL, so one row covers every run of a query.
+    fingerprint = models.CharField(max_length=40, unique=True)
+    sql = models.TextField()
+    # EXPLAIN (QUERY PLAN) output from the first time the query was slow.
+    plan = models.TextField(blank=True)
+    count = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    # The most recent durations in ms, for the median.
+    durations = models.JSONField(default=list)
+    # {url name: slow runs}
+    views = models.JSONField(default=dict)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.sql[:100]
+
+    class Meta:
+        verbose_name_plural = "slow queries"
+        ordering = ["-total_ms"]
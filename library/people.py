@@ -0,0 +1,143 @@
+# library/people.py
+# Duplicate detection and merging for PersonBase models (Composer, Arranger,
+# Conductor, Guest), used by `manage.py find_duplicate_people` and the admin.
+#
+# Every person stores a normalized name key, "<last name>|<initials>", with
+# accents, case and punctuation folded away. Candidates are blocked by the
+# last-name part of that key: rows are read once in key order (from its
+# index) and only people in the same block are compared, so finding
+# duplicates stays near-linear in the size of the table.
+
+import unicodedata
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+NAME_KEY_LENGTH = 200
+
+
+def fold_name(value):
+    """Case-fold, strip accents and punctuation, and collapse whitespace."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(char for char in value if not unicodedata.combining(char))
+    value = "".join(char if char.isalnum() else " " for char in value.casefold())
+    return " ".join(value.split())
+
+
+def person_name_key(first_name, last_name):
+    """'Sousa', 'J.P.' and 'Sousa', 'John Philip' both give 'sousa|jp'."""
+    initials = "".join(part[0] for part in fold_name(first_name).split())
+    return f"{fold_name(last_name)}|{initials}"[:NAME_KEY_LENGTH]
+
+
+def first_names_compatible(first, other):
+    """
+    True if two first names could belong to one person: either is missing,
+    or their initials agree as far as both go and any names spelled out
+    in full on both sides match ("J. P." ~ "John Philip" ~ "John").
+    """
+    first, other = fold_name(first).split(), fold_name(other).split()
+    for part, other_part in zip(first, other):
+        if part[0] != other_part[0]:
+            return False
+        if len(part) > 1 and len(other_part) > 1 and part != other_part:
+            return False
+    return True
+
+
+def last_name_block(person):
+    """The last-name part of a person's name key: duplicates share it."""
+    return person.name_key.split("|", 1)[0]
+
+
+def could_be_same_person(person, others):
+    """
+    True if `person` may be a duplicate of every one of `others`: the same
+    last-name block and compatible first names, as duplicate_groups() groups.
+    """
+    return all(
+        last_name_block(person) == last_name_block(other)
+        and first_names_compatible(person.first_name, other.first_name)
+        for other in others
+    )
+
+
+def _completeness(person):
+    # Prefer the name with the most spelled-out parts, then the oldest row.
+    parts = fold_name(person.first_name).split()
+    return (-sum(len(part) > 1 for part in parts), -len(parts), person.pk)
+
+
+def most_complete_first(people):
+    return sorted(people, key=_completeness)
+
+
+def duplicate_groups(model):
+    """
+    Yield lists of likely duplicates of `model`, most complete name first.
+    Each block of people sharing a folded last name is clustered greedily
+    around its most complete names.
+    """
+    people = model.objects.only("first_name", "last_name", "name_key").order_by(
+        "name_key", "pk"
+    )
+    for _, block in groupby(people.iterator(), key=last_name_block):
+        block = most_complete_first(block)
+        clusters = []
+        for person in block:
+            for cluster in clusters:
+                if could_be_same_person(person, cluster):
+                    cluster.append(person)
+                    break
+            else:
+                clusters.append([person])
+        yield from (cluster for cluster in clusters if len(cluster) > 1)
+
+
+def _relations(model):
+    """(through or related model, owner column, person column) per relation."""
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            field = relation.field
+            yield (
+                field.remote_field.through,
+                field.m2m_field_name(),
+                field.m2m_reverse_field_name(),
+            )
+        elif relation.one_to_many:
+            yield relation.related_model, None, relation.field.name
+
+
+@transaction.atomic
+def merge_people(keeper, duplicates):
+    """
+    Merge `duplicates` into `keeper` and delete them. Each through table
+    (and any table with a foreign key to the model) is repointed with one
+    UPDATE, after one DELETE drops links the keeper already has.
+    """
+    duplicate_ids = [person.pk for person in duplicates if person.pk != keeper.pk]
+    if not duplicate_ids:
+        return 0
+    model = type(keeper)
+    group_ids = [keeper.pk, *duplicate_ids]
+    for related_model, owner, person in _relations(model):
+        rows = related_model.objects.filter(**{f"{person}__in": duplicate_ids})
+        if owner is not None:
+            # A link is redundant if its owner is also linked to the keeper,
+            # or to another duplicate through an older row.
+            rows.filter(
+                Exists(
+                    related_model.objects.filter(
+                        Q(**{person: keeper.pk}) | Q(pk__lt=OuterRef("pk")),
+                        **{owner: OuterRef(owner), f"{person}__in": group_ids},
+                    )
+                )
+            ).delete()
+        rows.update(**{person: keeper.pk})
+    model.objects.filter(pk__in=duplicate_ids).delete()
+    # Bulk updates send no m2m_changed, so re-save the keeper: its post_save
+    # handlers refresh the credit columns and search index of everything now
+    # linked to it.
+    keeper.save()
+    return len(duplicate_ids)
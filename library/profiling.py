@@ -0,0 +1,158 @@
+# library/profiling.py
+# On-demand profiling of single requests, for staff.
+#
+# A staff user adds ?profile=1 to a URL (or sends an X-Profile: 1 header)
+# and ProfilerMiddleware runs the rest of the request under cProfile,
+# recording every SQL statement with its time and origin: the project
+# source line that caused it and the template line being rendered, found
+# by walking the stack from the query outwards. The profile is stored as a
+# RequestProfile row (the pstats data as written by Stats.dump_stats(), so
+# it opens in any pstats viewer) and the response gets an X-Profile header
+# with the profile's admin URL. Other requests pay one dictionary lookup.
+
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+from .models import RequestProfile
+
+PROFILE_PARAM = "profile"
+PROFILE_HEADER = "X-Profile"
+# Stored profiles beyond this many are deleted, oldest first.
+KEEP_PROFILES = 200
+
+# Project modules whose frames are plumbing rather than a query's origin.
+SKIPPED_MODULES = (
+    "manage.py",
+    "core/wsgi.py",
+    "core/asgi.py",
+    "core/cache.py",
+    "core/history.py",
+    "core/queries.py",
+    "core/timing.py",
+    "library/profiling.py",
+)
+
+
+def _frame_name(path, frame):
+    code = frame.f_code
+    return f"{path}:{frame.f_lineno} in {getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _origin(frame):
+    """
+    Where a query came from: the innermost project source line or Django
+    generic view method (get_object(), get_queryset() and the like) on the
+    stack, followed by the template line being rendered, if any.
+    """
+    base = str(settings.BASE_DIR) + "/"
+    code = template = ""
+    while frame is not None and not template:
+        filename = frame.f_code.co_filename
+        if "/django/" in filename:
+            if frame.f_code.co_name == "render_annotated":
+                node = frame.f_locals.get("self")
+                origin = getattr(node, "origin", None)
+                token = getattr(node, "token", None)
+                if origin is not None and token is not None:
+                    template = f"{origin.template_name}:{token.lineno}"
+            elif not code and "/django/views/" in filename:
+                code = _frame_name(filename[filename.index("django/") :], frame)
+        elif (
+            not code
+            and filename.startswith(base)
+            and "site-packages" not in filename
+            and not filename.endswith(SKIPPED_MODULES)
+        ):
+            code = _frame_name(filename[len(base) :], frame)
+        frame = frame.f_back
+    if code and template:
+        return f"{code} ({template})"
+    return code or template
+
+
+class SQLLog:
+    """An execute wrapper keeping each statement's time and origin."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                {
+                    "sql": sql,
+                    "ms": round((time.perf_counter() - started) * 1000, 3),
+                    "origin": _origin(sys._getframe(1)),
+                }
+            )
+
+
+def wants_profile(request):
+    return PROFILE_PARAM in request.GET or PROFILE_HEADER in request.headers
+
+
+def top_functions(stats_data, limit=40, sort="cumulative"):
+    """The pstats report of the `limit` top functions by `sort`, as text."""
+    stream = io.StringIO()
+    stats = pstats.Stats(stream=stream)
+    stats.stats = marshal.loads(stats_data)
+    stats.get_top_level_stats()
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilerMiddleware:
+    """Profile requests asking for it, for staff (after AuthenticationMiddleware)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request) or not request.user.is_staff:
+            return self.get_response(request)
+        request.profiling = True
+        sql = SQLLog()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql))
+            # Template responses are rendered before they get back here.
+            response = profiler.runcall(self.get_response, request)
+        duration = time.perf_counter() - started
+        profile = self.save(request, response, profiler, sql.queries, duration)
+        response[PROFILE_HEADER] = reverse(
+            "admin:library_requestprofile_change", args=[profile.pk]
+        )
+        return response
+
+    def save(self, request, response, profiler, queries, duration):
+        profiler.create_stats()
+        match = request.resolver_match
+        profile = RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            view_name=match.view_name if match else "",
+            status_code=response.status_code,
+            duration_ms=duration * 1000,
+            query_count=len(queries),
+            query_ms=sum(query["ms"] for query in queries),
+            queries=queries,
+            stats=marshal.dumps(profiler.stats),
+        )
+        stale = RequestProfile.objects.values_list("pk", flat=True)[KEEP_PROFILES:]
+        RequestProfile.objects.filter(pk__in=list(stale)).delete()
+        return profile
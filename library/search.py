@@ -0,0 +1,214 @@
+# library/search.py
+# Full-text search over the music library, backed by an SQLite FTS5 table.
+#
+# The index is a virtual table (created in migration 0005) keyed by
+# Piece.id as the FTS rowid. It is kept in sync by the signal handlers in
+# library/signals.py and can be rebuilt in bulk with
+# `manage.py rebuild_search_index`.
+
+import re
+
+from django.db import connection, models, transaction
+
+from .models import Arranger, Composer, Genre, Piece
+
+SEARCH_TABLE = "library_piece_search"
+
+# Column order matters: it is the order of the bm25() weights below.
+SEARCH_COLUMNS = ["title", "notes", "composers", "arrangers", "genres", "publisher"]
+SEARCH_WEIGHTS = [10.0, 1.0, 5.0, 3.0, 2.0, 2.0]
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_available():
+    """The index only exists on SQLite; other backends get no search."""
+    return connection.vendor == "sqlite"
+
+
+def _person_names(people):
+    return "; ".join(
+        " ".join(part for part in (person.first_name, person.last_name) if part)
+        for person in people
+    )
+
+
+def indexed_pieces():
+    """Pieces with every related row needed to build their search documents."""
+    return (
+        Piece.objects.select_related("publisher")
+        .prefetch_related(
+            models.Prefetch(
+                "composer", queryset=Composer.objects.only("first_name", "last_name")
+            ),
+            models.Prefetch(
+                "arranger", queryset=Arranger.objects.only("first_name", "last_name")
+            ),
+            models.Prefetch("genre", queryset=Genre.objects.only("name")),
+        )
+        .only("title", "notes", "publisher__name")
+        .order_by("pk")
+    )
+
+
+def _document(piece):
+    return (
+        piece.pk,
+        piece.title,
+        piece.notes,
+        _person_names(piece.composer.all()),
+        _person_names(piece.arranger.all()),
+        "; ".join(genre.name for genre in piece.genre.all()),
+        piece.publisher.name if piece.publisher else "",
+    )
+
+
+def _insert(cursor, documents):
+    placeholders = ", ".join(["%s"] * (len(SEARCH_COLUMNS) + 1))
+    cursor.executemany(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+        f"VALUES ({placeholders})",
+        documents,
+    )
+
+
+def add_documents(documents):
+    """
+    Index new pieces from ready-made (piece id, title, notes, composers,
+    arrangers, genres, publisher) tuples. For bulk loaders that already
+    hold the text and would otherwise have to read it back.
+    """
+    if not documents or not is_available():
+        return
+    with connection.cursor() as cursor:
+        _insert(cursor, documents)
+
+
+def remove_pieces(piece_ids):
+    """Drop the given pieces from the index."""
+    piece_ids = list(piece_ids)
+    if not piece_ids or not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+            [(piece_id,) for piece_id in piece_ids],
+        )
+
+
+def index_pieces(piece_ids, pieces=None):
+    """
+    (Re)index the given pieces, loading their related rows in bulk, or
+    from `pieces` when the caller already loaded them through
+    indexed_pieces().
+    """
+    piece_ids = list(piece_ids)
+    if not piece_ids or not is_available():
+        return
+    if pieces is None:
+        pieces = indexed_pieces().filter(pk__in=piece_ids)
+    documents = [_document(piece) for piece in pieces]
+    with transaction.atomic():
+        remove_pieces(piece_ids)
+        with connection.cursor() as cursor:
+            _insert(cursor, documents)
+
+
+def rebuild_index(batch_size=2000):
+    """
+    Rebuild the whole index from scratch. Pieces are streamed in batches so
+    memory stays flat; returns the number of pieces indexed.
+    """
+    if not is_available():
+        return 0
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        batch = []
+        for piece in indexed_pieces().iterator(chunk_size=batch_size):
+            batch.append(_document(piece))
+            if len(batch) >= batch_size:
+                _insert(cursor, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _insert(cursor, batch)
+            total += len(batch)
+        # Merge the b-tree segments written by the bulk load.
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+    return total
+
+
+def build_match_query(text):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must
+    match, and each one is treated as a prefix so partial words find hits.
+    """
+    tokens = TOKEN_RE.findall(text or "")
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search(text, limit=200, offset=0):
+    """
+    Return the ids of matching pieces, best BM25 rank first: `limit` of
+    them, skipping the first `offset`.
+    """
+    match = build_match_query(text)
+    if not match or not is_available():
+        return []
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s OFFSET %s",
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count(text):
+    """The number of pieces matching `text`."""
+    match = build_match_query(text)
+    if not match or not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+            [match],
+        )
+        return cursor.fetchone()[0]
+
+
+class SearchResults:
+    """
+    The pieces of `queryset` matching `text`, best rank first, as a lazy
+    sequence for Paginator. The count and each slice come from the index
+    (a slice is one FTS query with LIMIT/OFFSET, then one for its pieces),
+    so every page of the results can be reached.
+    """
+
+    def __init__(self, text, queryset):
+        self.text = text
+        self.queryset = queryset
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = count(self.text)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        if stop <= start:
+            return []
+        ids = search(self.text, limit=stop - start, offset=start)
+        found = self.queryset.in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
@@ -0,0 +1,468 @@
+# library/seeding.py
+# Deterministic synthetic catalog data for benchmarks, used by
+# `manage.py seed_benchmark_data`.
+#
+# Everything is drawn from one random.Random(seed), so the same seed and
+# sizes produce the same rows. People, publishers and venues are picked
+# with a Zipf-like skew (a few composers have most of the pieces), as in
+# a real library. Rows are inserted like library/importer.py does it:
+# bulk_create per batch, each batch in its own transaction, with the
+# credit columns, name keys and search documents that save() and the
+# signal handlers would otherwise maintain filled in directly.
+
+import datetime
+import random
+from itertools import accumulate
+
+from django.db import transaction
+
+from concerts.models import Concert, ConcertProgramItem, Conductor, Guest, Venue
+from core.cache import bump_generations
+from core.credits import credit_text
+from . import search
+from .models import (
+    Arranger,
+    BorrowingOrganization,
+    Composer,
+    Genre,
+    LoaningOrganization,
+    Piece,
+    PieceDifficulty,
+    PieceStatus,
+    Publisher,
+    RentalOrganization,
+)
+from .people import person_name_key
+
+FIRST_NAMES = """
+    Aaron Alice Amy Anna Antonin Benjamin Camille Carl Charles Claude
+    David Edward Eric Florence Frank Gabriel George Grace Gustav Henry
+    Igor Jan Jennifer John Joseph Julia Karl Leonard Lili Louise Malcolm
+    Margaret Maria Mark Michael Nadia Percy Peter Philip Ralph Richard
+    Robert Samuel Sarah Thomas Vincent William Zoe
+""".split()
+LAST_NAMES = """
+    Arnold Bach Barber Bernstein Bizet Brahms Britten Copland Debussy
+    Dvorak Elgar Fauré Gershwin Grainger Grieg Handel Haydn Holst Ives
+    Janáček King Lauridsen Mahler Mendelssohn Milhaud Mozart Nelhybel
+    Persichetti Prokofiev Ravel Reed Respighi Schubert Schuman Smith
+    Sousa Strauss Stravinsky Sullivan Tchaikovsky Ticheli Verdi Wagner
+    Whitacre Williams
+""".split()
+MIDDLE_INITIALS = [""] + [f"{letter}." for letter in "ABCDEFGHJKLMNOPRSTW"]
+# Distinct names available to each kind of person.
+MAX_PEOPLE = len(FIRST_NAMES) * len(MIDDLE_INITIALS) * len(LAST_NAMES)
+
+GENRES = [
+    "Ballad",
+    "Chorale",
+    "Concert March",
+    "Concerto",
+    "Dance",
+    "Fanfare",
+    "Film Score",
+    "Folk Song",
+    "Holiday",
+    "Hymn",
+    "Jazz",
+    "Latin",
+    "March",
+    "Medley",
+    "Musical",
+    "Novelty",
+    "Overture",
+    "Patriotic",
+    "Polka",
+    "Pop",
+    "Rhapsody",
+    "Sacred",
+    "Serenade",
+    "Solo Feature",
+    "Suite",
+    "Symphony",
+    "Tone Poem",
+    "Transcription",
+    "Variations",
+    "Waltz",
+]
+PUBLISHERS = [
+    "Alfred",
+    "Barnhouse",
+    "Boosey & Hawkes",
+    "Carl Fischer",
+    "Daehn",
+    "De Haske",
+    "Hal Leonard",
+    "Kjos",
+    "Ludwig Masters",
+    "Manhattan Beach",
+    "Molenaar",
+    "Neil A. Kjos",
+    "Presser",
+    "Schirmer",
+    "Southern",
+    "TRN",
+    "Wingert-Jones",
+    "Warner Bros.",
+]
+
+TITLE_ADJECTIVES = """
+    American Autumn Celtic Festive Golden Joyful Lyric Midnight Northern
+    Old Prairie Royal Sacred Sleepy Summer Triumphant Western Winter
+""".split()
+TITLE_FORMS = """
+    Air Ballad Celebration Chorale Dances Fanfare Fantasy Hymn Journey
+    Legend March Nocturne Overture Portrait Prelude Rhapsody Scenes
+    Sketches Suite Variations
+""".split()
+KEYS = ["C", "D", "E-flat", "F", "G", "A", "B-flat"]
+
+TOWNS = [
+    "Ashford",
+    "Bayview",
+    "Brookside",
+    "Cedar Falls",
+    "Fairview",
+    "Glenwood",
+    "Harbor",
+    "Hillcrest",
+    "Lakewood",
+    "Maple Grove",
+    "Oakridge",
+    "Pine Hill",
+    "Riverside",
+    "Springfield",
+    "Westfield",
+]
+VENUE_KINDS = [
+    "Auditorium",
+    "Bandshell",
+    "Civic Center",
+    "Community Church",
+    "High School",
+    "Opera House",
+    "Park",
+    "Performing Arts Center",
+]
+STATES = ["IL", "IN", "MI", "OH", "WI"]
+CONCERT_NAMES = [
+    "Spring Concert",
+    "Summer Pops",
+    "Fall Festival",
+    "Holiday Concert",
+    "Memorial Day Concert",
+    "Independence Day Concert",
+    "Pops in the Park",
+    "Veterans Day Tribute",
+    "Winter Gala",
+    "Young Artists Showcase",
+]
+CONCERT_TIMES = [datetime.time(15, 0), datetime.time(19, 0), datetime.time(19, 30)]
+INSTRUMENTS = ["Trumpet", "Soprano", "Tenor", "Piano", "Clarinet", "Narrator"]
+
+# (status, weight); borrowed, rented and loaned pieces get an organization.
+STATUS_WEIGHTS = [
+    (PieceStatus.OWNED, 80),
+    (PieceStatus.RENTED, 5),
+    (PieceStatus.ON_LOAN, 4),
+    (PieceStatus.BORROWED, 4),
+    (PieceStatus.ARCHIVED, 7),
+]
+STATUS_ORGANIZATIONS = {
+    PieceStatus.RENTED: ("rental", RentalOrganization),
+    PieceStatus.ON_LOAN: ("loaning", LoaningOrganization),
+    PieceStatus.BORROWED: ("borrowing", BorrowingOrganization),
+}
+DIFFICULTIES = [value for value in PieceDifficulty.values if value]
+DRAWERS = [f"{letter}{row}" for letter in "ABCDEFGH" for row in range(1, 7)]
+
+# Dates are relative to this day rather than today, so they repeat too.
+BASE_DATE = datetime.date(2025, 1, 1)
+
+
+class Picker:
+    """Zipf-weighted choice among rows: the first ones are picked most."""
+
+    def __init__(self, rng, rows):
+        self.rng = rng
+        self.rows = rows
+        self.weights = list(accumulate(1 / rank for rank in range(1, len(rows) + 1)))
+
+    def one(self):
+        return self.rng.choices(self.rows, cum_weights=self.weights)[0]
+
+    def some(self, count):
+        """`count` distinct rows, in name order like the M2M managers return them."""
+        picked = {}
+        while len(picked) < min(count, len(self.rows)):
+            row = self.one()
+            picked[row.pk] = row
+        return sorted(
+            picked.values(),
+            key=lambda row: [getattr(row, field) for field in row._meta.ordering],
+        )
+
+
+class BenchmarkSeeder:
+    """Generate a synthetic catalog into an empty database."""
+
+    def __init__(self, seed=0, batch_size=1000):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.created = {}
+
+    def _date(self, low_days, high_days):
+        return BASE_DATE + datetime.timedelta(
+            days=self.rng.randint(low_days, high_days)
+        )
+
+    def _names(self, count):
+        """`count` distinct (first name, last name) pairs."""
+        names = []
+        for index in self.rng.sample(range(MAX_PEOPLE), count):
+            index, last = divmod(index, len(LAST_NAMES))
+            first, middle = divmod(index, len(MIDDLE_INITIALS))
+            first_name = f"{FIRST_NAMES[first]} {MIDDLE_INITIALS[middle]}".strip()
+            names.append((first_name, LAST_NAMES[last]))
+        return names
+
+    def _bulk_create(self, model, rows):
+        with transaction.atomic():
+            created = model.objects.bulk_create(rows, batch_size=self.batch_size)
+        self.created[str(model._meta.verbose_name_plural).lower()] = len(created)
+        return created
+
+    def people(self, model, count, **extra):
+        rows = []
+        for first_name, last_name in self._names(count):
+            row = model(
+                first_name=first_name,
+                last_name=last_name,
+                name_key=person_name_key(first_name, last_name),
+            )
+            for field, make in extra.items():
+                setattr(row, field, make())
+            rows.append(row)
+        return self._bulk_create(model, rows)
+
+    def named(self, model, names, **fields):
+        return self._bulk_create(model, [model(name=name, **fields) for name in names])
+
+    def organizations(self, model, count):
+        return self._bulk_create(
+            model,
+            [
+                model(
+                    name=f"{self.rng.choice(TOWNS)} {kind} {number}",
+                    contact_name=" ".join(self._names(1)[0]),
+                )
+                for number, kind in enumerate(
+                    self.rng.choices(["Band", "Orchestra", "Library"], k=count), 1
+                )
+            ],
+        )
+
+    def venues(self, count):
+        venues = []
+        for _ in range(count):
+            town = self.rng.choice(TOWNS)
+            venues.append(
+                Venue(
+                    name=f"{town} {self.rng.choice(VENUE_KINDS)}",
+                    city=town,
+                    state=self.rng.choice(STATES),
+                )
+            )
+        return self._bulk_create(Venue, venues)
+
+    def _title(self):
+        form = self.rng.choice(TITLE_FORMS)
+        pattern = self.rng.random()
+        if pattern < 0.5:
+            return f"{self.rng.choice(TITLE_ADJECTIVES)} {form}"
+        if pattern < 0.8:
+            return f"{form} No. {self.rng.randint(1, 12)} in {self.rng.choice(KEYS)}"
+        return f"{form} on a Theme of {self.rng.choice(LAST_NAMES)}"
+
+    def _piece(self, pickers):
+        """An unsaved piece, its {M2M field: [rows]} links, and its search document."""
+        rng = self.rng
+        links = {
+            "composer": pickers["composer"].some(1 if rng.random() < 0.85 else 2),
+            "arranger": pickers["arranger"].some(1 if rng.random() < 0.6 else 0),
+            "genre": pickers["genre"].some(1 if rng.random() < 0.7 else 2),
+        }
+        status = rng.choices(*zip(*STATUS_WEIGHTS))[0]
+        drawer = rng.choice(DRAWERS)
+        piece = Piece(
+            title=self._title(),
+            status=status,
+            difficulty=rng.choice(DIFFICULTIES) if rng.random() < 0.9 else "",
+            publisher=pickers["publisher"].one() if rng.random() < 0.85 else None,
+            location_drawer=drawer,
+            location_number=str(rng.randint(1, 400)),
+            purchase_date=self._date(-9000, -30) if rng.random() < 0.5 else None,
+            notes="Parts missing; see librarian." if rng.random() < 0.05 else "",
+            composers_text=credit_text(links["composer"]),
+            arrangers_text=credit_text(links["arranger"]),
+            genres_text=credit_text(links["genre"]),
+        )
+        if status in STATUS_ORGANIZATIONS:
+            prefix, _ = STATUS_ORGANIZATIONS[status]
+            setattr(piece, f"{prefix}_organization", pickers[prefix].one())
+            setattr(piece, f"{prefix}_start_date", self._date(-120, -1))
+            setattr(piece, f"{prefix}_end_date", self._date(-30, 120))
+        # bulk_create does not call save(), which normally sets this.
+        piece.set_location_sort_key()
+        # The same text rebuild_index() would produce for the piece.
+        document = [
+            search._person_names(links["composer"]),
+            search._person_names(links["arranger"]),
+            "; ".join(genre.name for genre in links["genre"]),
+            piece.publisher.name if piece.publisher else "",
+        ]
+        return piece, links, document
+
+    def _link(self, model, batch, owner_field):
+        """bulk_create the M2M rows of (row, {field: [related]}) pairs."""
+        for field in batch[0][1]:
+            through = getattr(model, field).through
+            target = f"{getattr(model, field).field.related_model._meta.model_name}_id"
+            through.objects.bulk_create(
+                [
+                    through(**{f"{owner_field}_id": row.pk, target: related.pk})
+                    for row, links in batch
+                    for related in links[field]
+                ],
+                batch_size=self.batch_size,
+            )
+
+    def pieces(self, count, pickers):
+        created = []
+        while len(created) < count:
+            batch = [
+                self._piece(pickers)
+                for _ in range(min(self.batch_size, count - len(created)))
+            ]
+            with transaction.atomic():
+                pieces = Piece.objects.bulk_create([piece for piece, _, _ in batch])
+                self._link(
+                    Piece, [(piece, links) for piece, links, _ in batch], "piece"
+                )
+                search.add_documents(
+                    [
+                        (piece.pk, piece.title, piece.notes, *document)
+                        for piece, _, document in batch
+                    ]
+                )
+            created.extend(pieces)
+        self.created["pieces"] = len(created)
+        return created
+
+    def _concert(self, pickers):
+        rng = self.rng
+        links = {
+            "conductor": pickers["conductor"].some(1 if rng.random() < 0.9 else 2),
+            "guest": pickers["guest"].some(rng.choices([0, 1, 2], [5, 4, 1])[0]),
+        }
+        date = self._date(-9000, 180)
+        concert = Concert(
+            name=f"{rng.choice(CONCERT_NAMES)} {date.year}",
+            date=date,
+            time=rng.choice(CONCERT_TIMES),
+            venue=pickers["venue"].one(),
+            conductors_text=credit_text(links["conductor"]),
+            guests_text=credit_text(links["guest"]),
+        )
+        return concert, links
+
+    def _program(self, concert, links, pickers):
+        """Unsaved program items for a saved concert: 3-8 pieces, some with soloists."""
+        rng = self.rng
+        pieces = pickers["piece"].rows
+        picked = {}
+        while len(picked) < min(rng.randint(3, 8), len(pieces)):
+            piece = pickers["piece"].one()
+            picked[piece.pk] = piece
+        return [
+            ConcertProgramItem(
+                concert=concert,
+                piece=piece,
+                position=position,
+                soloist=(
+                    rng.choice(links["guest"])
+                    if links["guest"] and rng.random() < 0.3
+                    else None
+                ),
+                concert_date=concert.date,
+            )
+            for position, piece in enumerate(picked.values(), 1)
+        ]
+
+    def concerts(self, count, pickers):
+        total = items = 0
+        while total < count:
+            batch = [
+                self._concert(pickers)
+                for _ in range(min(self.batch_size, count - total))
+            ]
+            with transaction.atomic():
+                concerts = Concert.objects.bulk_create([row for row, _ in batch])
+                self._link(Concert, batch, "concert")
+                program = ConcertProgramItem.objects.bulk_create(
+                    [
+                        item
+                        for concert, links in batch
+                        for item in self._program(concert, links, pickers)
+                    ],
+                    batch_size=self.batch_size,
+                )
+            total += len(concerts)
+            items += len(program)
+        self.created["concerts"] = total
+        self.created["program items"] = items
+
+    def run(self, counts):
+        """
+        Create the catalog. `counts` gives the number of pieces, concerts,
+        composers, arrangers, conductors, guests, venues and organizations
+        (of each kind); genres and publishers come from fixed lists.
+        """
+        rng = self.rng
+        pickers = {
+            "composer": self.people(
+                Composer,
+                counts["composers"],
+                birth_year=lambda: rng.randint(1650, 1995),
+            ),
+            "arranger": self.people(Arranger, counts["arrangers"]),
+            "genre": self.named(Genre, GENRES),
+            "publisher": self.named(Publisher, PUBLISHERS),
+            "conductor": self.people(Conductor, counts["conductors"]),
+            "guest": self.people(
+                Guest, counts["guests"], instrument=lambda: rng.choice(INSTRUMENTS)
+            ),
+            "venue": self.venues(counts["venues"]),
+        }
+        for prefix, model in STATUS_ORGANIZATIONS.values():
+            pickers[prefix] = self.organizations(model, counts["organizations"])
+        pickers = {name: Picker(rng, rows) for name, rows in pickers.items()}
+        pickers["piece"] = Picker(rng, self.pieces(counts["pieces"], pickers))
+        self.concerts(counts["concerts"], pickers)
+        # bulk_create sends no signals, so retire cached pages by hand.
+        bump_generations(
+            Composer,
+            Arranger,
+            Genre,
+            Publisher,
+            Piece,
+            RentalOrganization,
+            LoaningOrganization,
+            BorrowingOrganization,
+            Conductor,
+            Guest,
+            Venue,
+            Concert,
+            ConcertProgramItem,
+        )
+        return self.created
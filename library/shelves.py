@@ -0,0 +1,51 @@
+# library/shelves.py
+# Physical shelf order for pieces.
+#
+# Drawers and numbers are free text ("A", "Drawer 10", "12b"), so they are
+# compared through a natural sort key: case-folded, whitespace collapsed and
+# every run of digits zero-padded, which makes "2" sort before "10". Each
+# piece stores the key of its location in Piece.location_sort_key (set on
+# save), indexed together with the drawer so a drawer reads in shelf order
+# straight from the index.
+
+import re
+
+from django.db.models import Count
+
+DIGITS = re.compile(r"\d+")
+# Digit runs are padded to this width; longer runs keep their length.
+NUMBER_WIDTH = 10
+# Sorts below every character a normalized location can contain.
+SEPARATOR = "\x1f"
+SORT_KEY_LENGTH = 255
+
+
+def normalize_location(value):
+    """Trim and collapse whitespace in a drawer or number."""
+    return " ".join((value or "").split())
+
+
+def natural_sort_key(value):
+    return DIGITS.sub(
+        lambda match: match.group().zfill(NUMBER_WIDTH),
+        normalize_location(value).casefold(),
+    )
+
+
+def location_sort_key(drawer, number):
+    key = f"{natural_sort_key(drawer)}{SEPARATOR}{natural_sort_key(number)}"
+    return key[:SORT_KEY_LENGTH]
+
+
+def drawer_counts(queryset):
+    """
+    Return (drawer, piece count) pairs in natural drawer order. The counts
+    come from one GROUP BY over the (drawer, sort key) index; the handful
+    of drawers is then put in natural order in Python.
+    """
+    rows = (
+        queryset.order_by("location_drawer")
+        .values_list("location_drawer")
+        .annotate(count=Count("pk"))
+    )
+    return sorted(rows, key=lambda row: natural_sort_key(row[0]))
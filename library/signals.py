@@ -0,0 +1,145 @@
+# library/signals.py
+# Keeps the full-text search index (library/search.py) and the Piece credit
+# text columns (core/credits.py) in sync with edits, records piece history
+# (core/history.py) and retires cached pages (core/cache.py).
+#
+# Inside a transaction the pieces to refresh are collected on the
+# connection and refreshed once: at the end of a write_atomic() block, in
+# its transaction, or otherwise when the transaction commits. Saving a
+# piece form (one post_save and an m2m_changed per credit field) so costs
+# one credit refresh and one re-index instead of one per signal.
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import history
+from core.cache import watch_app
+from core.credits import m2m_changed_owner_ids, save_credit_columns
+from core.writes import pre_commit
+from . import search
+from .models import (
+    PIECE_CREDIT_COLUMNS,
+    Arranger,
+    Composer,
+    Genre,
+    Piece,
+    PieceHistory,
+    Publisher,
+)
+
+# Related models whose names appear in a piece's search document or credit
+# columns, mapped to the Piece field that points at them.
+INDEXED_RELATIONS = {
+    Composer: "composer",
+    Arranger: "arranger",
+    Genre: "genre",
+    Publisher: "publisher",
+}
+
+
+def _related_piece_ids(instance):
+    field = INDEXED_RELATIONS[type(instance)]
+    return list(Piece.objects.filter(**{field: instance}).values_list("pk", flat=True))
+
+
+class _PendingPieces:
+    """The pieces changed in one transaction, refreshed by flush()."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.credits = set()
+        self.indexed = set()
+
+    def flush(self):
+        if getattr(self.connection, "_pending_pieces", None) is self:
+            self.connection._pending_pieces = None
+        credits, indexed = self.credits, self.indexed | self.credits
+        self.credits, self.indexed = set(), set()
+        if not indexed:
+            return
+        # One load serves both the credit columns and the search documents.
+        pieces = list(search.indexed_pieces().filter(pk__in=indexed))
+        save_credit_columns(
+            Piece,
+            [piece for piece in pieces if piece.pk in credits],
+            PIECE_CREDIT_COLUMNS,
+        )
+        search.index_pieces(indexed, pieces)
+
+
+def _defer(piece_ids, credits):
+    connection = transaction.get_connection()
+    pending = getattr(connection, "_pending_pieces", None)
+    # Rolling back a transaction or a savepoint discards the on_commit
+    # callbacks registered inside it, and with them the pieces it changed.
+    if pending is None or not any(
+        func == pending.flush for _, func, _ in connection.run_on_commit
+    ):
+        pending = _PendingPieces(connection)
+        if connection.in_atomic_block:
+            connection._pending_pieces = pending
+            transaction.on_commit(pending.flush, using=connection.alias)
+    (pending.credits if credits else pending.indexed).update(piece_ids)
+    if not connection.in_atomic_block:
+        pending.flush()
+
+
+def pieces_changed(piece_ids):
+    """Refresh everything derived from the credits of these pieces."""
+    if piece_ids:
+        _defer(piece_ids, credits=True)
+
+
+@receiver(pre_commit)
+def flush_pending_pieces(sender, using, **kwargs):
+    # The end of a write_atomic() block: refresh in its transaction.
+    pending = getattr(transaction.get_connection(using), "_pending_pieces", None)
+    if pending is not None:
+        pending.flush()
+
+
+@receiver(post_save, sender=Piece)
+def index_saved_piece(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _defer([instance.pk], credits=False)
+
+
+@receiver(post_delete, sender=Piece)
+def unindex_deleted_piece(sender, instance, **kwargs):
+    search.remove_pieces([instance.pk])
+
+
+@receiver(m2m_changed, sender=Piece.composer.through)
+@receiver(m2m_changed, sender=Piece.arranger.through)
+@receiver(m2m_changed, sender=Piece.genre.through)
+def piece_credits_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    piece_ids = m2m_changed_owner_ids(
+        instance, action, reverse, pk_set, _related_piece_ids
+    )
+    if piece_ids is not None:
+        pieces_changed(piece_ids)
+
+
+def credit_renamed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        pieces_changed(_related_piece_ids(instance))
+
+
+def capture_deleted_credit(sender, instance, **kwargs):
+    # Cascades and SET_NULL bypass the piece signals, so note the pieces
+    # that are about to lose this credit.
+    instance._credit_piece_ids = _related_piece_ids(instance)
+
+
+def credit_deleted(sender, instance, **kwargs):
+    pieces_changed(getattr(instance, "_credit_piece_ids", []))
+
+
+for model in INDEXED_RELATIONS:
+    post_save.connect(credit_renamed, sender=model)
+    pre_delete.connect(capture_deleted_credit, sender=model)
+    post_delete.connect(credit_deleted, sender=model)
+
+history.track(Piece, PieceHistory)
+watch_app("library")
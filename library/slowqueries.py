@@ -0,0 +1,133 @@
+# library/slowqueries.py
+# The slow query log.
+#
+# QueryBudgetMiddleware's QueryRecorder (core/queries.py) keeps every
+# statement that takes longer than SLOW_QUERY_MS, with its parameters.
+# Once the response is ready they are added to SlowQuery rows (settings
+# SLOW_QUERY_HANDLER points here), one per fingerprint, in a single write
+# transaction: the SQL with literals and placeholders replaced by ? and
+# IN and VALUES lists collapsed, so a query run for other rows or with a
+# longer list adds to the same row. A row counts the slow runs, keeps
+# the recent durations for the median, tallies the views that ran it and
+# holds the EXPLAIN output captured the first time the query was slow.
+# `manage.py slow_queries` reports them, flagging plans that scan whole
+# tables. Requests without slow queries write nothing.
+
+import hashlib
+import logging
+import re
+import statistics
+
+from django.db import DatabaseError, connections
+
+from core.writes import write_atomic
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Durations kept per fingerprint for the median.
+KEEP_DURATIONS = 100
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """`sql` with its literal values, placeholders and list lengths erased."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+    sql = _LISTS.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    """(normalized SQL, its digest)."""
+    normalized = normalize_sql(sql)
+    return normalized, hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def explain(alias, sql, params, many=False):
+    """The database's plan for `sql`, as text; "" if it cannot be explained."""
+    connection = connections[alias]
+    if many:
+        params = next(iter(params), None)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return ""
+    if connection.vendor != "sqlite":
+        return "\n".join(" ".join(str(value) for value in row) for row in rows)
+    # SQLite rows are (id, parent, unused, detail); indent children.
+    depths = {}
+    lines = []
+    for node, parent, _, detail in rows:
+        depths[node] = depths.get(parent, -1) + 1
+        lines.append("  " * depths[node] + detail)
+    return "\n".join(lines)
+
+
+def full_scans(plan):
+    """The tables an SQLite plan reads in full, without an index."""
+    tables = []
+    for line in plan.splitlines():
+        match = re.match(r"\s*SCAN (?:TABLE )?(\w+)", line)
+        if match and "USING" not in line and match[1] != "CONSTANT":
+            tables.append(match[1])
+    return tables
+
+
+def median_ms(query):
+    return statistics.median(query.durations) if query.durations else 0
+
+
+def _add(entries, view_name):
+    for digest, sql, plan, durations in entries:
+        query, _ = SlowQuery.objects.get_or_create(
+            fingerprint=digest, defaults={"sql": sql, "plan": plan or ""}
+        )
+        if plan and not query.plan:
+            query.plan = plan
+        query.count += len(durations)
+        query.total_ms += sum(durations)
+        query.max_ms = max(query.max_ms, *durations)
+        query.durations = (query.durations + durations)[-KEEP_DURATIONS:]
+        query.views[view_name] = query.views.get(view_name, 0) + len(durations)
+        query.save()
+
+
+def record_slow_queries(slow, view_name):
+    """
+    Add a request's slow queries, [(alias, sql, params, many, ms)] as
+    QueryRecorder keeps them, to the log under `view_name` (a URL name).
+    """
+    grouped = {}
+    for alias, sql, params, many, ms in slow:
+        normalized, digest = fingerprint(sql)
+        entry = grouped.setdefault(digest, [normalized, (alias, sql, params, many)])
+        entry.append(round(ms, 3))
+    try:
+        known = set(
+            SlowQuery.objects.filter(fingerprint__in=grouped).values_list(
+                "fingerprint", flat=True
+            )
+        )
+        entries = [
+            (
+                digest,
+                normalized,
+                None if digest in known else explain(*statement),
+                durations,
+            )
+            for digest, (normalized, statement, *durations) in grouped.items()
+        ]
+        write_atomic(_add, entries, view_name or "-")
+    except DatabaseError:
+        logger.exception("Could not record slow queries of %s", view_name)
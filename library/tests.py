@@ -1,3 +1,2330 @@
-from django.test import TestCase
+# library/tests.py
+import csv
+import datetime
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
 
-# Create your tests here.
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+from django.http import QueryDict
+from django.core.cache import cache
+from django.db import transaction
+from django.test import (
+    Client,
+    LiveServerTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, resolve
+from django.utils import timezone
+from django.utils.http import http_date
+from concerts.models import Concert
+from core.cache import generations
+from core.history import HistoryAction, recording, state_as_of
+from core.loadtest import latency_summary
+from core.queries import QueryRecorder
+from core.timing import STAFF_COOKIE
+from core.testing import (
+    QueryBudgetAssertionsMixin,
+    QueryPlanAssertionsMixin,
+    list_view_queryset,
+)
+from core.writes import write_atomic, write_lock_stats
+from .models import (
+    Composer,
+    Arranger,
+    Genre,
+    Publisher,
+    RentalOrganization,
+    LoaningOrganization,
+    Piece,
+    PieceComposer,
+    PieceDifficulty,
+    PieceGenre,
+    PieceHistory,
+    PieceStatus,
+    RequestProfile,
+    SlowQuery,
+)
+from . import benchmarks, search
+from .forms import PieceForm
+from .slowqueries import full_scans, normalize_sql
+from .profiling import KEEP_PROFILES, PROFILE_HEADER, top_functions
+from .people import duplicate_groups, first_names_compatible, merge_people
+from .shelves import drawer_counts, location_sort_key, natural_sort_key
+from .due import DUE_CATEGORIES, due_items, due_pieces
+from .exports import piece_export_rows
+from .importer import PieceImporter
+from .management.commands.benchmark_sqlite_concurrency import (
+    connect as sqlite_connect,
+)
+from .management.commands.load_test import Command as LoadTestCommand
+from .facets import FACETS, PieceFacets
+from .urls import urlpatterns
+from .views import (
+    ArrangerListView,
+    ComposerListView,
+    PieceListView,
+    PieceSearchView,
+    ShelfDrawerView,
+    ComposerAutocompleteView,
+    GenreAutocompleteView,
+    RentalOrganizationAutocompleteView,
+    PieceDetailView,
+    PieceCreateView,
+    PieceUpdateView,
+    PieceDeleteView,
+)
+
+# Tests that clear or count in the cache get one of their own, not the
+# file-based cache that a running dev server shares.
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def make_piece(title, composer, arranger, genre, publisher, organization):
+    """Create a fully-credited piece so every related lookup is exercised"""
+    # Written the way the views write, so its credits and search row are
+    # refreshed at the end of the block rather than when the test commits.
+    return write_atomic(
+        _make_piece, title, composer, arranger, genre, publisher, organization
+    )
+
+
+def _make_piece(title, composer, arranger, genre, publisher, organization):
+    piece = Piece.objects.create(
+        title=title,
+        publisher=publisher,
+        status=PieceStatus.RENTED,
+        rental_organization=organization,
+        location_drawer="A",
+        location_number="1",
+    )
+    piece.composer.add(composer)
+    piece.arranger.add(arranger)
+    piece.genre.add(genre)
+    return piece
+
+
+class PieceListViewTest(TestCase):
+    """Test case for the paginated Piece catalog list"""
+
+    def setUp(self):
+        self.client = Client()
+        self.composer = Composer.objects.create(
+            first_name="John Philip", last_name="Sousa"
+        )
+        self.arranger = Arranger.objects.create(first_name="Keith", last_name="Brion")
+        self.genre = Genre.objects.create(name="March")
+        self.publisher = Publisher.objects.create(name="Carl Fischer")
+        self.organization = RentalOrganization.objects.create(
+            name="Band Library", contact_name="Librarian"
+        )
+        self.list_url = reverse("piece_list")
+
+    def add_pieces(self, count, start=0):
+        for i in range(start, start + count):
+            make_piece(
+                f"Piece {i:03d}",
+                self.composer,
+                self.arranger,
+                self.genre,
+                self.publisher,
+                self.organization,
+            )
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response
+
+    def test_piece_list_view(self):
+        """Test that list view returns correct status code, template and credits"""
+        self.add_pieces(1)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "piece/piece_list.html")
+        self.assertContains(response, "Piece 000")
+        self.assertContains(response, "Sousa, John Philip")
+        self.assertContains(response, "Brion, Keith")
+        self.assertContains(response, "March")
+        self.assertContains(response, "Carl Fischer")
+        self.assertContains(response, "Band Library")
+
+    def test_piece_list_is_paginated(self):
+        """Test that the list only renders one page of pieces"""
+        self.add_pieces(PieceListView.paginate_by + 1)
+        response = self.client.get(self.list_url)
+        self.assertTrue(response.context["is_paginated"])
+        self.assertEqual(len(response.context["pieces"]), PieceListView.paginate_by)
+        next_cursor = response.context["page_obj"].next_cursor
+        response = self.client.get(self.list_url, {"cursor": next_cursor})
+        self.assertEqual(
+            [piece.title for piece in response.context["pieces"]],
+            [f"Piece {PieceListView.paginate_by:03d}"],
+        )
+        self.assertFalse(response.context["page_obj"].has_next())
+
+    def test_piece_list_query_count_is_constant(self):
+        """Test that the query count does not grow with the number of rows shown"""
+        self.add_pieces(1)
+        small_page_queries, _ = self.count_list_queries()
+
+        self.add_pieces(PieceListView.paginate_by - 1, start=1)
+        full_page_queries, response = self.count_list_queries()
+
+        self.assertEqual(len(response.context["pieces"]), PieceListView.paginate_by)
+        self.assertEqual(small_page_queries, full_page_queries)
+        # pieces (with FKs joined and credits cached on the row), plus one
+        # aggregate per facet; keyset pagination needs no COUNT(*)
+        self.assertLessEqual(full_page_queries, 1 + len(FACETS))
+
+
+class PieceUrlsTest(TestCase):
+    """Test case for URL resolution"""
+
+    def test_piece_urls(self):
+        """Test that piece URLs resolve to the correct views"""
+        self.assertEqual(resolve("/library/pieces/").func.view_class, PieceListView)
+        self.assertEqual(resolve("/library/pieces/1/").func.view_class, PieceDetailView)
+        self.assertEqual(
+            resolve("/library/pieces/create/").func.view_class, PieceCreateView
+        )
+        self.assertEqual(
+            resolve("/library/pieces/1/update/").func.view_class, PieceUpdateView
+        )
+        self.assertEqual(
+            resolve("/library/pieces/1/delete/").func.view_class, PieceDeleteView
+        )
+
+
+class PieceSearchTest(TestCase):
+    """Test case for the FTS5 search index and its signal handlers"""
+
+    def setUp(self):
+        self.composer = Composer.objects.create(
+            first_name="John Philip", last_name="Sousa"
+        )
+        self.arranger = Arranger.objects.create(first_name="Keith", last_name="Brion")
+        self.genre = Genre.objects.create(name="March")
+        self.publisher = Publisher.objects.create(name="Carl Fischer")
+        self.organization = RentalOrganization.objects.create(
+            name="Band Library", contact_name="Librarian"
+        )
+        self.piece = make_piece(
+            "The Stars and Stripes Forever",
+            self.composer,
+            self.arranger,
+            self.genre,
+            self.publisher,
+            self.organization,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other = Piece.objects.create(title="Suite in E-flat", notes="Holst")
+
+    def test_search_matches_every_indexed_column(self):
+        """Test that title, credits, genre, publisher and notes are searchable"""
+        for text in ["stripes", "sousa", "brion", "march", "fischer"]:
+            self.assertEqual(search.search(text), [self.piece.pk], text)
+        self.assertEqual(search.search("holst"), [self.other.pk])
+
+    def test_search_is_prefix_and_accent_insensitive(self):
+        """Test that partial words and accented input still match"""
+        self.assertEqual(search.search("Sou"), [self.piece.pk])
+        self.assertEqual(search.search("Sóusá stars"), [self.piece.pk])
+        self.assertEqual(search.search('"):*'), [])
+
+    def test_title_outranks_other_columns(self):
+        """Test that BM25 weighting puts title hits first"""
+        with self.captureOnCommitCallbacks(execute=True):
+            titled = Piece.objects.create(title="Sousa Favorites")
+        self.assertEqual(search.search("sousa"), [titled.pk, self.piece.pk])
+
+    def test_index_follows_edits(self):
+        """Test that saves, M2M changes, renames and deletes keep the index in sync"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece.title = "Washington Post"
+            self.piece.save()
+        self.assertEqual(search.search("stripes"), [])
+        self.assertEqual(search.search("washington"), [self.piece.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece.composer.clear()
+        self.assertEqual(search.search("sousa"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.composer.piece_set.add(self.piece)
+        self.assertEqual(search.search("sousa"), [self.piece.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.composer.last_name = "Souza"
+            self.composer.save()
+        self.assertEqual(search.search("souza"), [self.piece.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.genre.delete()
+        self.assertEqual(search.search("march"), [])
+
+        self.piece.delete()
+        self.assertEqual(search.search("washington"), [])
+
+    def test_rebuild_command(self):
+        """Test that the management command repopulates an empty index"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.SEARCH_TABLE}")
+        self.assertEqual(search.search("sousa"), [])
+        call_command("rebuild_search_index", batch_size=1, stdout=StringIO())
+        self.assertEqual(search.search("sousa"), [self.piece.pk])
+        self.assertEqual(search.search("holst"), [self.other.pk])
+
+    def test_search_view(self):
+        """Test that the search view renders ranked results"""
+        response = self.client.get(reverse("piece_search"), {"q": "sousa"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "piece/piece_search.html")
+        self.assertEqual(list(response.context["pieces"]), [self.piece])
+        self.assertContains(response, "The Stars and Stripes Forever")
+        self.assertEqual(
+            resolve(reverse("piece_search")).func.view_class, PieceSearchView
+        )
+
+    def test_search_view_pages_through_every_result(self):
+        """Test that results are paginated in the index, past the first 200"""
+        pieces = Piece.objects.bulk_create(
+            Piece(title=f"Sousa March {i:03d}") for i in range(230)
+        )
+        search.add_documents([(p.pk, p.title, "", "", "", "", "") for p in pieces])
+        url = reverse("piece_search")
+        response = self.client.get(url, {"q": "sousa", "page": 12})
+        self.assertEqual(response.context["paginator"].count, 231)
+        self.assertEqual(len(response.context["pieces"]), 11)
+        self.assertContains(response, "Page 12 of 12")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"q": "sousa", "page": 2})
+        self.assertEqual(len(response.context["pieces"]), 20)
+        self.assertTrue(any("LIMIT 20 OFFSET 20" in query["sql"] for query in queries))
+
+
+class PieceFacetTest(TestCase):
+    """Test case for faceted filtering and facet counts"""
+
+    def setUp(self):
+        self.march = Genre.objects.create(name="March")
+        self.overture = Genre.objects.create(name="Overture")
+        self.fischer = Publisher.objects.create(name="Carl Fischer")
+        self.sousa = Composer.objects.create(last_name="Sousa", birth_year=1854)
+        self.holst = Composer.objects.create(last_name="Holst", birth_year=1874)
+        self.ticheli = Composer.objects.create(last_name="Ticheli", birth_year=1958)
+
+        self.stripes = self.make("Stars and Stripes", "OWNED", "MODERATE", [self.march])
+        self.stripes.composer.add(self.sousa)
+        self.stripes.publisher = self.fischer
+        self.stripes.save()
+        self.suite = self.make("First Suite", "OWNED", "DIFFICULT", [self.march])
+        self.suite.composer.add(self.holst)
+        self.shenandoah = self.make("Shenandoah", "ARCHIVED", "MODERATE", [])
+        self.shenandoah.composer.add(self.ticheli)
+        self.festival = self.make("Festival", "OWNED", "EASY", [self.overture])
+
+    def make(self, title, status, difficulty, genres):
+        piece = Piece.objects.create(title=title, status=status, difficulty=difficulty)
+        piece.genre.set(genres)
+        return piece
+
+    def facets(self, **params):
+        query = QueryDict(mutable=True)
+        for name, values in params.items():
+            query.setlist(name, values if isinstance(values, list) else [values])
+        return PieceFacets(query)
+
+    def counts(self, facets):
+        return {
+            facet["name"]: {o["value"]: o["count"] for o in facet["options"]}
+            for facet in facets.counts()
+        }
+
+    def test_filters_combine(self):
+        """Test that facets AND together and values within a facet OR together"""
+        facets = self.facets(status="OWNED", genre=str(self.march.pk))
+        self.assertEqual(
+            set(facets.filter(Piece.objects.all())), {self.stripes, self.suite}
+        )
+        facets = self.facets(era=["modern", "contemporary"])
+        self.assertEqual(
+            set(facets.filter(Piece.objects.all())), {self.suite, self.shenandoah}
+        )
+        facets = self.facets(difficulty="MODERATE", publisher=str(self.fischer.pk))
+        self.assertEqual(list(facets.filter(Piece.objects.all())), [self.stripes])
+
+    def test_counts_without_filters(self):
+        """Test that every facet option reports its piece count"""
+        counts = self.counts(self.facets())
+        self.assertEqual(counts["status"], {"OWNED": 3, "ARCHIVED": 1})
+        self.assertEqual(
+            counts["difficulty"],
+            {PieceDifficulty.EASY: 1, "MODERATE": 2, "DIFFICULT": 1},
+        )
+        self.assertEqual(counts["genre"], {self.march.pk: 2, self.overture.pk: 1})
+        self.assertEqual(counts["publisher"], {self.fischer.pk: 1})
+        self.assertEqual(counts["era"], {"romantic": 1, "modern": 1, "contemporary": 1})
+
+    def test_counts_honour_other_facets(self):
+        """Test that a facet's counts apply the other facets but not its own"""
+        counts = self.counts(self.facets(status="OWNED", genre=str(self.march.pk)))
+        self.assertEqual(counts["status"], {"OWNED": 2})
+        self.assertEqual(counts["genre"], {self.march.pk: 2, self.overture.pk: 1})
+        self.assertEqual(counts["difficulty"], {"MODERATE": 1, "DIFFICULT": 1})
+
+    def test_counts_use_one_query_per_facet(self):
+        """Test that counting never issues a query per option"""
+        facets = self.facets(status="OWNED", era="romantic")
+        with self.assertNumQueries(len(FACETS)):
+            facets.counts()
+
+    def test_invalid_values_are_ignored(self):
+        """Test that junk in the query string does not filter or error"""
+        facets = self.facets(genre="abc", era="jurassic")
+        self.assertEqual(facets.selected, {})
+
+    def test_list_view_filters(self):
+        """Test that the list view applies facets and renders their counts"""
+        response = self.client.get(reverse("piece_list"), {"status": "ARCHIVED"})
+        self.assertEqual(list(response.context["pieces"]), [self.shenandoah])
+        self.assertContains(response, "Composer Era")
+        self.assertContains(response, "status=ARCHIVED&amp;difficulty=MODERATE")
+
+
+class ImportPiecesCommandTest(TestCase):
+    """Test case for the import_pieces management command"""
+
+    HEADER = "title,composer,arranger,genre,publisher,status,rental_organization,difficulty,purchase_date\n"
+
+    def import_csv(self, body, **options):
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False, encoding="utf-8"
+        ) as handle:
+            handle.write(self.HEADER + body)
+        self.addCleanup(os.unlink, handle.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_pieces", handle.name, stdout=stdout, stderr=stderr, **options
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_resolves_and_links_related_rows(self):
+        """Test that names are matched case-insensitively and missing ones created"""
+        Composer.objects.create(first_name="John Philip", last_name="Sousa")
+        stdout, _ = self.import_csv(
+            'Washington Post,"sousa, john philip",Keith Brion,March; Patriotic,'
+            "Carl Fischer,Owned,,Moderate,2020-05-01\n"
+            "Semper Fidelis,John Philip Sousa,,March,carl fischer,,,,\n"
+        )
+        self.assertIn("Imported 2 pieces", stdout)
+        self.assertEqual(Composer.objects.count(), 1)
+        self.assertEqual(Publisher.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 2)
+
+        post = Piece.objects.get(title="Washington Post")
+        self.assertEqual(post.get_composers_display(), "Sousa, John Philip")
+        self.assertEqual(post.get_arrangers_display(), "Brion, Keith")
+        self.assertEqual(post.get_genres_display(), "March; Patriotic")
+        self.assertEqual(post.status, PieceStatus.OWNED)
+        self.assertEqual(post.difficulty, PieceDifficulty.MODERATE)
+        self.assertEqual(str(post.purchase_date), "2020-05-01")
+        self.assertEqual(
+            search.search("fidelis"), [Piece.objects.get(title="Semper Fidelis").pk]
+        )
+
+    def test_invalid_rows_are_rejected_without_aborting_the_batch(self):
+        """Test that rows failing Piece.clean() or field validation are skipped"""
+        stdout, stderr = self.import_csv(
+            "Good One,,,,,,,,\n"
+            "Rented Without Org,Nobody Known,,,Orphan Press,Rented,,,\n"
+            "Bad Date,,,Waltz,,,,,not-a-date\n"
+            ",,,,,,,,\n"
+            "Rented With Org,,,,,RENTED,Band Library,,\n",
+            batch_size=10,
+        )
+        self.assertIn("Imported 2 pieces", stdout)
+        self.assertIn("rejected 3", stdout)
+        self.assertIn("Line 3 rejected: rental_organization", stderr)
+        self.assertIn("Line 4 rejected: purchase_date", stderr)
+        self.assertIn("Line 5 rejected: title", stderr)
+        self.assertEqual(
+            set(Piece.objects.values_list("title", flat=True)),
+            {"Good One", "Rented With Org"},
+        )
+        # The rejected rows' new names were not created.
+        self.assertFalse(Composer.objects.exists())
+        self.assertFalse(Publisher.objects.exists())
+        self.assertFalse(Genre.objects.exists())
+        self.assertEqual(
+            Piece.objects.get(title="Rented With Org").rental_organization.name,
+            "Band Library",
+        )
+
+    def test_import_batches_use_a_fixed_number_of_queries(self):
+        """Test that a batch's inserts do not grow with its row count"""
+        Composer.objects.create(last_name="Holst")
+        Genre.objects.create(name="Suite")
+        rows = "".join(f"Suite {i},Holst,,Suite,,,,,\n" for i in range(50))
+        with CaptureQueriesContext(connection) as context:
+            self.import_csv(rows, batch_size=50)
+        self.assertEqual(Piece.objects.count(), 50)
+        self.assertEqual(Piece.composer.through.objects.count(), 50)
+        self.assertLess(len(context), 25)
+
+
+class PieceExportTest(TestCase):
+    """Test case for the streaming piece export view and command"""
+
+    def setUp(self):
+        composer = Composer.objects.create(first_name="Gustav", last_name="Holst")
+        genre = Genre.objects.create(name="Suite")
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                piece = Piece.objects.create(title=f"Suite {i}", location_drawer="B")
+                piece.composer.add(composer)
+                piece.genre.add(genre)
+        self.url = reverse("piece_export")
+
+    def read(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_csv_export_streams_every_piece(self):
+        """Test that the CSV export is streamed with credits resolved"""
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertIn("pieces.csv", response["Content-Disposition"])
+        rows = list(csv.reader(StringIO(self.read(response).decode())))
+        self.assertEqual(rows[0][:3], ["id", "title", "composers"])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][1:3], ["Suite 0", "Holst, Gustav"])
+
+    def test_jsonl_export_with_gzip(self):
+        """Test that JSON Lines can be gzipped on the fly"""
+        response = self.client.get(self.url, {"format": "jsonl", "gzip": "1"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("pieces.jsonl.gz", response["Content-Disposition"])
+        lines = gzip.decompress(self.read(response)).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])["genres"], "Suite")
+
+    def test_one_query_per_chunk(self):
+        """Test that queries grow with the number of chunks, not rows"""
+        with CaptureQueriesContext(connection) as context:
+            rows = list(piece_export_rows(chunk_size=2))
+        self.assertEqual(len(rows), 5)
+        # credits are read from the cached text columns, so 3 chunks cost
+        # at most 3 queries
+        self.assertLessEqual(len(context), 3)
+
+    def test_export_command(self):
+        """Test that the command writes the same rows to a gzipped file"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pieces.csv.gz")
+            call_command("export_pieces", output=path, gzip=True)
+            with gzip.open(path, "rt") as handle:
+                rows = list(csv.reader(handle))
+        self.assertEqual(len(rows), 6)
+
+
+class PieceCreditColumnsTest(TestCase):
+    """Test case for the cached credit text columns on Piece"""
+
+    def setUp(self):
+        self.sousa = Composer.objects.create(
+            first_name="John Philip", last_name="Sousa"
+        )
+        self.holst = Composer.objects.create(first_name="Gustav", last_name="Holst")
+        self.march = Genre.objects.create(name="March")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece = Piece.objects.create(title="The Liberty Bell")
+
+    def refresh(self):
+        self.piece.refresh_from_db()
+        return self.piece
+
+    def test_links_update_the_columns(self):
+        """Test that adding, removing and clearing credits keeps the text current"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece.composer.add(self.sousa, self.holst)
+            self.piece.genre.add(self.march)
+        self.assertEqual(
+            self.refresh().composers_text, "Holst, Gustav; Sousa, John Philip"
+        )
+        self.assertEqual(self.piece.genres_text, "March")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece.composer.remove(self.holst)
+        self.assertEqual(self.refresh().composers_text, "Sousa, John Philip")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece.composer.clear()
+        self.assertEqual(self.refresh().composers_text, "")
+
+    def test_reverse_side_links_update_the_columns(self):
+        """Test that changes made from the credited side update every piece"""
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Piece.objects.create(title="Semper Fidelis")
+            self.sousa.piece_set.add(self.piece, other)
+        self.assertEqual(self.refresh().composers_text, "Sousa, John Philip")
+        self.assertEqual(
+            Piece.objects.get(pk=other.pk).composers_text, "Sousa, John Philip"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sousa.piece_set.clear()
+        self.assertEqual(self.refresh().composers_text, "")
+        self.assertEqual(Piece.objects.get(pk=other.pk).composers_text, "")
+
+    def test_rename_and_delete_update_the_columns(self):
+        """Test that renaming or deleting a credited row rewrites the text"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece.arranger.add(Arranger.objects.create(last_name="Fennell"))
+            arranger = Arranger.objects.get()
+            arranger.first_name = "Frederick"
+            arranger.save()
+        self.assertEqual(self.refresh().arrangers_text, "Fennell, Frederick")
+        with self.captureOnCommitCallbacks(execute=True):
+            arranger.delete()
+        self.assertEqual(self.refresh().arrangers_text, "")
+
+    def test_one_refresh_per_transaction(self):
+        """Test that a transaction's credit changes are refreshed once, at its end"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece.title = "Liberty Bell March"
+            self.piece.save()
+            self.piece.composer.add(self.sousa)
+            self.piece.composer.add(self.holst)
+            self.piece.genre.add(self.march)
+            self.assertEqual(self.refresh().composers_text, "")
+        self.assertEqual(
+            self.refresh().composers_text, "Holst, Gustav; Sousa, John Philip"
+        )
+        self.assertEqual(search.search("liberty sousa march"), [self.piece.pk])
+
+    def test_refresh_survives_a_rolled_back_savepoint(self):
+        """Test that changes after a rolled-back savepoint are still refreshed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.piece.composer.add(self.sousa)
+                raise RuntimeError
+            self.piece.composer.add(self.holst)
+        self.assertEqual(self.refresh().composers_text, "Holst, Gustav")
+
+    def test_piece_form_refreshes_once(self):
+        """Test that saving a piece form refreshes its credits and search row once"""
+        form = PieceForm(
+            data={
+                "title": "The Liberty Bell",
+                "composer": [self.sousa.pk, self.holst.pk],
+                "genre": [self.march.pk],
+            },
+            instance=self.piece,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with CaptureQueriesContext(connection) as queries:
+            write_atomic(form.save)
+        refreshes = [q for q in queries if q["sql"].startswith("UPDATE")]
+        indexed = [
+            q for q in queries if f"INSERT INTO {search.SEARCH_TABLE}" in q["sql"]
+        ]
+        # the piece's own save, then one credit column update
+        self.assertEqual(len(refreshes), 2)
+        self.assertEqual(len(indexed), 1)
+
+    def test_backfill_command(self):
+        """Test that the backfill command repairs stale columns in batches"""
+        self.piece.composer.add(self.sousa)
+        Piece.objects.update(composers_text="stale")
+        stdout = StringIO()
+        call_command("backfill_piece_credits", batch_size=1, stdout=stdout)
+        self.assertEqual(self.refresh().composers_text, "Sousa, John Philip")
+        self.assertIn("1 pieces", stdout.getvalue())
+
+
+class LibraryIndexPlanTest(QueryPlanAssertionsMixin, TestCase):
+    """Test case that the hot library lookups and sorts are served by indexes"""
+
+    def test_person_lists_page_through_the_name_index(self):
+        """Test that composer and arranger lists scan (last_name, first_name)"""
+        for view_class in (ComposerListView, ArrangerListView):
+            model = view_class.model
+            for reverse in (False, True):
+                self.assertUsesIndex(
+                    list_view_queryset(view_class, reverse=reverse)[:21],
+                    model,
+                    ["last_name", "first_name"],
+                )
+
+    def test_piece_list_pages_through_the_title_index(self):
+        """Test that the catalog is read in title order without sorting"""
+        self.assertUsesIndex(list_view_queryset(PieceListView)[:21], Piece, ["title"])
+
+    def test_status_filter_uses_an_index(self):
+        """Test that filtering on status alone searches a status-led index"""
+        plan = Piece.objects.filter(status=PieceStatus.RENTED).order_by().explain()
+        self.assertRegex(plan, r"SEARCH library_piece USING INDEX \w+ \(status=\?\)")
+
+    def test_drawer_lookups_use_an_index(self):
+        """Test that drawer counts and shelf order use (drawer, sort key)"""
+        self.assertUsesIndex(
+            list_view_queryset(ShelfDrawerView, drawer="A")[:51],
+            Piece,
+            ["location_drawer", "location_sort_key"],
+        )
+        self.assertUsesIndex(
+            Piece.objects.order_by("location_drawer")
+            .values_list("location_drawer")
+            .annotate(count=Count("pk")),
+            Piece,
+            ["location_drawer", "location_sort_key"],
+        )
+
+    def test_facet_links_use_an_index(self):
+        """Test that genre and composer facets read their link tables linked-row first"""
+        self.assertUsesIndex(
+            PieceGenre.objects.filter(genre_id__in=[1, 2]).values("piece_id"),
+            PieceGenre,
+            ["genre", "piece"],
+        )
+        self.assertUsesIndex(
+            PieceComposer.objects.filter(composer_id=1).values("piece_id"),
+            PieceComposer,
+            ["composer", "piece"],
+        )
+
+    def test_due_date_lookups_use_an_index(self):
+        """Test that each due category is one range scan in due-date order"""
+        horizon = timezone.localdate()
+        for _, _, status, end_field, organization_field in DUE_CATEGORIES:
+            self.assertUsesIndex(
+                due_pieces(status, end_field, organization_field, horizon),
+                Piece,
+                ["status", end_field],
+            )
+
+
+class DueItemsTest(TestCase):
+    """Test case for the due and overdue tracker, dashboard and command"""
+
+    def setUp(self):
+        self.today = datetime.date(2025, 3, 1)
+        self.rental = RentalOrganization.objects.create(
+            name="Music Rentals", contact_name="Ann", contact_email="ann@example.com"
+        )
+        self.other_rental = RentalOrganization.objects.create(
+            name="Band Rentals", contact_name="Bob"
+        )
+        self.loan = LoaningOrganization.objects.create(
+            name="City Band", contact_name="Cy", contact_email="cy@example.com"
+        )
+        self.overdue = self.piece(
+            "Overdue", PieceStatus.RENTED, rental_organization=self.rental, days=-3
+        )
+        self.due_soon = self.piece(
+            "Due Soon", PieceStatus.RENTED, rental_organization=self.rental, days=2
+        )
+        self.piece(
+            "Other", PieceStatus.RENTED, rental_organization=self.other_rental, days=0
+        )
+        self.piece(
+            "Later", PieceStatus.RENTED, rental_organization=self.rental, days=60
+        )
+        self.piece(
+            "Returned", PieceStatus.OWNED, rental_organization=self.rental, days=-9
+        )
+        self.piece("Lent", PieceStatus.ON_LOAN, loaning_organization=self.loan, days=-1)
+
+    def piece(self, title, status, days, **organization):
+        end_field = {
+            PieceStatus.RENTED: "rental_end_date",
+            PieceStatus.OWNED: "rental_end_date",
+            PieceStatus.ON_LOAN: "loaning_end_date",
+        }[status]
+        return Piece.objects.create(
+            title=title,
+            status=status,
+            **{end_field: self.today + datetime.timedelta(days=days)},
+            **organization,
+        )
+
+    def test_due_items_are_grouped_by_organization(self):
+        """Test that each category takes one query and groups by organization"""
+        with self.assertNumQueries(len(DUE_CATEGORIES)):
+            rentals, loans, borrows = due_items(today=self.today, days_ahead=7)
+        self.assertEqual(
+            [group.organization for group in rentals.groups],
+            [self.rental, self.other_rental],
+        )
+        self.assertEqual(rentals.groups[0].overdue, [self.overdue])
+        self.assertEqual(rentals.groups[0].due_soon, [self.due_soon])
+        self.assertEqual(rentals.groups[0].overdue[0].days_overdue, 3)
+        self.assertEqual((len(rentals), rentals.overdue_count), (3, 1))
+        self.assertEqual((len(loans), loans.overdue_count), (1, 1))
+        self.assertEqual(len(borrows), 0)
+
+    def test_dashboard(self):
+        """Test that the dashboard lists due pieces under their organization"""
+        response = self.client.get(reverse("piece_due"), {"days": "4000"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["days_ahead"], 365)
+        self.assertContains(response, "Music Rentals")
+        self.assertContains(response, "City Band")
+
+    @override_settings(MANAGERS=[("Librarian", "librarian@example.com")])
+    def test_command_sends_digests_over_one_connection(self):
+        """Test that each contact gets one digest and managers get a summary"""
+        stdout = StringIO()
+        with mock.patch(
+            "library.due.mail.get_connection", wraps=mail.get_connection
+        ) as get_connection:
+            call_command("check_due_items", date="2025-03-01", days=7, stdout=stdout)
+        get_connection.assert_called_once()
+        self.assertIn("Rentals: 3 due, 1 overdue", stdout.getvalue())
+        recipients = sorted(message.to[0] for message in mail.outbox)
+        self.assertEqual(
+            recipients, ["ann@example.com", "cy@example.com", "librarian@example.com"]
+        )
+        digest = next(m for m in mail.outbox if m.to == ["ann@example.com"])
+        self.assertIn("Overdue: due Feb 26, 2025 (3 days overdue)", digest.body)
+        self.assertIn("Due Soon: due Mar 03, 2025", digest.body)
+        self.assertNotIn("Later", digest.body)
+
+    def test_command_without_email(self):
+        """Test that --no-email only reports"""
+        call_command("check_due_items", no_email=True, stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(TIME_ZONE="Pacific/Kiritimati")
+    def test_today_is_the_local_date(self):
+        """Test that "today" is the date in TIME_ZONE, not the server's date"""
+        now = datetime.datetime(2025, 2, 28, 12, tzinfo=datetime.timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            rentals, _, _ = due_items(days_ahead=0)
+        self.assertEqual(rentals.groups[0].overdue, [self.overdue])
+        self.assertEqual(rentals.groups[0].overdue[0].days_overdue, 3)
+
+
+class ShelfInventoryTest(TestCase):
+    """Test case for the drawer-by-drawer shelf inventory"""
+
+    def setUp(self):
+        for drawer, number in [
+            ("Drawer 10", "1"),
+            (" Drawer  2 ", "10"),
+            ("Drawer 2", "2"),
+            ("Drawer 2", "1b"),
+            ("Drawer 2", "1A"),
+            ("", "5"),
+        ]:
+            Piece.objects.create(
+                title=f"{drawer.strip()}/{number}",
+                location_drawer=drawer,
+                location_number=number,
+            )
+
+    def test_sort_key_is_natural_and_normalized(self):
+        """Test that digit runs compare numerically and whitespace is collapsed"""
+        self.assertLess(natural_sort_key("Drawer 2"), natural_sort_key("Drawer 10"))
+        self.assertEqual(natural_sort_key(" drawer  2"), natural_sort_key("Drawer 2"))
+        self.assertLess(location_sort_key("A", ""), location_sort_key("A 1", ""))
+        piece = Piece.objects.get(location_number="10")
+        self.assertEqual(piece.location_drawer, "Drawer 2")
+
+    def test_sort_key_follows_update_fields(self):
+        """Test that saving only the location also saves its sort key"""
+        piece = Piece.objects.get(title="Drawer 10/1")
+        piece.location_number = "3"
+        piece.save(update_fields=["location_number"])
+        piece.refresh_from_db()
+        self.assertEqual(piece.location_sort_key, location_sort_key("Drawer 10", "3"))
+
+    def test_drawer_counts(self):
+        """Test that drawers are counted in one query, in natural order"""
+        with self.assertNumQueries(1):
+            drawers = drawer_counts(Piece.objects.all())
+        self.assertEqual(drawers, [("", 1), ("Drawer 2", 4), ("Drawer 10", 1)])
+
+    def test_shelf_views(self):
+        """Test that a drawer lists its pieces in shelf order"""
+        response = self.client.get(reverse("shelf_list"))
+        self.assertContains(response, "?drawer=Drawer%202")
+        response = self.client.get(reverse("shelf_drawer"), {"drawer": "Drawer 2"})
+        self.assertEqual(
+            [piece.location_number for piece in response.context["pieces"]],
+            ["1A", "1b", "2", "10"],
+        )
+
+
+class DuplicatePeopleTest(TestCase):
+    """Test case for duplicate person detection and merging"""
+
+    def setUp(self):
+        self.full = Composer.objects.create(first_name="John Philip", last_name="Sousa")
+        self.initials = Composer.objects.create(first_name="J.P.", last_name="Sóusa")
+        self.blank = Composer.objects.create(first_name=None, last_name="SOUSA")
+        self.other = Composer.objects.create(first_name="Jane", last_name="Sousa")
+        Composer.objects.create(first_name="Gustav", last_name="Holst")
+
+    def test_name_key_folds_case_accents_and_initials(self):
+        """Test that the stored key ignores accents, case and punctuation"""
+        self.assertEqual(self.full.name_key, "sousa|jp")
+        self.assertEqual(self.initials.name_key, "sousa|jp")
+        self.assertEqual(self.blank.name_key, "sousa|")
+        self.assertTrue(first_names_compatible("J. P.", "John Philip"))
+        self.assertFalse(first_names_compatible("Jane", "John"))
+
+    def test_duplicate_groups_block_by_last_name(self):
+        """Test that compatible names in one block are grouped, best name first"""
+        with self.assertNumQueries(1):
+            groups = list(duplicate_groups(Composer))
+        self.assertEqual(groups, [[self.full, self.initials, self.blank]])
+
+    def test_merge_repoints_links_in_one_update_per_table(self):
+        """Test that a merge keeps one link per piece and refreshes credits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            both = Piece.objects.create(title="Liberty Bell")
+            both.composer.add(self.full, self.initials, self.blank)
+            only_duplicate = Piece.objects.create(title="Semper Fidelis")
+            only_duplicate.composer.add(self.initials, self.blank)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as context:
+                merged = merge_people(self.full, [self.initials, self.blank])
+        through = Piece.composer.through._meta.db_table
+        updates = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith(f'UPDATE "{through}"')
+        ]
+        self.assertEqual(merged, 2)
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(list(both.composer.all()), [self.full])
+        self.assertEqual(list(only_duplicate.composer.all()), [self.full])
+        self.assertFalse(Composer.objects.filter(last_name="SOUSA").exists())
+        only_duplicate.refresh_from_db()
+        self.assertEqual(only_duplicate.composers_text, "Sousa, John Philip")
+        self.assertEqual(search.search("philip"), [both.pk, only_duplicate.pk])
+
+    def test_command_lists_and_merges(self):
+        """Test that the command reports groups and merges with --merge"""
+        stdout = StringIO()
+        call_command("find_duplicate_people", "composer", stdout=stdout)
+        self.assertIn("Found 1 duplicate group(s)", stdout.getvalue())
+        self.assertEqual(Composer.objects.count(), 5)
+        call_command("find_duplicate_people", merge=True, stdout=StringIO())
+        self.assertEqual(
+            Composer.objects.filter(name_key__startswith="sousa|").count(), 2
+        )
+
+    def test_admin_merge_action(self):
+        """Test that the admin action confirms, then merges likely duplicates only"""
+        admin_user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        self.client.force_login(admin_user)
+        url = reverse("admin:library_composer_changelist")
+
+        def merge(*people, **data):
+            selected = [person.pk for person in people]
+            return self.client.post(
+                url, {"action": "merge_selected", "_selected_action": selected, **data}
+            )
+
+        response = merge(self.other, self.initials, self.full)
+        self.assertRedirects(response, url)
+        response = merge(Composer.objects.get(last_name="Holst"), self.blank)
+        self.assertRedirects(response, url)
+        self.assertEqual(Composer.objects.count(), 5)
+
+        # The same group "Show likely duplicates" and the command find.
+        response = merge(self.blank, self.initials, self.full)
+        self.assertContains(response, "Are you sure")
+        self.assertEqual(response.context["keeper"], self.full)
+        self.assertEqual(Composer.objects.count(), 5)
+        response = merge(self.blank, self.initials, self.full, post="yes")
+        self.assertRedirects(response, url)
+        self.assertEqual(
+            set(Composer.objects.filter(name_key__startswith="sousa|")),
+            {self.full, self.other},
+        )
+
+    def test_admin_merge_needs_delete_permission(self):
+        """Test that staff who may only change people cannot merge them"""
+        editor = get_user_model().objects.create_user(
+            "editor", "editor@example.com", "password", is_staff=True
+        )
+        editor.user_permissions.add(
+            Permission.objects.get(codename="view_composer"),
+            Permission.objects.get(codename="change_composer"),
+        )
+        self.client.force_login(editor)
+        self.client.post(
+            reverse("admin:library_composer_changelist"),
+            {
+                "action": "merge_selected",
+                "_selected_action": [self.initials.pk, self.full.pk],
+                "post": "yes",
+            },
+        )
+        self.assertEqual(Composer.objects.count(), 5)
+
+
+class AutocompleteTest(QueryPlanAssertionsMixin, TestCase):
+    """Test case for the autocomplete endpoints and widgets on PieceForm"""
+
+    def setUp(self):
+        self.sousa = Composer.objects.create(
+            first_name="John Philip", last_name="Sousa"
+        )
+        Composer.objects.create(first_name="Jane", last_name="Sóusa")
+        Composer.objects.create(first_name="Gustav", last_name="Holst")
+        for i in range(25):
+            Genre.objects.create(name=f"March {i:02d}")
+        Genre.objects.create(name="Overture")
+
+    def results(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_person_prefix_matching(self):
+        """Test that people match on a folded last-name prefix and initials"""
+        data = self.results("composer_autocomplete", q="SOU")
+        self.assertEqual(
+            [item["text"] for item in data["results"]],
+            ["Sóusa, Jane", "Sousa, John Philip"],
+        )
+        data = self.results("composer_autocomplete", q="sousa, g")
+        self.assertEqual(data["results"], [])
+        data = self.results("composer_autocomplete", q="hol")
+        self.assertEqual(data["results"][0]["text"], "Holst, Gustav")
+
+    def test_name_prefix_matching_is_paginated(self):
+        """Test that name matches come back a page at a time"""
+        first = self.results("genre_autocomplete", q="mar")
+        self.assertEqual(len(first["results"]), 20)
+        self.assertTrue(first["more"])
+        second = self.results("genre_autocomplete", q="mar", page="2")
+        self.assertEqual(len(second["results"]), 5)
+        self.assertFalse(second["more"])
+        self.assertEqual(second["results"][-1]["text"], "March 24")
+
+    def test_lookups_use_an_index(self):
+        """Test that prefix lookups are index range scans in result order"""
+        self.assertUsesIndex(
+            ComposerAutocompleteView().get_queryset("sou")[:21],
+            Composer,
+            ["name_key"],
+        )
+        for view_class in (GenreAutocompleteView, RentalOrganizationAutocompleteView):
+            model = view_class.model
+            self.assertUsesIndex(
+                view_class().get_queryset("ma")[:21], model, model._meta.indexes[0].name
+            )
+
+    def test_piece_matching(self):
+        """Test that pieces match through the search index, with their composers"""
+        with self.captureOnCommitCallbacks(execute=True):
+            piece = Piece.objects.create(title="The Liberty Bell")
+            piece.composer.add(self.sousa)
+            Piece.objects.create(title="Semper Fidelis")
+        data = self.results("piece_autocomplete", q="liberty")
+        self.assertEqual(
+            data["results"],
+            [{"id": piece.pk, "text": "The Liberty Bell (Sousa, John Philip)"}],
+        )
+        data = self.results("piece_autocomplete")
+        self.assertEqual(len(data["results"]), 2)
+
+    def test_form_renders_only_selected_options(self):
+        """Test that the piece form no longer lists every related row"""
+        piece = Piece.objects.create(title="The Liberty Bell")
+        piece.composer.add(self.sousa)
+        response = self.client.get(reverse("piece_update", args=[piece.pk]))
+        self.assertContains(
+            response, 'data-autocomplete-url="/library/autocomplete/composers/"'
+        )
+        self.assertContains(response, "js/autocomplete.js")
+        self.assertContains(response, "Sousa, John Philip")
+        self.assertNotContains(response, "Holst")
+        self.assertNotContains(response, "March 00")
+
+    def test_form_accepts_ids_from_the_endpoints(self):
+        """Test that values chosen through autocomplete validate and save"""
+        form = PieceForm(
+            data={
+                "title": "Semper Fidelis",
+                "composer": [self.sousa.pk],
+                "genre": [Genre.objects.get(name="Overture").pk],
+            }
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        piece = write_atomic(form.save)
+        piece.refresh_from_db()
+        self.assertEqual(piece.composers_text, "Sousa, John Philip")
+
+
+class PieceFormRenderTest(TestCase):
+    """Tests for the native date inputs and cached choice selects"""
+
+    def setUp(self):
+        self.piece = Piece.objects.create(
+            title="Lassus Trombone",
+            status=PieceStatus.RENTED,
+            rental_end_date=datetime.date(2025, 6, 1),
+        )
+
+    def test_dates_render_as_native_inputs(self):
+        """Test that dates render as one ISO-valued <input type="date">"""
+        response = self.client.get(reverse("piece_update", args=[self.piece.pk]))
+        self.assertContains(
+            response, 'type="date" name="rental_end_date" value="2025-06-01"'
+        )
+        self.assertNotContains(response, "rental_end_date_month")
+
+    def selected(self, groups):
+        return [
+            option["value"]
+            for _, options, _ in groups
+            for option in options
+            if option["selected"]
+        ]
+
+    def test_static_choices_are_built_once(self):
+        """Test that repeated choice options come from the form class memo"""
+        first = PieceForm().fields["status"].widget
+        first.optgroups("status", [PieceStatus.RENTED], {"id": "id_status"})
+        second = PieceForm().fields["status"].widget
+        self.assertIsNot(first, second)
+        with mock.patch("django.forms.widgets.ChoiceWidget.optgroups") as optgroups:
+            groups = second.optgroups(
+                "status", [PieceStatus.RENTED], {"id": "id_status"}
+            )
+            optgroups.assert_not_called()
+        self.assertEqual(self.selected(groups), [PieceStatus.RENTED])
+        other = second.optgroups("status", [PieceStatus.OWNED], {"id": "id_status"})
+        self.assertEqual(self.selected(other), [PieceStatus.OWNED])
+
+    def test_static_choices_use_the_crispy_select(self):
+        """Test that crispy-tailwind renders the choice select with its template"""
+        response = self.client.get(reverse("piece_update", args=[self.piece.pk]))
+        html = response.content.decode()
+        start = html.index('name="status"')
+        select = html[html.rindex("<div", 0, start) : html.index("</div>", start)]
+        self.assertIn('<div class="relative">', select)
+        self.assertIn(f'value="{PieceStatus.RENTED}"  selected', select)
+
+    def test_iso_dates_validate(self):
+        """Test that the ISO strings a date input posts are accepted"""
+        form = PieceForm(
+            data={
+                "title": "Lassus Trombone",
+                "status": PieceStatus.RENTED,
+                "rental_organization": RentalOrganization.objects.create(
+                    name="Band Music Rentals"
+                ).pk,
+                "rental_start_date": "2025-05-01",
+                "rental_end_date": "2025-06-01",
+            },
+            instance=self.piece,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(
+            form.cleaned_data["rental_start_date"], datetime.date(2025, 5, 1)
+        )
+
+    def test_benchmark_command(self):
+        """Test that benchmark_piece_form reports both views and rolls back"""
+        out = StringIO()
+        call_command("benchmark_piece_form", iterations=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn("PieceCreateView   before", output)
+        self.assertIn("PieceUpdateView   after", output)
+        self.assertEqual(Piece.objects.count(), 1)
+
+
+class PieceHistoryTest(TestCase):
+    """Tests for the piece change history and as-of queries"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="librarian", password="secret"
+        )
+        self.band = LoaningOrganization.objects.create(name="City Band")
+        self.sousa = Composer.objects.create(
+            first_name="John Philip", last_name="Sousa"
+        )
+        self.piece = Piece.objects.create(title="El Capitan", location_drawer="A")
+
+    def at(self, *args):
+        when = datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+        return mock.patch("core.history.timezone.now", return_value=when)
+
+    def test_create_records_set_fields(self):
+        """Test that a new piece records its non-empty fields"""
+        entry = self.piece.history.get()
+        self.assertEqual(entry.action, HistoryAction.CREATE)
+        self.assertEqual(
+            entry.changes,
+            {"title": [None, "El Capitan"], "location_drawer": [None, "A"]},
+        )
+
+    def test_request_writes_one_row_with_user_and_m2m(self):
+        """Test that an edit is one diff row, written in one INSERT"""
+        self.client.force_login(self.user)
+        data = {
+            "title": "El Capitan",
+            "composer": [self.sousa.pk],
+            "status": PieceStatus.ON_LOAN,
+            "loaning_organization": self.band.pk,
+            "loaning_end_date": "2025-06-01",
+            "location_drawer": "A",
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("piece_update", args=[self.piece.pk]), data
+            )
+        self.assertEqual(response.status_code, 302)
+        inserts = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('INSERT INTO "library_piecehistory"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        entry = self.piece.history.latest("pk")
+        self.assertEqual(entry.action, HistoryAction.UPDATE)
+        self.assertEqual(entry.user, self.user)
+        self.assertEqual(
+            entry.changes,
+            {
+                "status": ["", "ON_LOAN"],
+                "loaning_organization": [None, self.band.pk],
+                "loaning_end_date": [None, "2025-06-01"],
+                "composer": [[], [self.sousa.pk]],
+            },
+        )
+
+    def test_batch_merges_saves_into_one_insert(self):
+        """Test that recording() buffers rows until the block ends"""
+        with recording(self.user):
+            self.piece.notes = "Worn parts"
+            self.piece.save()
+            self.piece.composer.add(self.sousa)
+            self.piece.save()  # no changes: no row
+            self.assertEqual(self.piece.history.count(), 1)
+        entries = list(self.piece.history.all())
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(
+            entries[1].changes,
+            {"notes": ["", "Worn parts"], "composer": [[], [self.sousa.pk]]},
+        )
+
+    def test_rolled_back_changes_are_dropped(self):
+        """Test that edits rolled back, or in a block that raises, leave no rows"""
+        with recording(self.user):
+            try:
+                with transaction.atomic():
+                    self.piece.title = "The Thunderer"
+                    self.piece.save()
+                    raise ValueError
+            except ValueError:
+                pass
+            self.piece.notes = "Worn parts"
+            self.piece.save()
+        self.assertEqual(
+            self.piece.history.latest("pk").changes,
+            {"title": ["El Capitan", "The Thunderer"], "notes": ["", "Worn parts"]},
+        )
+        with self.assertRaises(ValueError):
+            with recording(self.user):
+                self.piece.notes = "Torn score"
+                self.piece.save()
+                raise ValueError
+        self.assertEqual(self.piece.history.count(), 2)
+
+    def test_save_does_not_reread_the_row(self):
+        """Test that a save diffs against the loaded values without a SELECT"""
+        piece = Piece.objects.get(pk=self.piece.pk)
+        piece.title = "The Thunderer"
+        with CaptureQueriesContext(connection) as queries:
+            piece.save()
+        self.assertFalse(
+            [
+                query
+                for query in queries
+                if 'FROM "library_piece" WHERE "library_piece"."id"' in query["sql"]
+            ]
+        )
+        piece.notes = "Worn parts"
+        piece.save()
+        self.assertEqual(
+            piece.history.latest("pk").changes, {"notes": ["", "Worn parts"]}
+        )
+
+    def test_state_as_of(self):
+        """Test that past states are rebuilt by undoing later changes"""
+        PieceHistory.objects.all().delete()  # a piece from before history
+        with self.at(2025, 3, 1):
+            self.piece.status = PieceStatus.ON_LOAN
+            self.piece.loaning_organization = self.band
+            self.piece.save()
+        with self.at(2025, 4, 1):
+            self.piece.composer.add(self.sousa)
+            self.piece.status = PieceStatus.OWNED
+            self.piece.loaning_organization = None
+            self.piece.save()
+
+        def state(*args):
+            when = datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+            return state_as_of(Piece, self.piece.pk, when)
+
+        self.assertEqual(state(2025, 2, 1)["status"], "")
+        self.assertEqual(state(2025, 3, 15)["status"], PieceStatus.ON_LOAN)
+        self.assertEqual(state(2025, 3, 15)["loaning_organization"], self.band.pk)
+        self.assertEqual(state(2025, 3, 15)["composer"], [])
+        self.assertEqual(state(2025, 4, 2)["composer"], [self.sousa.pk])
+        self.assertEqual(state(2025, 4, 2)["title"], "El Capitan")
+
+        pk = self.piece.pk
+        with self.at(2025, 5, 1):
+            self.piece.delete()
+        self.assertIsNone(state_as_of(Piece, pk, timezone.now()))
+        before = state_as_of(
+            Piece, pk, datetime.datetime(2025, 4, 15, tzinfo=datetime.timezone.utc)
+        )
+        self.assertEqual(before["status"], PieceStatus.OWNED)
+        self.assertEqual(before["composer"], [self.sousa.pk])
+
+    def test_history_view(self):
+        """Test that the history page lists changes and the as-of state"""
+        self.piece.status = PieceStatus.ON_LOAN
+        self.piece.loaning_organization = self.band
+        self.piece.save()
+        response = self.client.get(
+            reverse("piece_history", args=[self.piece.pk]),
+            {"as_of": timezone.localdate().isoformat()},
+        )
+        self.assertContains(response, "Loaning organization: - &rarr; City Band")
+        self.assertContains(response, "On Loan")
+        self.assertContains(response, "Created")
+
+    def test_history_view_resolves_names_once(self):
+        """Test that the as-of state shares the changes' related name lookups"""
+        self.piece.status = PieceStatus.ON_LOAN
+        self.piece.loaning_organization = self.band
+        self.piece.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("piece_history", args=[self.piece.pk]),
+                {"as_of": timezone.localdate().isoformat()},
+            )
+        # in the change and in the state, from one lookup
+        self.assertContains(response, "City Band", count=2)
+        lookups = [
+            q for q in queries if 'FROM "library_loaningorganization"' in q["sql"]
+        ]
+        self.assertEqual(len(lookups), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PageCacheTest(TransactionTestCase):
+    """Tests for the generation-counter page cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.sousa = Composer.objects.create(
+            first_name="John Philip", last_name="Sousa"
+        )
+        self.piece = Piece.objects.create(title="El Capitan")
+        self.piece.composer.add(self.sousa)
+
+    def get(self, name, *args):
+        return self.client.get(reverse(name, args=args))
+
+    def test_hits_until_an_edit(self):
+        """Test that pages are served from cache until a shown model changes"""
+        self.assertEqual(self.get("piece_list")["X-Cache"], "MISS")
+        self.assertEqual(self.get("piece_list")["X-Cache"], "HIT")
+        Piece.objects.create(title="Semper Fidelis")
+        response = self.get("piece_list")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertContains(response, "Semper Fidelis")
+
+    def test_related_changes_invalidate(self):
+        """Test that renames and m2m changes retire dependent pages"""
+        self.get("piece_list")
+        self.get("piece_detail", self.piece.pk)
+        self.sousa.first_name = "J. P."
+        self.sousa.save()
+        self.assertContains(self.get("piece_list"), "Sousa, J. P.")
+        self.piece.composer.clear()
+        self.assertNotContains(self.get("piece_detail", self.piece.pk), "Sousa")
+        # Unrelated models leave the page cached.
+        get_user_model().objects.create_user(username="librarian")
+        self.assertEqual(self.get("piece_detail", self.piece.pk)["X-Cache"], "HIT")
+
+    def test_bulk_import_invalidates(self):
+        """Test that bulk writers bump the generation themselves"""
+        self.get("piece_list")
+        PieceImporter().run([{"title": "The Thunderer"}])
+        self.assertContains(self.get("piece_list"), "The Thunderer")
+
+    def test_not_stored_inside_a_transaction(self):
+        """Test that pages rendered from uncommitted rows are not cached"""
+        with transaction.atomic():
+            self.get("composer_list")
+            self.assertEqual(self.get("composer_list")["X-Cache"], "MISS")
+
+    def test_file_based_backend(self):
+        """Test that the cache works with the file-based backend"""
+        with tempfile.TemporaryDirectory() as location:
+            backend = "django.core.cache.backends.filebased.FileBasedCache"
+            with self.settings(
+                CACHES={"default": {"BACKEND": backend, "LOCATION": location}}
+            ):
+                self.assertEqual(self.get("genre_list")["X-Cache"], "MISS")
+                self.assertEqual(self.get("genre_list")["X-Cache"], "HIT")
+                Genre.objects.create(name="March")
+                response = self.get("genre_list")
+                self.assertEqual(response["X-Cache"], "MISS")
+                self.assertContains(response, "March")
+
+    def test_file_based_backend_is_shared_between_processes(self):
+        """Test that an edit in another worker retires this worker's pages"""
+        with tempfile.TemporaryDirectory() as location:
+            caches = {
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                }
+            }
+            with self.settings(CACHES=caches):
+                before = generations([Genre])
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "manage.py",
+                        "shell",
+                        "-c",
+                        "from django.test import override_settings; "
+                        "from core.cache import bump_generations; "
+                        "from library.models import Genre\n"
+                        f"with override_settings(CACHES={caches!r}):\n"
+                        "    bump_generations(Genre)",
+                    ],
+                    cwd=settings.BASE_DIR,
+                    check=True,
+                    capture_output=True,
+                )
+                self.assertNotEqual(generations([Genre]), before)
+
+    @override_settings(PAGE_CACHE_STATS_SAMPLE=1)
+    def test_stats_command(self):
+        """Test that page_cache_stats reports the hit rate per view"""
+        for _ in range(4):
+            self.get("composer_list")
+        out = StringIO()
+        call_command("page_cache_stats", reset=True, stdout=out)
+        self.assertRegex(out.getvalue(), r"ComposerListView +3 +1 +75.0%")
+        out = StringIO()
+        call_command("page_cache_stats", stdout=out)
+        self.assertRegex(out.getvalue(), r"ComposerListView +0 +0 +-")
+
+    def test_stats_are_sampled(self):
+        """Test that only sampled requests touch the counters, weighted by the rate"""
+        self.get("composer_list")
+        with mock.patch("core.cache.incr_counter") as incr, mock.patch(
+            "core.cache.random.randrange", side_effect=[1, 0]
+        ):
+            self.assertEqual(self.get("composer_list")["X-Cache"], "HIT")
+            incr.assert_not_called()
+            self.assertEqual(self.get("composer_list")["X-Cache"], "HIT")
+        incr.assert_called_once_with("page_cache:hits:ComposerListView", 100)
+
+
+class ConditionalGetTest(TestCase):
+    """Tests for ETags on detail pages"""
+
+    def setUp(self):
+        self.sousa = Composer.objects.create(
+            first_name="John Philip", last_name="Sousa"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.piece = Piece.objects.create(title="El Capitan")
+            self.piece.composer.add(self.sousa)
+        self.url = reverse("piece_detail", args=[self.piece.pk])
+
+    def test_revalidation_skips_rendering(self):
+        """Test that a matching validator gets a 304 from a single query"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_no_last_modified(self):
+        """Test that If-Modified-Since cannot get a stale page after a rename"""
+        response = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", response)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sousa.first_name = "J. P."
+            self.sousa.save()
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=http_date(time.time())
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Sousa, J. P.")
+
+    def test_edits_change_the_etag(self):
+        """Test that own and related edits both change the validators"""
+        etag = self.client.get(self.url)["ETag"]
+        self.piece.notes = "Worn parts"
+        self.piece.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sousa.first_name = "J. P."
+            self.sousa.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Sousa, J. P.")
+
+    def test_missing_object(self):
+        """Test that unknown pks still 404"""
+        response = self.client.get(reverse("piece_detail", args=[self.piece.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class SQLiteProfileTest(TestCase):
+    """Tests for the SQLite connection profile"""
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_connections(self):
+        """Test that every connection runs the configured pragmas"""
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("temp_store"), 2)  # MEMORY
+        self.assertEqual(self.pragma("cache_size"), -64 * 1024)
+        self.assertEqual(connection.settings_dict["CONN_MAX_AGE"], 600)
+
+    def test_file_database_uses_wal(self):
+        """Test that a database file is switched to WAL"""
+        options = connection.settings_dict["OPTIONS"]
+        with tempfile.TemporaryDirectory() as directory:
+            conn = sqlite_connect(os.path.join(directory, "test.sqlite3"), options)
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            conn.close()
+        self.assertEqual(mode, "wal")
+
+    def test_benchmark_command(self):
+        """Test that benchmark_sqlite_concurrency reports both profiles"""
+        out = StringIO()
+        call_command(
+            "benchmark_sqlite_concurrency",
+            seconds=0.2,
+            readers=1,
+            rows=100,
+            stdout=out,
+        )
+        self.assertIn("default", out.getvalue())
+        self.assertIn("configured", out.getvalue())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, WRITE_LOCK_STATS_SAMPLE=1)
+class WriteTransactionTest(TransactionTestCase):
+    """Tests for BEGIN IMMEDIATE write transactions with lock retries"""
+
+    def setUp(self):
+        cache.clear()
+        self.piece = Piece.objects.create(title="El Capitan")
+
+    def rename(self, title):
+        Piece.objects.filter(pk=self.piece.pk).update(title=title)
+        return title
+
+    def test_takes_the_write_lock_up_front(self):
+        """Test that write_atomic opens its transaction with BEGIN IMMEDIATE"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                write_atomic(self.rename, "Semper Fidelis"), "Semper Fidelis"
+            )
+        statements = [query["sql"] for query in queries]
+        self.assertIn("BEGIN IMMEDIATE", statements)
+        self.assertEqual(write_lock_stats()["transactions"], 1)
+
+    def test_views_write_in_immediate_transactions(self):
+        """Test that edit views save through write_atomic"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("genre_create"), {"name": "March", "notes": ""}
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("BEGIN IMMEDIATE", [query["sql"] for query in queries])
+
+    def test_edit_and_history_share_one_transaction(self):
+        """Test that an edit takes the write lock once, history included"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("piece_update", args=[self.piece.pk]),
+                {"title": "Semper Fidelis"},
+            )
+            statements = [query["sql"] for query in queries]
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(statements.count("BEGIN IMMEDIATE"), 1)
+        self.assertFalse([sql for sql in statements if sql.startswith("PRAGMA")])
+        history = next(
+            index
+            for index, sql in enumerate(statements)
+            if sql.startswith('INSERT INTO "library_piecehistory"')
+        )
+        self.assertLess(statements.index("BEGIN IMMEDIATE"), history)
+        self.assertLess(history, statements.index("COMMIT"))
+
+    def file_database(self, timeout):
+        """
+        A file database on the "locks" alias, whose write lock a second
+        connection (the returned sqlite3 one) can hold: the test database is
+        a shared in-memory one, where SQLite reports locks without waiting.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "locks.sqlite3")
+        wrapper = type(connections["default"])(
+            {
+                **connection.settings_dict,
+                "NAME": path,
+                "OPTIONS": {**connection.settings_dict["OPTIONS"], "timeout": timeout},
+            },
+            alias="locks",
+        )
+        connections["locks"] = wrapper
+        self.addCleanup(connections.__delitem__, "locks")
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute("CREATE TABLE edit (title TEXT)")
+        holder = sqlite_connect(path, {"timeout": 0, "init_command": ""})
+        self.addCleanup(holder.close)
+        return holder
+
+    def insert(self):
+        with connections["locks"].cursor() as cursor:
+            cursor.execute("INSERT INTO edit VALUES ('Semper Fidelis')")
+
+    def test_retries_while_locked(self):
+        """Test that a lock held by another connection is retried until it frees"""
+        holder = self.file_database(timeout=5)
+        holder.execute("BEGIN IMMEDIATE")
+        release = threading.Timer(0.5, holder.execute, ["COMMIT"])
+        release.start()
+        started = time.perf_counter()
+        write_atomic(self.insert, using="locks")
+        release.join()
+        self.assertGreater(time.perf_counter() - started, 0.4)
+        with connections["locks"].cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM edit")
+            self.assertEqual(cursor.fetchone(), (1,))
+        stats = write_lock_stats()
+        self.assertGreater(stats["retries"], 0)
+        self.assertEqual(stats["failures"], 0)
+
+    def test_gives_up_at_the_deadline(self):
+        """Test that a lock that never frees is retried until the timeout, then raises"""
+        holder = self.file_database(timeout=1)
+        holder.execute("BEGIN IMMEDIATE")
+        started = time.perf_counter()
+        with self.assertRaises(OperationalError):
+            write_atomic(self.insert, using="locks")
+        waited = time.perf_counter() - started
+        self.assertGreater(waited, 0.9)
+        self.assertLess(waited, 1.5)
+        stats = write_lock_stats()
+        self.assertGreater(stats["retries"], 1)
+        self.assertEqual(stats["failures"], 1)
+        holder.execute("ROLLBACK")
+        # The connection is back on its own busy timeout afterwards.
+        with connections["locks"].cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone(), (1000,))
+
+    @mock.patch("core.writes.time.sleep")
+    def test_other_errors_are_not_retried(self, sleep):
+        """Test that errors other than a busy lock raise at once"""
+        with mock.patch.object(
+            connection,
+            "_start_transaction_under_autocommit",
+            side_effect=OperationalError("disk I/O error"),
+        ):
+            with self.assertRaises(OperationalError):
+                write_atomic(self.rename, "Semper Fidelis")
+        sleep.assert_not_called()
+        self.assertEqual(write_lock_stats()["failures"], 1)
+
+    def test_concurrent_writer_waits_instead_of_failing(self):
+        """Test that a second writer queues behind one holding the lock"""
+        holding = threading.Event()
+
+        def hold_lock():
+            def slow_write():
+                self.rename("Semper Fidelis")
+                holding.set()
+                time.sleep(0.3)
+
+            try:
+                write_atomic(slow_write)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        holding.wait(5)
+        write_atomic(self.rename, "The Thunderer")
+        thread.join()
+        self.piece.refresh_from_db()
+        self.assertEqual(self.piece.title, "The Thunderer")
+        # It waited for the other transaction rather than failing.
+        self.assertEqual(write_lock_stats()["slow_waits"], 1)
+
+    def test_stats_are_recorded_after_the_lock_is_released(self):
+        """Test that the counters are sampled and bumped outside the transaction"""
+
+        def incr(key, delta=1, initial=None):
+            self.assertFalse(connection.in_atomic_block, key)
+
+        with mock.patch("core.writes.incr_counter", side_effect=incr) as counter:
+            write_atomic(self.rename, "Semper Fidelis")
+        self.assertTrue(counter.called)
+        with override_settings(WRITE_LOCK_STATS_SAMPLE=10), mock.patch(
+            "core.writes.random.randrange", return_value=1
+        ), mock.patch("core.writes.incr_counter") as counter:
+            write_atomic(self.rename, "The Thunderer")
+        counter.assert_not_called()
+
+    def test_stats_command(self):
+        """Test that write_lock_stats reports and resets the counters"""
+        write_atomic(self.rename, "Semper Fidelis")
+        out = StringIO()
+        call_command("write_lock_stats", reset=True, stdout=out)
+        self.assertIn("Write transactions: 1", out.getvalue())
+        self.assertEqual(write_lock_stats()["transactions"], 0)
+
+
+class QueryBudgetTest(QueryBudgetAssertionsMixin, TestCase):
+    """Tests for the query budget middleware and the library's budgets"""
+
+    def setUp(self):
+        self.composer = Composer.objects.create(first_name="Gustav", last_name="Holst")
+        self.arranger = Arranger.objects.create(first_name="Keith", last_name="Brion")
+        self.genre = Genre.objects.create(name="Suite")
+        publisher = Publisher.objects.create(name="Boosey")
+        organization = RentalOrganization.objects.create(name="Band Library")
+        self.pieces = [
+            make_piece(
+                f"Suite {i:02d}",
+                self.composer,
+                self.arranger,
+                self.genre,
+                publisher,
+                organization,
+            )
+            for i in range(12)
+        ]
+
+    def test_library_urls_within_budget(self):
+        """Test that every library URL stays within its query budget"""
+        piece = {"pk": self.pieces[0].pk}
+        self.assertQueryBudgets(
+            urlpatterns,
+            {
+                "genre_detail": {"pk": self.genre.pk},
+                "genre_update": {"pk": self.genre.pk},
+                "genre_delete": {"pk": self.genre.pk},
+                "composer_detail": {"pk": self.composer.pk},
+                "composer_update": {"pk": self.composer.pk},
+                "composer_delete": {"pk": self.composer.pk},
+                "arranger_detail": {"pk": self.arranger.pk},
+                "arranger_update": {"pk": self.arranger.pk},
+                "arranger_delete": {"pk": self.arranger.pk},
+                "piece_detail": piece,
+                "piece_history": piece,
+                "piece_update": piece,
+                "piece_delete": piece,
+            },
+            {
+                "genre_create": {"name": "March"},
+                "genre_update": {"name": "Suites"},
+                "composer_create": {"first_name": "John", "last_name": "Williams"},
+                "composer_update": {"first_name": "Gustav", "last_name": "Holst"},
+                "piece_create": {
+                    "title": "Suite 12",
+                    "composer": [self.composer.pk],
+                    "arranger": [self.arranger.pk],
+                    "genre": [self.genre.pk],
+                },
+                "piece_update": {
+                    "title": "Suite 00",
+                    "composer": [self.composer.pk],
+                    "genre": [self.genre.pk],
+                },
+            },
+        )
+
+    @override_settings(QUERY_BUDGETS={"piece_list": 1})
+    def test_over_budget_logged(self):
+        """Test that a view over budget is logged with its repeated queries"""
+        with self.assertLogs("core.queries", "WARNING") as logs:
+            self.client.get(reverse("piece_list"))
+        self.assertIn("(piece_list) ran", logs.output[0])
+        self.assertIn("budget 1 queries", logs.output[0])
+
+    def test_writes_have_their_own_budget(self):
+        """Test that POSTs are checked against the write budgets instead"""
+        with self.assertNoLogs("core.queries", "WARNING"):
+            self.client.post(reverse("genre_create"), {"name": "March"})
+        with override_settings(WRITE_QUERY_BUDGETS={"genre_create": 1}):
+            with self.assertLogs("core.queries", "WARNING") as logs:
+                self.client.post(reverse("genre_create"), {"name": "Waltz"})
+        self.assertIn("POST /library/genres/create/", logs.output[0])
+        self.assertIn("budget 1 queries", logs.output[0])
+
+    def test_duplicates_recorded(self):
+        """Test that a query repeated per row is reported as a duplicate"""
+        recorder = QueryRecorder()
+        with recorder.recording():
+            for piece in Piece.objects.all():
+                list(piece.composer.all())
+        self.assertEqual(recorder.count, 13)
+        [(sql, times)] = recorder.duplicates()
+        self.assertEqual(times, 12)
+        self.assertIn("library_composer", sql)
+
+
+class SeedBenchmarkDataTest(TestCase):
+    """Tests for the synthetic data generator and benchmark runner"""
+
+    COUNTS = [
+        "--pieces=300",
+        "--concerts=40",
+        "--composers=60",
+        "--arrangers=20",
+        "--conductors=5",
+        "--guests=10",
+        "--venues=4",
+        "--organizations=3",
+    ]
+
+    def seed(self, *args):
+        call_command("seed_benchmark_data", *self.COUNTS, *args, stdout=StringIO())
+
+    def snapshot(self):
+        return (
+            list(
+                Piece.objects.order_by("pk").values_list(
+                    "pk", "title", "composers_text", "genres_text", "status"
+                )
+            ),
+            list(
+                Concert.objects.order_by("pk").values_list(
+                    "name", "date", "conductors_text", "guests_text"
+                )
+            ),
+        )
+
+    def test_seed_catalog(self):
+        """Test that seeding creates consistent pieces, links, credits and search rows"""
+        self.seed("--batch-size=100")
+        self.assertEqual(Piece.objects.count(), 300)
+        self.assertEqual(Concert.objects.count(), 40)
+        self.assertEqual(Composer.objects.count(), 60)
+        piece = Piece.objects.exclude(arrangers_text="").first()
+        self.assertEqual(piece.composers_text, piece.get_composers_display())
+        self.assertEqual(piece.arrangers_text, piece.get_arrangers_display())
+        self.assertEqual(piece.genres_text, piece.get_genres_display())
+        self.assertEqual(
+            piece.location_sort_key,
+            Piece.objects.get(pk=piece.pk).location_sort_key,
+        )
+        concert = Concert.objects.first()
+        self.assertEqual(concert.conductors_text, concert.get_conductors_display())
+        self.assertGreaterEqual(concert.program.count(), 3)
+        self.assertFalse(concert.program.exclude(concert_date=concert.date).exists())
+        self.assertIn(piece.pk, search.search(piece.title, limit=300))
+        for piece in Piece.objects.filter(status=PieceStatus.RENTED):
+            piece.full_clean()
+
+    def test_seed_is_deterministic(self):
+        """Test that the same seed produces the same rows and another seed does not"""
+        snapshots = []
+        for seed in ("--seed=1", "--seed=1", "--seed=2"):
+            with transaction.atomic():
+                self.seed(seed)
+                snapshots.append(self.snapshot())
+                transaction.set_rollback(True)
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertNotEqual(snapshots[0], snapshots[2])
+
+    def test_seed_refuses_existing_catalog(self):
+        """Test that seeding a database that already has pieces fails"""
+        Piece.objects.create(title="Existing")
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_run_benchmarks(self):
+        """Test that the benchmark runner writes JSON results and compares runs"""
+        self.seed()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            call_command("run_benchmarks", iterations=1, output=path, stdout=StringIO())
+            with open(path) as f:
+                report = json.load(f)
+            self.assertEqual(report["rows"]["pieces"], 300)
+            self.assertEqual(set(report["results"]), set(benchmarks.benchmarks()))
+            self.assertGreater(report["results"]["piece_detail"]["queries"], 0)
+            out = StringIO()
+            call_command(
+                "run_benchmarks",
+                iterations=1,
+                only=["piece_detail"],
+                compare=path,
+                stdout=out,
+            )
+        self.assertIn("before", out.getvalue())
+
+
+# The live server's threads share the in-memory test database connection,
+# so the query budget middleware would count every thread's queries.
+@override_settings(CACHES=LOCMEM_CACHES, QUERY_BUDGET=10000)
+class LoadTestCommandTest(LiveServerTestCase):
+    """Tests for the HTTP load-test harness"""
+
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create_user(username="reader", password="secret-pass")
+        self.genre = Genre.objects.create(name="March")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_scenario(self, spec):
+        path = os.path.join(self.directory.name, "scenario.json")
+        with open(path, "w") as f:
+            json.dump(spec, f)
+        return path
+
+    def test_load_test_run(self):
+        """Test that readers and writers log in, replay steps and report JSON"""
+        scenario = self.write_scenario(
+            {
+                "users": {"readers": 3, "writers": 1},
+                "readers": [
+                    {"url": "genre_list", "weight": 2},
+                    {"url": "genre_detail", "pk": "library.Genre"},
+                    {"url": "piece_search", "params": {"q": ["march", "suite"]}},
+                ],
+                "writers": [
+                    {
+                        "url": "genre_create",
+                        "method": "POST",
+                        "form": {"name": "Load Test Genre {n}"},
+                    }
+                ],
+            }
+        )
+        output = os.path.join(self.directory.name, "results.json")
+        call_command(
+            "load_test",
+            scenario=scenario,
+            url=self.live_server_url,
+            shared_database=True,
+            seconds=1,
+            username="reader",
+            password="secret-pass",
+            output=output,
+            stdout=StringIO(),
+        )
+        with open(output) as f:
+            results = json.load(f)
+        self.assertGreater(results["total"]["requests"], 0)
+        self.assertEqual(results["total"]["errors"], 0)
+        self.assertEqual(
+            set(results["steps"]),
+            {"genre_list", "genre_detail", "piece_search", "genre_create"},
+        )
+        created = results["steps"]["genre_create"]["requests"]
+        self.assertEqual(
+            Genre.objects.filter(name__startswith="Load Test Genre").count(), created
+        )
+        self.assertEqual(
+            sum(results["total"]["histogram_ms"].values()),
+            results["total"]["requests"],
+        )
+
+    def test_unknown_url_rejected(self):
+        """Test that a scenario naming an unknown URL fails before the run"""
+        scenario = self.write_scenario(
+            {"users": {"readers": 1}, "readers": [{"url": "no_such_page"}]}
+        )
+        with self.assertRaisesMessage(CommandError, "no_such_page"):
+            call_command(
+                "load_test", scenario=scenario, url=self.live_server_url, seconds=1
+            )
+
+    def test_url_samples_need_a_shared_database(self):
+        """Test that --url with detail page steps needs --shared-database"""
+        scenario = self.write_scenario(
+            {
+                "users": {"readers": 1},
+                "readers": [{"url": "genre_detail", "pk": "library.Genre"}],
+            }
+        )
+        with self.assertRaisesMessage(CommandError, "--shared-database"):
+            call_command(
+                "load_test",
+                scenario=scenario,
+                url=self.live_server_url,
+                seconds=0.2,
+                username="reader",
+                password="secret-pass",
+            )
+
+    def test_writers_need_a_url_or_allow_writes(self):
+        """Test that writers are not run against the settings database by default"""
+        scenario = self.write_scenario(
+            {
+                "users": {"readers": 1, "writers": 1},
+                "readers": [{"url": "genre_list"}],
+                "writers": [{"url": "genre_create", "method": "POST", "form": {}}],
+            }
+        )
+        with self.assertRaisesMessage(CommandError, "--allow-writes"):
+            call_command("load_test", scenario=scenario, seconds=1)
+
+    def test_default_user_gets_a_new_password_each_run(self):
+        """Test that runs without --url reset the default user's password, unprinted"""
+        passwords = []
+        for _ in range(2):
+            out = StringIO()
+            _, username, password = LoadTestCommand(stdout=out).credentials(
+                "loadtest", None, None
+            )
+            self.assertEqual(username, "loadtest")
+            self.assertTrue(
+                get_user_model()
+                .objects.get(username="loadtest")
+                .check_password(password)
+            )
+            self.assertNotIn(password, out.getvalue())
+            passwords.append(password)
+        self.assertNotEqual(passwords[0], passwords[1])
+        with self.assertRaisesMessage(CommandError, "--password of reader"):
+            LoadTestCommand().credentials("reader", None, None)
+
+    def test_url_needs_a_password(self):
+        """Test that --url never provisions a local user and needs --password"""
+        scenario = self.write_scenario(
+            {"users": {"readers": 1}, "readers": [{"url": "genre_list"}]}
+        )
+        with self.assertRaisesMessage(CommandError, "--password of loadtest"):
+            call_command(
+                "load_test", scenario=scenario, url=self.live_server_url, seconds=0.2
+            )
+        self.assertFalse(get_user_model().objects.filter(username="loadtest").exists())
+
+    def test_latency_summary(self):
+        """Test percentiles, throughput and histogram buckets of a latency list"""
+        summary = latency_summary([float(ms) for ms in range(1, 101)], 2, 10.0)
+        self.assertEqual(summary["requests"], 100)
+        self.assertEqual(summary["rps"], 10.0)
+        self.assertEqual(summary["p50_ms"], 51.0)
+        self.assertEqual(summary["p99_ms"], 100.0)
+        self.assertEqual(summary["histogram_ms"]["<=100"], 50)
+        self.assertEqual(summary["histogram_ms"][">5000"], 0)
+
+
+class ServerTimingTest(TestCase):
+    """Tests for the Server-Timing header and request timing log"""
+
+    def setUp(self):
+        self.piece = Piece.objects.create(title="First Suite")
+        self.url = reverse("piece_detail", args=[self.piece.pk])
+
+    def login(self, is_staff):
+        get_user_model().objects.create_user(
+            username="librarian", password="secret-pass", is_staff=is_staff
+        )
+        return self.client.post(
+            reverse("login"), {"username": "librarian", "password": "secret-pass"}
+        )
+
+    @override_settings(SERVER_TIMING="all")
+    def test_header_phases(self):
+        """Test that the header has the middleware, view, template and db phases"""
+        response = self.client.get(self.url)
+        metrics = dict(
+            metric.split(";", 1)[0:2]
+            for metric in response["Server-Timing"].split(", ")
+        )
+        self.assertEqual(
+            set(metrics), {"total", "middleware", "view", "template", "db"}
+        )
+        self.assertRegex(metrics["db"], r'^dur=[\d.]+;desc="\d+ queries"$')
+        durations = {
+            name: float(value.split(";")[0][len("dur=") :])
+            for name, value in metrics.items()
+        }
+        self.assertGreater(durations["template"], 0)
+        self.assertAlmostEqual(
+            durations["total"],
+            durations["middleware"] + durations["view"] + durations["template"],
+            delta=0.05,
+        )
+
+    @override_settings(SERVER_TIMING="staff")
+    def test_header_for_staff_only(self):
+        """Test that only users marked staff at login get the header"""
+        self.assertNotIn("Server-Timing", self.client.get(self.url))
+        response = self.login(is_staff=True)
+        self.assertIn(STAFF_COOKIE, response.cookies)
+        self.assertIn("Server-Timing", self.client.get(self.url))
+        self.client.cookies[STAFF_COOKIE] = "forged"
+        self.assertNotIn("Server-Timing", self.client.get(self.url))
+
+    @override_settings(SERVER_TIMING="staff")
+    def test_marker_bound_to_the_session(self):
+        """Test that the marker stops working after logout or in another session"""
+        self.login(is_staff=True)
+        marker = self.client.cookies[STAFF_COOKIE].value
+        self.client.post(reverse("logout"))
+        self.client.cookies[STAFF_COOKIE] = marker
+        self.assertNotIn("Server-Timing", self.client.get(self.url))
+
+        get_user_model().objects.create_user(username="reader", password="reader-pass")
+        other = Client()
+        other.post(reverse("login"), {"username": "reader", "password": "reader-pass"})
+        other.cookies[STAFF_COOKIE] = marker
+        self.assertNotIn("Server-Timing", other.get(self.url))
+
+    @override_settings(SERVER_TIMING="staff")
+    def test_no_header_for_other_users(self):
+        """Test that a non-staff login sets no marker and gets no header"""
+        response = self.login(is_staff=False)
+        self.assertNotIn(STAFF_COOKIE, response.cookies)
+        self.assertNotIn("Server-Timing", self.client.get(self.url))
+
+    def test_timing_logged(self):
+        """Test that each request logs its phases as one JSON object"""
+        with self.assertLogs("core.timing", "INFO") as logs:
+            self.client.get(self.url)
+        fields = json.loads(logs.records[0].getMessage())
+        self.assertEqual(fields["view"], "piece_detail")
+        self.assertEqual(fields["status"], 200)
+        self.assertGreater(fields["db_queries"], 0)
+        self.assertEqual(logs.records[0].timing, fields)
+
+
+class ProfilerTest(TestCase):
+    """Tests for on-demand request profiling"""
+
+    def setUp(self):
+        self.piece = Piece.objects.create(title="First Suite")
+        self.piece.composer.add(Composer.objects.create(last_name="Holst"))
+        self.user = get_user_model().objects.create_user(
+            username="librarian", password="secret-pass", is_staff=True
+        )
+
+    def test_not_profiled_for_other_users(self):
+        """Test that anonymous and non-staff requests are never profiled"""
+        url = reverse("piece_detail", args=[self.piece.pk]) + "?profile=1"
+        self.assertNotIn(PROFILE_HEADER, self.client.get(url))
+        get_user_model().objects.create_user(username="player", password="pw")
+        self.client.login(username="player", password="pw")
+        self.assertNotIn(PROFILE_HEADER, self.client.get(url))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_profile_stored(self):
+        """Test that ?profile=1 stores the call stats and queries with origins"""
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("piece_update", args=[self.piece.pk]) + "?profile=1"
+        )
+        profile = RequestProfile.objects.get()
+        self.assertEqual(
+            response[PROFILE_HEADER],
+            reverse("admin:library_requestprofile_change", args=[profile.pk]),
+        )
+        self.assertEqual(profile.view_name, "piece_update")
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.query_count, len(profile.queries))
+        self.assertIn("edit.py:200(get)", top_functions(profile.stats))
+        origins = [query["origin"] for query in profile.queries]
+        self.assertTrue(all(origins))
+        self.assertIn("SingleObjectMixin.get_object", origins[0])
+        self.assertTrue(any(o.startswith("library/forms.py:") for o in origins))
+
+    def test_header_trigger_and_template_origin(self):
+        """Test that the X-Profile header profiles and template queries name their line"""
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("piece_detail", args=[self.piece.pk]),
+            headers={PROFILE_HEADER: "1"},
+        )
+        self.assertIn(PROFILE_HEADER, response)
+        origins = [query["origin"] for query in RequestProfile.objects.get().queries]
+        self.assertIn("library/views.py:", origins[1])
+        self.assertTrue(
+            any(
+                "in Piece.get_composers_display (piece/piece_detail.html:" in origin
+                for origin in origins
+            )
+        )
+
+    def test_admin_pages(self):
+        """Test that the admin shows a profile and downloads its pstats file"""
+        self.client.force_login(self.user)
+        self.user.is_superuser = True
+        self.user.save()
+        path = self.client.get(reverse("piece_list") + "?profile=1")[PROFILE_HEADER]
+        response = self.client.get(path)
+        self.assertContains(response, "cumulative")
+        profile = RequestProfile.objects.get()
+        response = self.client.get(
+            reverse("admin:library_requestprofile_download", args=[profile.pk])
+        )
+        self.assertEqual(response.content, profile.stats)
+        self.assertIn(".prof", response["Content-Disposition"])
+
+    def test_old_profiles_pruned(self):
+        """Test that only the newest KEEP_PROFILES profiles are kept"""
+        RequestProfile.objects.bulk_create(
+            RequestProfile(
+                method="GET",
+                path="/",
+                status_code=200,
+                duration_ms=1,
+                query_count=0,
+                query_ms=0,
+                stats=b"",
+            )
+            for _ in range(KEEP_PROFILES)
+        )
+        oldest = RequestProfile.objects.order_by("created_at", "pk").first()
+        self.client.force_login(self.user)
+        self.client.get(reverse("piece_list") + "?profile=1")
+        self.assertEqual(RequestProfile.objects.count(), KEEP_PROFILES)
+        self.assertFalse(RequestProfile.objects.filter(pk=oldest.pk).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SlowQueryLogTest(TestCase):
+    """Tests for the slow query log and its report"""
+
+    def setUp(self):
+        cache.clear()
+        self.composer = Composer.objects.create(last_name="Holst")
+        self.url = reverse("composer_detail", args=[self.composer.pk])
+
+    def test_normalize_sql(self):
+        """Test that literals, placeholders and list lengths share a fingerprint"""
+        self.assertEqual(
+            normalize_sql(
+                "SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s)\n  LIMIT 21"
+            ),
+            normalize_sql("SELECT * FROM t WHERE a = 'it''s' AND b IN (%s) LIMIT 5"),
+        )
+        self.assertEqual(
+            normalize_sql("INSERT INTO t VALUES (%s, %s), (%s, %s)"),
+            "INSERT INTO t VALUES (...)",
+        )
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_aggregated(self):
+        """Test that repeated slow queries add to one row with its view and plan"""
+        with mock.patch(
+            "library.slowqueries.write_atomic", side_effect=write_atomic
+        ) as write:
+            self.client.get(self.url)
+        write.assert_called_once()
+        count = SlowQuery.objects.count()
+        self.assertGreater(count, 1)
+        with mock.patch("library.slowqueries.explain") as explain:
+            self.client.get(self.url)
+        explain.assert_not_called()
+        self.assertEqual(SlowQuery.objects.count(), count)
+        query = SlowQuery.objects.filter(sql__contains='FROM "library_composer"')[0]
+        self.assertEqual(query.count, 2)
+        self.assertEqual(query.views, {"composer_detail": 2})
+        self.assertEqual(len(query.durations), 2)
+        self.assertIn("library_composer", query.plan)
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        """Test that SLOW_QUERY_MS or SLOW_QUERY_HANDLER = None logs nothing"""
+        self.client.get(self.url)
+        with override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_HANDLER=None):
+            self.client.get(self.url)
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_transaction_control_not_kept(self):
+        """Test that BEGIN, savepoints, COMMIT and pragmas are never slow queries"""
+        recorder = QueryRecorder(slow_ms=0)
+        with recorder.recording():
+            write_atomic(
+                Composer.objects.filter(pk=self.composer.pk).update, birth_year=1874
+            )
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA busy_timeout")
+        self.assertGreater(recorder.count, 2)
+        self.assertEqual([sql.split()[0] for _, sql, *_ in recorder.slow], ["UPDATE"])
+
+    def test_full_scans(self):
+        """Test that only table scans without an index are flagged"""
+        plan = (
+            "SCAN library_piece\n"
+            "  SCAN library_composer USING INDEX library_com_last_na_idx\n"
+            "SEARCH library_genre USING INTEGER PRIMARY KEY (rowid=?)\n"
+            "SCAN CONSTANT ROW"
+        )
+        self.assertEqual(full_scans(plan), ["library_piece"])
+
+    def test_report(self):
+        """Test that the command reports views, full scans and plans, and resets"""
+        SlowQuery.objects.create(
+            fingerprint="a" * 40,
+            sql='SELECT * FROM "library_piece" ORDER BY "title"',
+            plan="SCAN library_piece\nUSE TEMP B-TREE FOR ORDER BY",
+            count=3,
+            total_ms=600,
+            max_ms=300,
+            durations=[100, 200, 300],
+            views={"piece_list": 3},
+        )
+        out = StringIO()
+        call_command("slow_queries", "--plans", "--reset", stdout=out)
+        output = out.getvalue()
+        self.assertIn("count 3  p50 200.0 ms  max 300.0 ms", output)
+        self.assertIn("views: piece_list (3)", output)
+        self.assertIn("full scan: library_piece", output)
+        self.assertIn("USE TEMP B-TREE FOR ORDER BY", output)
+        self.assertFalse(SlowQuery.objects.exists())
@@ -17,6 +17,25 @@ from .views import (
     ArrangerCreateView,
     ArrangerUpdateView,
     ArrangerDeleteView,
+    PieceListView,
+    PieceSearchView,
+    PieceDueView,
+    PieceHistoryView,
+    ShelfListView,
+    ShelfDrawerView,
+    PieceExportView,
+    PieceDetailView,
+    PieceCreateView,
+    PieceUpdateView,
+    PieceDeleteView,
+    ComposerAutocompleteView,
+    ArrangerAutocompleteView,
+    GenreAutocompleteView,
+    PublisherAutocompleteView,
+    RentalOrganizationAutocompleteView,
+    LoaningOrganizationAutocompleteView,
+    BorrowingOrganizationAutocompleteView,
+    PieceAutocompleteView,
 )
 
 urlpatterns = [
@@ -54,4 +73,57 @@ urlpatterns = [
         ArrangerDeleteView.as_view(),
         name="arranger_delete",
     ),
+    # Piece URLs
+    path("pieces/", PieceListView.as_view(), name="piece_list"),
+    path("pieces/search/", PieceSearchView.as_view(), name="piece_search"),
+    path("pieces/export/", PieceExportView.as_view(), name="piece_export"),
+    path("pieces/due/", PieceDueView.as_view(), name="piece_due"),
+    path("pieces/shelves/", ShelfListView.as_view(), name="shelf_list"),
+    path("pieces/shelves/drawer/", ShelfDrawerView.as_view(), name="shelf_drawer"),
+    path("pieces/<int:pk>/", PieceDetailView.as_view(), name="piece_detail"),
+    path("pieces/<int:pk>/history/", PieceHistoryView.as_view(), name="piece_history"),
+    path("pieces/create/", PieceCreateView.as_view(), name="piece_create"),
+    path("pieces/<int:pk>/update/", PieceUpdateView.as_view(), name="piece_update"),
+    path("pieces/<int:pk>/delete/", PieceDeleteView.as_view(), name="piece_delete"),
+    # Autocomplete endpoints
+    path(
+        "autocomplete/composers/",
+        ComposerAutocompleteView.as_view(),
+        name="composer_autocomplete",
+    ),
+    path(
+        "autocomplete/arrangers/",
+        ArrangerAutocompleteView.as_view(),
+        name="arranger_autocomplete",
+    ),
+    path(
+        "autocomplete/genres/",
+        GenreAutocompleteView.as_view(),
+        name="genre_autocomplete",
+    ),
+    path(
+        "autocomplete/publishers/",
+        PublisherAutocompleteView.as_view(),
+        name="publisher_autocomplete",
+    ),
+    path(
+        "autocomplete/rental-organizations/",
+        RentalOrganizationAutocompleteView.as_view(),
+        name="rental_organization_autocomplete",
+    ),
+    path(
+        "autocomplete/loaning-organizations/",
+        LoaningOrganizationAutocompleteView.as_view(),
+        name="loaning_organization_autocomplete",
+    ),
+    path(
+        "autocomplete/borrowing-organizations/",
+        BorrowingOrganizationAutocompleteView.as_view(),
+        name="borrowing_organization_autocomplete",
+    ),
+    path(
+        "autocomplete/pieces/",
+        PieceAutocompleteView.as_view(),
+        name="piece_autocomplete",
+    ),
 ]
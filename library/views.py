@@ -1,17 +1,48 @@
 # library/views.py
 # PersonBase views are in core/views.py
 
+import datetime
+
 from core.forms import ComposerForm, ArrangerForm
 from django.views.generic import (
+    TemplateView,
+    View,
     CreateView,
     ListView,
     DetailView,
     UpdateView,
     DeleteView,
 )
-from .models import Composer, Arranger, Genre, Piece
+from django.utils import timezone
+from .models import (
+    Arranger,
+    BorrowingOrganization,
+    Composer,
+    Genre,
+    LoaningOrganization,
+    Piece,
+    Publisher,
+    RentalOrganization,
+)
 from .forms import GenreForm, PieceForm
+from . import search
+from .due import DEFAULT_DAYS_AHEAD, due_items
+from .facets import PieceFacets
+from .shelves import drawer_counts
+from .exports import PIECE_EXPORT_HEADER, piece_export_rows
+from concerts.models import Concert, ConcertProgramItem, Guest, Venue
+from core.autocomplete import (
+    AutocompleteView,
+    NameAutocompleteView,
+    PersonAutocompleteView,
+)
+from core.cache import CachedPageMixin
+from core.writes import WriteTransactionMixin
+from core.history import display_values, state_as_of
+from core.exports import ExportViewMixin
 from core.views import (
+    ConditionalGetMixin,
+    KeysetPaginationMixin,
     PersonBaseDetailView,
     PersonBaseListView,
     PersonBaseCreateView,
@@ -100,61 +131,273 @@ class ArrangerDeleteView(PersonBaseDeleteView):
     success_url = reverse_lazy("arranger_list")
 
 
-class GenreListView(ListView):
+class GenreListView(CachedPageMixin, ListView):
     model = Genre
     template_name = "genre/genre_list.html"
     context_object_name = "genres"
 
 
-class GenreDetailView(DetailView):
+class GenreDetailView(ConditionalGetMixin, CachedPageMixin, DetailView):
     model = Genre
     template_name = "genre/genre_detail.html"
 
 
-class GenreCreateView(CreateView):
+class GenreCreateView(WriteTransactionMixin, CreateView):
     model = Genre
     form_class = GenreForm
     template_name = "genre/genre_form.html"
     success_url = reverse_lazy("genre_list")
 
 
-class GenreUpdateView(UpdateView):
+class GenreUpdateView(WriteTransactionMixin, UpdateView):
     model = Genre
     form_class = GenreForm
     template_name = "genre/genre_form.html"
 
 
-class GenreDeleteView(DeleteView):
+class GenreDeleteView(WriteTransactionMixin, DeleteView):
     model = Genre
     template_name = "genre/genre_confirm_delete.html"
     success_url = reverse_lazy("genre_list")
 
 
-class PieceListView(ListView):
+# Models whose names appear on the piece list and detail pages.
+PIECE_PAGE_MODELS = [
+    Composer,
+    Arranger,
+    Genre,
+    Publisher,
+    RentalOrganization,
+    LoaningOrganization,
+    BorrowingOrganization,
+]
+
+
+class PieceListView(CachedPageMixin, KeysetPaginationMixin, ListView):
     model = Piece
+    cache_models = PIECE_PAGE_MODELS
     template_name = "piece/piece_list.html"
     context_object_name = "pieces"
+    paginate_by = 20
+
+    def get_facets(self):
+        if not hasattr(self, "_facets"):
+            self._facets = PieceFacets(self.request.GET)
+        return self._facets
+
+    def get_queryset(self):
+        # Credits are cached on the row and the publisher and organizations
+        # are joined, so each row renders without extra queries.
+        return self.get_facets().filter(Piece.objects.for_catalog())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["facets"] = self.get_facets().counts()
+        return context
+
+
+class PieceSearchView(ListView):
+    model = Piece
+    template_name = "piece/piece_search.html"
+    context_object_name = "pieces"
+    paginate_by = 20
+
+    def get_search_query(self):
+        return self.request.GET.get("q", "").strip()
+
+    def get_queryset(self):
+        # Paginated in the index, in BM25 order.
+        return search.SearchResults(
+            self.get_search_query(), Piece.objects.for_catalog()
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.get_search_query()
+        return context
 
 
-class PieceDetailView(DetailView):
+class PieceDueView(TemplateView):
+    template_name = "piece/piece_due.html"
+
+    def get_days_ahead(self):
+        days = self.request.GET.get("days", "")
+        return min(int(days), 365) if days.isdigit() else DEFAULT_DAYS_AHEAD
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["days_ahead"] = self.get_days_ahead()
+        context["categories"] = due_items(days_ahead=context["days_ahead"])
+        return context
+
+
+class ShelfListView(TemplateView):
+    template_name = "piece/shelf_list.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["drawers"] = drawer_counts(Piece.objects.all())
+        return context
+
+
+class ShelfDrawerView(KeysetPaginationMixin, ListView):
+    """The pieces in one drawer (?drawer=...), in natural shelf order."""
+
     model = Piece
+    template_name = "piece/shelf_drawer.html"
+    context_object_name = "pieces"
+    paginate_by = 50
+    ordering = ["location_sort_key"]
+
+    def get_drawer(self):
+        return self.request.GET.get("drawer", "")
+
+    def get_queryset(self):
+        return Piece.objects.for_catalog().filter(location_drawer=self.get_drawer())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["drawer"] = self.get_drawer()
+        return context
+
+
+class PieceExportView(ExportViewMixin, View):
+    export_filename = "pieces"
+
+    def get_export_header(self):
+        return PIECE_EXPORT_HEADER
+
+    def get_export_rows(self):
+        return piece_export_rows()
+
+
+class PieceDetailView(ConditionalGetMixin, CachedPageMixin, DetailView):
+    model = Piece
+    cache_models = [*PIECE_PAGE_MODELS, ConcertProgramItem, Concert, Venue, Guest]
     template_name = "piece/piece_detail.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Latest first, so the first is when the piece was last performed.
+        context["performances"] = list(
+            ConcertProgramItem.objects.performances(self.object).select_related(
+                "concert__venue", "soloist"
+            )
+        )
+        return context
+
+
+class PieceHistoryView(DetailView):
+    """A piece's recorded changes, and its state as of ?as_of=YYYY-MM-DD."""
 
-class PieceCreateView(CreateView):
+    model = Piece
+    template_name = "piece/piece_history.html"
+
+    def get_as_of(self):
+        try:
+            return datetime.date.fromisoformat(self.request.GET.get("as_of", ""))
+        except ValueError:
+            return None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        label = {
+            field.name: field.verbose_name
+            for field in [*Piece._meta.concrete_fields, *Piece._meta.many_to_many]
+        }
+        entries = list(
+            self.object.history.select_related("user").order_by("-changed_at", "-pk")
+        )
+        context["as_of"] = as_of = self.get_as_of()
+        state = None
+        if as_of is not None:
+            when = timezone.make_aware(
+                datetime.datetime.combine(as_of, datetime.time.max)
+            )
+            state = state_as_of(Piece, self.object.pk, when)
+        # Resolve every recorded value, and the state's, in one pass (one
+        # query per related model), then hand the texts out in order.
+        values = [
+            (name, value)
+            for entry in entries
+            for name, pair in entry.changes.items()
+            for value in pair
+        ]
+        texts = iter(display_values(Piece, [*values, *(state or {}).items()]))
+        context["entries"] = [
+            (entry, [(label[name], next(texts), next(texts)) for name in entry.changes])
+            for entry in entries
+        ]
+        if state is not None:
+            context["state"] = [(label[name], next(texts)) for name in state]
+        return context
+
+
+class PieceCreateView(WriteTransactionMixin, CreateView):
     model = Piece
     form_class = PieceForm
     template_name = "piece/piece_form.html"
     success_url = reverse_lazy("piece_list")
 
 
-class PieceUpdateView(UpdateView):
+class PieceUpdateView(WriteTransactionMixin, UpdateView):
     model = Piece
     form_class = PieceForm
     template_name = "piece/piece_form.html"
 
 
-class PieceDeleteView(DeleteView):
+class PieceDeleteView(WriteTransactionMixin, DeleteView):
     model = Piece
     template_name = "piece/piece_confirm_delete.html"
     success_url = reverse_lazy("piece_list")
+
+
+# Autocomplete endpoints for the PieceForm pickers (see core/widgets.py)
+class ComposerAutocompleteView(PersonAutocompleteView):
+    model = Composer
+
+
+class ArrangerAutocompleteView(PersonAutocompleteView):
+    model = Arranger
+
+
+class GenreAutocompleteView(NameAutocompleteView):
+    model = Genre
+
+
+class PublisherAutocompleteView(NameAutocompleteView):
+    model = Publisher
+
+
+class RentalOrganizationAutocompleteView(NameAutocompleteView):
+    model = RentalOrganization
+
+
+class LoaningOrganizationAutocompleteView(NameAutocompleteView):
+    model = LoaningOrganization
+
+
+class BorrowingOrganizationAutocompleteView(NameAutocompleteView):
+    model = BorrowingOrganization
+
+
+class PieceAutocompleteView(AutocompleteView):
+    """
+    For the concert program editor: pieces matching the full-text index
+    (library/search.py), best match first, or all pieces by title.
+    """
+
+    model = Piece
+
+    def get_queryset(self, term):
+        pieces = Piece.objects.only("title", "composers_text")
+        if not term:
+            return pieces.order_by("title", "pk")
+        ids = search.search(term)
+        found = pieces.in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
+
+    def get_label(self, piece):
+        if piece.composers_text:
+            return f"{piece.title} ({piece.composers_text})"
+        return piece.title
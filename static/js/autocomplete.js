@@ -0,0 +1,68 @@
+// static/js/autocomplete.js
+// Type-ahead for <select data-autocomplete-url> (see core/widgets.py).
+// The server renders only the selected options; this adds a search box that
+// fetches matches from the JSON endpoint and swaps in the unselected ones.
+(function () {
+  "use strict";
+
+  function setup(select) {
+    var url = select.dataset.autocompleteUrl;
+    var search = document.createElement("input");
+    var more = document.createElement("button");
+    var page = 1;
+    var timer = null;
+
+    search.type = "search";
+    search.placeholder = "Type to search...";
+    search.setAttribute("aria-controls", select.id);
+    search.className = "mb-2 w-full rounded-md border border-slate-300 px-3 py-2 text-sm focus:border-blue-500 focus:outline-none focus:ring-1 focus:ring-blue-500";
+    more.type = "button";
+    more.textContent = "More results";
+    more.hidden = true;
+    more.className = "mt-1 text-sm text-blue-600 hover:underline";
+    select.parentNode.insertBefore(search, select);
+    select.parentNode.insertBefore(more, select.nextSibling);
+    if (select.multiple) {
+      select.size = 8;
+    }
+
+    function load(append) {
+      var params = new URLSearchParams({q: search.value.trim(), page: page});
+      fetch(url + "?" + params, {headers: {"Accept": "application/json"}})
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          Array.prototype.slice.call(select.options).forEach(function (option) {
+            if (!append && !option.selected && option.value !== "") {
+              option.remove();
+            }
+          });
+          var present = {};
+          Array.prototype.forEach.call(select.options, function (option) {
+            present[option.value] = true;
+          });
+          data.results.forEach(function (item) {
+            if (!present[item.id]) {
+              select.add(new Option(item.text, item.id));
+            }
+          });
+          more.hidden = !data.more;
+        });
+    }
+
+    search.addEventListener("input", function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        page = 1;
+        load(false);
+      }, 200);
+    });
+    more.addEventListener("click", function () {
+      page += 1;
+      load(true);
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("select[data-autocomplete-url]").forEach(setup);
+  });
+})();